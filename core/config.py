@@ -395,6 +395,13 @@ DB_SUPPORTED_TABLES = ["All_types_columns", "DROP", "FK_table", "Long_columns",
 ALL_TYPES_COLUMNS = ["id", "col1", "col3", "col4", "col5", "col6", "col7", "col8", "col9", "col10", "col11", "col12", "col13", "col14", "col15", "col16", "col17", "col18", "col19", "col20", "col21", "col22", "col23", "col24", "col25", "col26", "col27", "col28", "col29", "col30", "col31", "col32", "col33", "col34", "col35", "col36", "col37", "col38", "col39", "col40", "col41"]
 KAFKA_COLUMNS = ["key", "value"]
 
+# 数据库连接池，每个连接配置最多保留的空闲连接数，以及空闲连接的回收时间（秒）
+DB_POOL_MAX_SIZE = 8
+DB_POOL_IDLE_TIMEOUT = 300
+
+# 表结构缓存（如Hive metastore）的有效时间（秒），超时后重新查询，用于感知其他进程修改的表结构
+DB_SCHEMA_CACHE_TTL = 10
+
 SEPARATOR = '~'
 LINEEND = '`'
 DEFAULT_SEPARATOR = ','
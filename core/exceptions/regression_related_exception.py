@@ -101,6 +101,11 @@ class OrderByNotInTableColumnException(RegressionException):
     pass
 
 
+class CompareKeyNotInTableColumnException(RegressionException):
+    """表比较关联字段不存在错误"""
+    pass
+
+
 class FiledMappingNotFoundException(RegressionException):
     """字段映射关系不存在错误"""
     pass
@@ -144,3 +149,23 @@ class IntervalYearToMonthNotSupportException(RegressionException):
 class NoWaitConditionException(RegressionException):
     """没有提供等待条件"""
     pass
+
+
+class ChecksumNotSupportedException(RegressionException):
+    """数据库不支持分块校验"""
+    pass
+
+
+class KafkaDeliveryException(RegressionException):
+    """Kafka数据投递失败"""
+    pass
+
+
+class AvroCodecException(RegressionException):
+    """Avro数据编解码失败"""
+    pass
+
+
+class HiveBulkLoadException(RegressionException):
+    """Hive批量导入数据失败"""
+    pass
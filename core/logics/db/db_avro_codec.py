@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# encoding: utf-8
+import io
+import json
+import struct
+import fastavro
+from core.exceptions.regression_related_exception import *
+
+
+class AvroCodec:
+    """
+    基于fastavro的Avro编解码层，HDFSDB、KafkaDB及Hive批量导入共用
+    容器文件：按数据块流式读写，支持null, deflate, snappy压缩（snappy需安装python-snappy）
+    Kafka消息：schemaless编解码，消息格式与Confluent Schema Registry一致
+        1字节魔数0 + 4字节大端schema id + 不含schema的Avro二进制数据
+    """
+
+    # Confluent消息格式的魔数及头部结构
+    MAGIC_BYTE = 0
+    HEADER = struct.Struct('>bI')
+
+    def __init__(self, schema, schema_id=None, codec='null'):
+        """
+        :param schema: Avro schema，json字符串或dict
+        :param schema_id: schema registry中的schema id，编码Kafka消息时需提供
+        :param codec: 写入容器文件时的压缩方式，null, deflate, snappy
+        """
+        if isinstance(schema, str):
+            schema = json.loads(schema)
+        self.schema = schema
+        self.parsed_schema = fastavro.parse_schema(schema)
+        self.schema_id = schema_id
+        self.codec = codec
+
+    def write_file(self, fo, records):
+        """
+        将数据写入Avro容器文件，数据按块编码、压缩后写入，不需一次性生成所有数据
+        :param fo: 可写的二进制文件对象
+        :param records: 可迭代的数据 [dict...]
+        """
+        fastavro.writer(fo, self.parsed_schema, records, codec=self.codec)
+
+    @staticmethod
+    def read_file(fo):
+        """
+        流式读取Avro容器文件，逐块解压、解码，返回的reader可逐条遍历数据，writer_schema为文件头部schema
+        :param fo: 可读的二进制文件对象
+        """
+        return fastavro.reader(fo)
+
+    @staticmethod
+    def read_schema(fo):
+        """
+        仅读取Avro容器文件头部的原始schema，不读取数据块
+        """
+        return json.loads(fastavro.reader(fo).metadata['avro.schema'])
+
+    @staticmethod
+    def header_size(data):
+        """
+        获取Avro容器文件头部的字节数，数据不足完整头部时返回None
+        :param data: 文件开头的字节数据
+        """
+        buffer = io.BytesIO(data)
+        try:
+            fastavro.reader(buffer)
+        except Exception:
+            return None
+        return buffer.tell()
+
+    def append_blocks(self, header, records):
+        """
+        基于已有文件的头部（schema, 压缩方式, sync marker）编码新增的数据块，编码结果可直接追加到该文件末尾
+        :param header: 已有文件头部的字节数据
+        :param records: 可迭代的数据 [dict...]
+        :return: 新增数据块的字节数据
+        """
+        buffer = io.BytesIO(header)
+        buffer.seek(0, io.SEEK_END)
+        fastavro.writer(buffer, self.parsed_schema, records)
+        return buffer.getvalue()[len(header):]
+
+    def encode(self, record):
+        """
+        不含schema的Avro二进制编码
+        """
+        buffer = io.BytesIO()
+        fastavro.schemaless_writer(buffer, self.parsed_schema, record)
+        return buffer.getvalue()
+
+    def decode(self, data):
+        """
+        不含schema的Avro二进制解码
+        """
+        return fastavro.schemaless_reader(io.BytesIO(data), self.parsed_schema)
+
+    def encode_message(self, record):
+        """
+        编码为Confluent格式的Kafka消息
+        """
+        if self.schema_id is None:
+            raise AvroCodecException('编码Kafka消息需提供schema id')
+        return self.HEADER.pack(self.MAGIC_BYTE, self.schema_id) + self.encode(record)
+
+
+class AvroMessageDecoder:
+    """
+    解码Confluent格式的Kafka消息，基于消息头部的schema id获取对应schema
+    schema id在schema registry中不可变，相同id的schema只获取、解析一次
+    """
+
+    def __init__(self, get_schema):
+        """
+        :param get_schema: 基于schema id返回schema字符串的函数
+        """
+        self.get_schema = get_schema
+        self.codecs = {}
+
+    def decode(self, data):
+        if data is None:
+            return None
+        if len(data) < AvroCodec.HEADER.size:
+            raise AvroCodecException('消息长度不足，不是有效的Avro消息: {0}'.format(data))
+        magic, schema_id = AvroCodec.HEADER.unpack_from(data)
+        if magic != AvroCodec.MAGIC_BYTE:
+            raise AvroCodecException('消息魔数错误: {0}，不是有效的Avro消息'.format(magic))
+        if schema_id not in self.codecs:
+            self.codecs[schema_id] = AvroCodec(self.get_schema(schema_id), schema_id)
+        return self.codecs[schema_id].decode(data[AvroCodec.HEADER.size:])
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# encoding: utf-8
+import json
+import itertools
+from enum import Enum
+from psycopg2 import extras
+from core.logics.db.db_driver import db_call
+
+
+class CopyFormat(Enum):
+    text = 0
+    csv = 1
+
+
+class CopyRowStream:
+    """
+    将逐行生成的COPY数据包装为copy_expert可读取的文件对象
+    数据在copy_expert读取时按需生成，不会在内存中堆积整张表
+    """
+
+    def __init__(self, lines):
+        self.lines = iter(lines)
+        self.buffer = bytearray()
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            line = next(self.lines, None)
+            if line is None:
+                break
+            self.buffer.extend(line.encode('utf-8'))
+        if size < 0:
+            size = len(self.buffer)
+        chunk = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return chunk
+
+
+class PgBulkLoader:
+    """
+    psycopg2系列数据库（PostgreSQL, GreenPlum, HashData, OpenGauss, Redshift）共用的批量导入引擎
+    copy_format为CopyFormat时，通过COPY ... FROM STDIN流式导入所有数据
+    copy_format为None时（如Redshift不支持FROM STDIN），使用多行INSERT按batch_size分批导入
+    """
+
+    query = {
+        CopyFormat.text:
+            "copy {table_name} ({column_names}) from stdin",
+        CopyFormat.csv:
+            "copy {table_name} ({column_names}) from stdin with csv",
+        'insert_data':
+            "insert into {table_name} ({column_names}) values %s",
+    }
+
+    # COPY中表示NULL的标识
+    NULL_MARK = {
+        CopyFormat.text: '\\N',
+        CopyFormat.csv: '',
+    }
+
+    # text格式中需要转义的字符，反斜杠需最先替换
+    TEXT_ESCAPE = [('\\', '\\\\'), ('\t', '\\t'), ('\n', '\\n'), ('\r', '\\r')]
+
+    def __init__(self, db_driver, copy_format=CopyFormat.text, batch_size=1000):
+        """
+        :param db_driver: psycopg2系列的DBDriver实例，需包含db连接、table_name以及manual_commit属性
+        :param copy_format: COPY数据格式，CopyFormat.text或CopyFormat.csv，为None时使用多行INSERT
+        :param batch_size: 多行INSERT时每批的行数
+        """
+        self.db_driver = db_driver
+        self.copy_format = copy_format
+        self.batch_size = max(batch_size or 1, 1)
+
+    def load(self, table_info, rows):
+        """
+        批量导入数据
+        :param table_info: DBTable对象，用于获取字段类型
+        :param rows: 可迭代的插入行 (column_names, placeholders, values)
+        :return: 导入的行数
+        """
+        if self.copy_format is None:
+            return self._insert(rows)
+        return self._copy(table_info, rows)
+
+    def _format_bits(self, value, precision):
+        # 与CAST(int AS bit(n))一致，取整数二进制的低n位
+        precision = int(precision or 1)
+        return format(int(value), 'b').zfill(precision)[-precision:]
+
+    def _format_value(self, column, value):
+        """
+        基于字段类型将值转换为COPY可识别的文本
+        """
+        if value is None:
+            return self.NULL_MARK[self.copy_format]
+        data_type = str(column.data_type).lower() if column is not None else ''
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            value = '\\x' + bytes(value).hex()
+        elif isinstance(value, bool):
+            value = 't' if value else 'f'
+        elif data_type in ('bit', 'varbit') and isinstance(value, int):
+            value = self._format_bits(value, column.precision)
+        elif isinstance(value, (dict, list)):
+            value = json.dumps(value)
+        else:
+            value = str(value)
+
+        if self.copy_format == CopyFormat.csv:
+            # 所有非空值均加引号，用于区分空字符串与NULL
+            return '"' + value.replace('"', '""') + '"'
+        for old, new in self.TEXT_ESCAPE:
+            value = value.replace(old, new)
+        return value
+
+    def _format_line(self, columns, values):
+        delimiter = ',' if self.copy_format == CopyFormat.csv else '\t'
+        return delimiter.join([self._format_value(columns[index], value)
+                               for index, value in enumerate(values)]) + '\n'
+
+    @db_call
+    def _copy(self, table_info, rows):
+        rows = iter(rows)
+        first_row = next(rows, None)
+        if first_row is None:
+            return 0
+        column_names = first_row[0]
+        column_info = {each.name: each for each in table_info.columns}
+        columns = [column_info.get(name) for name in column_names]
+        counter = [0]
+
+        def lines():
+            for names, _, values in itertools.chain([first_row], rows):
+                assert names == column_names, 'COPY导入的每行字段需一致'
+                counter[0] += 1
+                yield self._format_line(columns, values)
+
+        sql = self.query[self.copy_format].format(table_name=self.db_driver.table_name,
+                                                  column_names=', '.join(column_names))
+        print('SQL: {0}'.format(sql))
+        cursor = self.db_driver.db.cursor()
+        try:
+            cursor.copy_expert(sql, CopyRowStream(lines()))
+        except Exception as e:
+            print(e)
+            raise e
+        finally:
+            cursor.close()
+            # 是否手动提交变化，不开启则为自动提交，开启后可进行事务模式测试
+            if not self.db_driver.manual_commit:
+                self.db_driver.db.commit()
+        print('COPY行数: {0}'.format(counter[0]))
+        return counter[0]
+
+    @db_call
+    def _execute_values(self, sql, template, batch):
+        print('SQL: {0}'.format(sql))
+        print('\t批量行数: {0}'.format(len(batch)))
+        cursor = self.db_driver.db.cursor()
+        try:
+            extras.execute_values(cursor, sql, batch, template=template, page_size=self.batch_size)
+        except Exception as e:
+            print(e)
+            raise e
+        finally:
+            cursor.close()
+            # 是否手动提交变化，不开启则为自动提交，开启后可进行事务模式测试
+            if not self.db_driver.manual_commit:
+                self.db_driver.db.commit()
+
+    def _insert(self, rows):
+        count = 0
+        batch_key = None
+        batch = []
+        for column_names, placeholders, values in rows:
+            key = (tuple(column_names), tuple(placeholders))
+            # 字段或预替换符不同，或达到批量上限时，先写入已累积的数据
+            if batch and (key != batch_key or len(batch) >= self.batch_size):
+                self._flush_insert(batch_key, batch)
+                batch = []
+            batch_key = key
+            batch.append(tuple(values))
+            count += 1
+        if batch:
+            self._flush_insert(batch_key, batch)
+        return count
+
+    def _flush_insert(self, batch_key, batch):
+        column_names, placeholders = batch_key
+        sql = self.query['insert_data'].format(table_name=self.db_driver.table_name,
+                                               column_names=', '.join(column_names))
+        self._execute_values(sql, '(' + ', '.join(placeholders) + ')', batch)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# encoding: utf-8
+import time
+import atexit
+import threading
+from core import config
+
+
+class DBConnectionPool:
+    """
+    进程内共享的数据库连接池，基于连接配置区分连接
+    DBDriver实例从连接池借用连接，释放实例时归还连接，连接配置相同的实例复用已建立的连接，
+    避免每张表、每个测试步骤都重新建立TCP连接并认证
+    借用空闲连接时先进行健康检查，检查失败的连接直接关闭并继续借用下一个或新建连接
+    每个连接配置最多保留max_size个空闲连接，超出的连接归还时直接关闭，空闲超过idle_timeout秒的连接会被回收
+    """
+
+    def __init__(self, max_size=8, idle_timeout=300):
+        """
+        :param max_size: 每个连接配置最多保留的空闲连接数
+        :param idle_timeout: 空闲连接的回收时间（秒）
+        """
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        # 空闲连接 {key: [(连接, 归还时间, 关闭方法)...]}，后归还的连接先被借用
+        self._idle = {}
+
+    def acquire(self, key, connect, ping=None, close=None):
+        """
+        借用连接，优先复用健康检查通过的空闲连接，没有可用连接时新建连接
+        :param key: 连接配置，可hash
+        :param connect: 新建连接的方法
+        :param ping: 健康检查方法，参数为连接，连接不可用时抛出异常
+        :param close: 关闭连接的方法，参数为连接，默认调用连接的close()
+        :return: 连接
+        """
+        self.evict_idle()
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                if not idle:
+                    break
+                conn, _, idle_close = idle.pop()
+            try:
+                if ping:
+                    ping(conn)
+                return conn
+            except Exception as e:
+                print('连接池中的连接不可用，关闭该连接: {0}'.format(e))
+                self._close(conn, idle_close or close)
+        return connect()
+
+    def release(self, key, conn, reset=None, close=None):
+        """
+        归还连接，重置失败或空闲连接数已达上限时直接关闭连接
+        :param key: 连接配置，与借用时一致
+        :param conn: 连接
+        :param reset: 归还前重置连接状态的方法（如回滚未提交的事务），参数为连接
+        :param close: 关闭连接的方法，参数为连接，默认调用连接的close()
+        """
+        try:
+            if reset:
+                reset(conn)
+        except Exception as e:
+            print('归还连接时重置失败，关闭该连接: {0}'.format(e))
+            self._close(conn, close)
+            return
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_size:
+                idle.append((conn, time.time(), close))
+                conn = None
+        if conn is not None:
+            self._close(conn, close)
+        self.evict_idle()
+
+    def evict_idle(self):
+        """
+        回收空闲超时的连接
+        """
+        expired = []
+        deadline = time.time() - self.idle_timeout
+        with self._lock:
+            for key, idle in self._idle.items():
+                # 按归还时间升序排列，超时的连接均在列表头部
+                count = 0
+                while count < len(idle) and idle[count][1] < deadline:
+                    count += 1
+                if count:
+                    expired.extend(idle[:count])
+                    del idle[:count]
+        for conn, _, close in expired:
+            self._close(conn, close)
+
+    def close_all(self):
+        """
+        关闭连接池中所有空闲连接
+        """
+        with self._lock:
+            idle_lists = list(self._idle.values())
+            self._idle = {}
+        for idle in idle_lists:
+            for conn, _, close in idle:
+                self._close(conn, close)
+
+    @staticmethod
+    def _close(conn, close=None):
+        try:
+            if close:
+                close(conn)
+            else:
+                conn.close()
+        except:
+            pass
+
+
+# 进程内共享的连接池，所有DBDriver实例共用
+DB_CONNECTION_POOL = DBConnectionPool(config.DB_POOL_MAX_SIZE, config.DB_POOL_IDLE_TIMEOUT)
+atexit.register(DB_CONNECTION_POOL.close_all)
@@ -2,11 +2,14 @@
 # encoding: utf-8
 from abc import ABCMeta, abstractmethod
 import json
+import uuid
 import datetime
+import threading
 import ruamel.yaml
 from core import config
 from core.utils.common import *
 from core.logics.other.random_data import *
+from core.logics.db.db_connection_pool import DB_CONNECTION_POOL
 from core.exceptions.regression_related_exception import *
 
 
@@ -56,6 +59,29 @@ def db_call(func):
     return inner_wrapper
 
 
+class lazy_connection:
+    """
+    延迟建立连接的装饰器，被装饰的方法用于建立（或从连接池借用）连接
+    首次访问该属性时才建立连接并缓存在实例中，多线程同时首次访问时仅建立一次连接
+    实例close()后再次访问时重新建立连接
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.name = func.__name__
+        self.__doc__ = func.__doc__
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        # 已建立的连接保存在实例__dict__中，之后的访问不再经过该方法
+        connection_lock = instance.__dict__.setdefault('_connection_lock', threading.RLock())
+        with connection_lock:
+            if self.name not in instance.__dict__:
+                instance.__dict__[self.name] = self.func(instance)
+            return instance.__dict__[self.name]
+
+
 class DBColumn:
     """
     所有数据库字段（关系型、非关系型）的实体对象，用于存储并表示该数据库字段的所有信息
@@ -251,6 +277,9 @@ class DBDriver(metaclass=ABCMeta):
     # 实现类必须重写ALIAS，用于说明所实例的数据库对象的别名
     ALIAS = None
 
+    # 分块校验时字段转为文本的格式族，同一格式族的数据库字段文本一致，校验值可直接比较，为None时使用ALIAS
+    CHECKSUM_FAMILY = None
+
     def sql(self, what):
         if what not in self.query.keys():
             raise DBSQLNotFoundException('无法找到DBObject该实现类中的query. {0}'.format(what))
@@ -262,6 +291,90 @@ class DBDriver(metaclass=ABCMeta):
         """
         return json.dumps(ori, ensure_ascii=False, sort_keys=True, indent=4)
 
+    def _borrow_connection(self, connect, key, ping=None, reset=None, close=None):
+        """
+        从进程内共享的连接池借用连接，连接配置相同的实例复用已建立的连接，实例close()或释放时归还
+        :param connect: 新建连接的方法
+        :param key: 连接配置（如host, port, user, database），与ALIAS共同区分连接
+        :param ping: 健康检查方法，参数为连接，默认基于_ping_connection
+        :param reset: 归还前重置连接状态的方法，参数为连接，默认基于_reset_connection
+        :param close: 关闭连接的方法，参数为连接，默认调用连接的close()
+        :return: 连接
+        """
+        key = (self.ALIAS,) + tuple(key)
+        conn = DB_CONNECTION_POOL.acquire(key, connect, ping or self._ping_connection, close)
+        # 不保存绑定方法，避免循环引用导致实例无法及时释放归还连接
+        self.__dict__.setdefault('_borrowed_connections', []).append((key, conn, reset, close))
+        return conn
+
+    def _return_connections(self):
+        """
+        将借用的所有连接归还连接池
+        """
+        borrowed_connections = self.__dict__.pop('_borrowed_connections', [])
+        for key, conn, reset, close in borrowed_connections:
+            DB_CONNECTION_POOL.release(key, conn, reset or self._reset_connection, close)
+
+    def close(self):
+        """
+        释放实例的所有连接：从连接池借用的连接归还连接池，其他连接直接关闭
+        释放后再次访问连接时重新建立，也可通过with语句在退出时自动释放
+        """
+        connection_lock = self.__dict__.setdefault('_connection_lock', threading.RLock())
+        with connection_lock:
+            borrowed = [conn for _, conn, _, _ in self.__dict__.get('_borrowed_connections', [])]
+            for klass in type(self).__mro__:
+                for name, value in vars(klass).items():
+                    if not isinstance(value, lazy_connection) or name not in self.__dict__:
+                        continue
+                    conn = self.__dict__.pop(name)
+                    if any(conn is x for x in borrowed):
+                        continue
+                    try:
+                        conn.close()
+                    except:
+                        pass
+            self._return_connections()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except:
+            pass
+
+    def _ping_connection(self, conn):
+        """
+        连接健康检查，默认执行query中的ping语句，连接不可用时抛出异常
+        """
+        cursor = conn.cursor()
+        try:
+            cursor.execute(self.sql('ping'))
+            cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def _reset_connection(self, conn):
+        """
+        归还连接前回滚未提交的事务，避免手动提交模式下的变化被下一个借用者提交
+        """
+        conn.rollback()
+
+    def _open_stream_cursor(self, batch_size=1000):
+        """
+        创建命名游标（服务端游标），用于流式查询，每次fetchmany从服务端获取batch_size行
+        同一连接上同时打开的命名游标不能重名，每次调用使用唯一的游标名
+        :param batch_size: 每次从数据库获取的行数
+        """
+        cursor = self.db.cursor(name='dp_stream_' + uuid.uuid4().hex)
+        cursor.itersize = batch_size
+        return cursor
+
     @abstractmethod
     def get_table_info(self) -> DBTable:
         # 子类必须实现获取表结构方法
@@ -275,6 +388,53 @@ class DBDriver(metaclass=ABCMeta):
         # 返回的表数据需基于表结构字段顺序返回-[[cell...]]
         pass
 
+    def iter_table_data(self, batch_size=1000):
+        """
+        流式获取表数据，逐行返回，返回的每行数据与get_table_data一致
+        默认基于get_table_data实现，关系型数据库子类可基于服务端游标重写，避免一次性将整表读入内存
+        :param batch_size: 每次从数据库获取的行数
+        """
+        for row in self.get_table_data():
+            yield row
+
+    def poll_table_data(self, batch_size=1000):
+        """
+        轮询等待下游数据时获取表数据，返回的每行数据与get_table_data一致
+        默认基于iter_table_data实现，每次轮询读取全表
+        只追加写入的数据库（如Kafka）可重写为仅读取上次轮询后的新数据，并返回累计的所有数据
+        :param batch_size: 每次从数据库获取的行数
+        """
+        return self.iter_table_data(batch_size)
+
+    def get_chunk_checksums(self, key_column, column_names, chunk_size):
+        """
+        分块计算表数据校验值，行数与校验值均在数据库内计算，仅返回每个分块的汇总结果
+        基于分块字段值将表划分为[chunk * chunk_size, (chunk + 1) * chunk_size)的区间
+        子类在query中提供checksum_column, checksum_separator, get_chunk_checksums, get_chunk_data即可支持
+        :param key_column: 分块字段名，需为整数类型
+        :param column_names: 参与校验的字段名，比较的两端需保持相同顺序
+        :param chunk_size: 每个分块的字段值跨度
+        :return: {分块编号: (行数, 校验值)}
+        """
+        if 'get_chunk_checksums' not in self.query.keys():
+            raise ChecksumNotSupportedException('{0}不支持分块校验'.format(self.ALIAS))
+        row_text = self.sql('checksum_separator').join(
+            [self.sql('checksum_column').format(column=name) for name in column_names])
+        results = self.execute(self.sql('get_chunk_checksums').format(
+            table_name=self.table_name, key=key_column, chunk_size=chunk_size, row_text=row_text))
+        return {int(chunk): (int(count), int(checksum or 0)) for chunk, count, checksum in results}
+
+    def get_chunk_data(self, key_column, chunk, chunk_size):
+        """
+        获取某个分块的所有数据，返回的每行数据与get_table_data一致
+        :param key_column: 分块字段名
+        :param chunk: 分块编号
+        :param chunk_size: 每个分块的字段值跨度
+        """
+        lower = chunk * chunk_size
+        return self.execute(self.sql('get_chunk_data').format(
+            table_name=self.table_name, key=key_column, lower=lower, upper=lower + chunk_size))
+
     @abstractmethod
     def create_table(self, table_info: DBTable):
         # 子类必须实现建表方法
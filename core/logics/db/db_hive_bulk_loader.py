@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# encoding: utf-8
+import os
+import uuid
+import decimal
+import tempfile
+from core.logics.db.db_avro_codec import AvroCodec
+from core.exceptions.regression_related_exception import *
+
+# 可选的parquet/orc文件写入库（requirements.txt中的pyarrow），未安装时parquet/orc表改为分批INSERT
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+class HiveBulkLoader:
+    """
+    Hive系列数据库（Hive, Inceptor）共用的批量导入引擎
+    将数据按表的存储格式（text, avro, parquet, orc）写入本地文件，上传到HDFS暂存目录后通过LOAD DATA INPATH导入
+    未提供HDFS客户端，或执行LOAD DATA前的暂存失败（如缺少parquet/orc写入库、上传失败）时，改为按batch_size分批INSERT，
+    分桶表、事务表不支持LOAD DATA，调用方需传入hdfs_client=None
+    LOAD DATA失败时直接抛出异常，不改为INSERT：客户端超时时服务端可能已将文件移入表中，改为INSERT会导致数据重复
+    """
+
+    # 各存储格式的数据文件扩展名
+    FILE_EXT = {
+        'text': 'csv',
+        'avro': 'avro',
+        'parquet': 'parquet',
+        'orc': 'orc',
+    }
+
+    # Hive字段类型对应的avro类型，未列出的类型按string写入，decimal使用decimal逻辑类型
+    AVRO_TYPES = {
+        'tinyint': 'int',
+        'smallint': 'int',
+        'int': 'int',
+        'bigint': 'long',
+        'float': 'float',
+        'double': 'double',
+        'boolean': 'boolean',
+        'binary': 'bytes',
+    }
+
+    # Hive字段类型对应的arrow类型名，未列出的类型按string写入，decimal使用decimal128
+    ARROW_TYPES = {
+        'tinyint': 'int8',
+        'smallint': 'int16',
+        'int': 'int32',
+        'bigint': 'int64',
+        'float': 'float32',
+        'double': 'float64',
+        'boolean': 'bool_',
+        'binary': 'binary',
+    }
+
+    PLACEHOLDER = '%s'
+
+    def __init__(self, db_driver, file_format, hdfs_client=None, staging_path=None, batch_size=1000,
+                 text_format=(',', '"', '\\', '\n'), encoding='utf8'):
+        """
+        :param db_driver: Hive系列的DBDriver实例，需包含execute, load_data, table_name以及query中的insert_data
+        :param file_format: 表的存储格式，text, avro, parquet, orc
+        :param hdfs_client: hdfs客户端，为None时直接分批INSERT
+        :param staging_path: 数据文件的HDFS暂存目录
+        :param batch_size: 分批INSERT时每批的行数
+        :param text_format: text格式的 (分隔符, 引号, 转义符, 行分隔符)，需与建表时的serde设置一致
+        :param encoding: text格式的文件编码
+        """
+        self.db_driver = db_driver
+        self.file_format = file_format
+        self.hdfs_client = hdfs_client
+        self.staging_path = staging_path
+        self.batch_size = max(batch_size or 1, 1)
+        self.text_format = text_format
+        self.encoding = encoding
+
+    def load(self, table_info, rows):
+        """
+        批量导入数据
+        :param table_info: DBTable对象，用于获取字段名及字段类型
+        :param rows: 可迭代的数据，每行数据基于表结构字段顺序
+        :return: 导入的行数
+        """
+        rows = [list(row) for row in rows]
+        if not rows:
+            return 0
+        hdfs_path = None
+        if self.hdfs_client is not None:
+            try:
+                hdfs_path = self._stage(table_info, rows)
+            except Exception as e:
+                print('数据文件暂存失败，改为分批INSERT: {0}'.format(e))
+        if hdfs_path is None:
+            self._insert(table_info, rows)
+        else:
+            self._load_staged(hdfs_path)
+        return len(rows)
+
+    def _stage(self, table_info, rows):
+        """
+        将数据写入本地文件并上传到HDFS暂存目录
+        :return: 数据文件的HDFS路径
+        """
+        writer = getattr(self, '_write_' + self.file_format, None)
+        if writer is None:
+            raise HiveBulkLoadException('不支持的存储格式: {0}'.format(self.file_format))
+        ext = self.FILE_EXT[self.file_format]
+        # 文件名不能以.或_开头，否则导入后会被Hive当作隐藏文件忽略
+        hdfs_path = '{0}/{1}_{2}.{3}'.format(self.staging_path, self.db_driver.table_name, uuid.uuid4().hex, ext)
+        fd, local_path = tempfile.mkstemp(suffix='.' + ext)
+        os.close(fd)
+        try:
+            writer(local_path, table_info, rows)
+            print('上传数据文件: {0}, 行数: {1}'.format(hdfs_path, len(rows)))
+            self.hdfs_client.upload(hdfs_path, local_path, overwrite=True)
+        finally:
+            os.remove(local_path)
+        return hdfs_path
+
+    def _load_staged(self, hdfs_path):
+        """
+        通过LOAD DATA INPATH导入暂存的数据文件，失败时删除暂存文件并抛出异常
+        """
+        try:
+            self.db_driver.load_data(hdfs_path, overwrite=False)
+        except Exception:
+            # 文件未被移入表中时仍在暂存目录，需删除；已移入时删除失败，忽略
+            try:
+                self.hdfs_client.delete(hdfs_path)
+            except Exception:
+                pass
+            raise
+
+    def _format_text_value(self, value):
+        if value is None:
+            return ''
+        _, quote, escape, _ = self.text_format
+        value = str(value).replace(escape, escape + escape).replace(quote, escape + quote)
+        return quote + value + quote
+
+    def _write_text(self, local_path, table_info, rows):
+        separator, _, _, line_end = self.text_format
+        with open(local_path, 'w', encoding=self.encoding, newline='') as f:
+            for row in rows:
+                f.write(separator.join([self._format_text_value(value) for value in row]) + line_end)
+
+    def _avro_type(self, column):
+        data_type = str(column.data_type).lower()
+        if data_type == 'decimal':
+            return {'type': 'bytes', 'logicalType': 'decimal',
+                    'precision': int(column.precision or 10), 'scale': int(column.scale or 0)}
+        return self.AVRO_TYPES.get(data_type, 'string')
+
+    def _write_avro(self, local_path, table_info, rows):
+        fields = []
+        converters = []
+        for column in table_info.columns:
+            avro_type = self._avro_type(column)
+            fields.append({'name': column.name, 'type': ['null', avro_type], 'default': None})
+            if isinstance(avro_type, dict):
+                converters.append(decimal.Decimal)
+            elif avro_type == 'string':
+                converters.append(str)
+            else:
+                converters.append(None)
+        schema = {'type': 'record', 'name': 'hiveRecord', 'fields': fields}
+        names = [column.name for column in table_info.columns]
+
+        def records():
+            for row in rows:
+                yield {name: value if value is None or convert is None else convert(value)
+                       for name, convert, value in zip(names, converters, row)}
+
+        with open(local_path, 'wb') as f:
+            AvroCodec(schema).write_file(f, records())
+
+    def _arrow_table(self, table_info, rows):
+        if pyarrow is None:
+            raise HiveBulkLoadException('写入parquet/orc文件需安装pyarrow')
+        arrays = []
+        for index, column in enumerate(table_info.columns):
+            data_type = str(column.data_type).lower()
+            values = [row[index] for row in rows]
+            if data_type == 'decimal':
+                arrow_type = pyarrow.decimal128(int(column.precision or 10), int(column.scale or 0))
+                values = [None if value is None else decimal.Decimal(value) for value in values]
+            elif data_type in self.ARROW_TYPES:
+                arrow_type = getattr(pyarrow, self.ARROW_TYPES[data_type])()
+            else:
+                arrow_type = pyarrow.string()
+                values = [None if value is None else str(value) for value in values]
+            arrays.append(pyarrow.array(values, type=arrow_type))
+        return pyarrow.Table.from_arrays(arrays, names=[column.name for column in table_info.columns])
+
+    def _write_parquet(self, local_path, table_info, rows):
+        table = self._arrow_table(table_info, rows)
+        pyarrow.parquet.write_table(table, local_path)
+
+    def _write_orc(self, local_path, table_info, rows):
+        table = self._arrow_table(table_info, rows)
+        # 部分平台（如Windows）的pyarrow不包含orc模块
+        try:
+            import pyarrow.orc
+        except ImportError:
+            raise HiveBulkLoadException('当前pyarrow不支持写入orc文件')
+        pyarrow.orc.write_table(table, local_path)
+
+    def _insert(self, table_info, rows):
+        column_names = ', '.join([column.name for column in table_info.columns])
+        row_placeholder = '({0})'.format(', '.join([self.PLACEHOLDER] * len(table_info.columns)))
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            values = [value for row in batch for value in row]
+            self.db_driver.execute(
+                self.db_driver.sql('insert_data').format(table_name=self.db_driver.table_name,
+                                                         column_name=column_names,
+                                                         column_data=', '.join([row_placeholder] * len(batch))),
+                False, sql_params=values)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# encoding: utf-8
+import re
+import operator
+from core.exceptions.regression_related_exception import *
+
+
+class DBMappingRule:
+    """
+    预编译的字段类型映射规则，对应DefaultMapping.xlsx中的一个映射单元格
+    单元格格式：
+        单行: 类型 或 类型;精度;标度
+        多行: 条件:类型 或 条件:类型;精度;标度，最后一行可不带条件，作为默认结果
+    条件仅支持精度、标度与数字的比较，多个比较可通过and, or组合，例如：精度>10 and 标度<=2
+    精度、标度为x时，使用原表字段的精度、标度
+    """
+
+    __slots__ = ('conditions', 'default')
+
+    # 条件中支持的字段
+    FIELDS = {'精度': 0, '标度': 1}
+
+    # 条件中支持的比较运算
+    OPERATORS = {
+        '<=': operator.le,
+        '>=': operator.ge,
+        '==': operator.eq,
+        '=': operator.eq,
+        '!=': operator.ne,
+        '<': operator.lt,
+        '>': operator.gt,
+    }
+
+    COMPARISON = re.compile(r'^\s*(精度|标度)\s*(<=|>=|==|!=|=|<|>)\s*(-?\d+(?:\.\d+)?)\s*$')
+
+    def __init__(self, cell_text):
+        """
+        :param cell_text: 映射单元格文本（已转为小写）
+        """
+        # 条件映射 [(条件, 结果)...]，条件为[[(字段, 运算, 数值)...]...]，外层为or，内层为and
+        self.conditions = []
+        # 无条件时的默认结果
+        self.default = None
+
+        lines = cell_text.splitlines()
+        if len(lines) == 1:
+            self.default = self._compile_result(lines[0], cell_text)
+            return
+        for index, line in enumerate(lines):
+            search_result = re.search(r'([^:;]*?):(.*)', line, re.I)
+            if search_result:
+                self.conditions.append((self._compile_condition(search_result.group(1), cell_text),
+                                        self._compile_result(search_result.group(2), cell_text)))
+            elif index == len(lines) - 1 and re.match(r'^[^:;]*?;[^:;]*?;[^:;]*?$', line, re.I):
+                self.default = self._compile_result(line, cell_text)
+            else:
+                raise DBDefaultMappingException('mapping excel 单元格的值不合法: {0}'.format(cell_text))
+
+    @staticmethod
+    def _compile_result(text, cell_text):
+        """
+        解析映射结果为 (类型, 精度, 标度)
+        """
+        if ';' not in text:
+            return text, None, None
+        result = text.split(';')
+        if len(result) != 3:
+            raise DBDefaultMappingException('mapping excel 单元格的值不合法: {0}'.format(cell_text))
+        return tuple(result)
+
+    def _compile_condition(self, text, cell_text):
+        """
+        解析条件为 [[(字段下标, 运算函数, 数值)...]...]
+        """
+        condition = []
+        for or_part in re.split(r'\s+or\s+', text.strip()):
+            and_terms = []
+            for term in re.split(r'\s+and\s+', or_part.strip()):
+                search_result = self.COMPARISON.match(term)
+                if not search_result:
+                    raise DBDefaultMappingException('mapping excel 单元格的条件不合法: {0}'.format(cell_text))
+                field, op, number = search_result.groups()
+                number = float(number) if '.' in number else int(number)
+                and_terms.append((self.FIELDS[field], self.OPERATORS[op], number))
+            condition.append(and_terms)
+        return condition
+
+    def match(self, precision, scale):
+        """
+        基于原表字段的精度、标度获取映射结果
+        :return: (类型, 精度, 标度)，没有满足的条件时返回None
+        """
+        values = (precision, scale)
+        for condition, result in self.conditions:
+            if any(all(op(values[field], number) for field, op, number in and_terms)
+                   for and_terms in condition):
+                return result
+        return self.default
@@ -5,11 +5,14 @@ import json
 import traceback
 import cx_Oracle
 import datetime
+from enum import Enum
 from core import settings
-from core.utils.common import get_xls
+from core.utils.common import get_xls_cached, get_xls_signature
 from core.utils.wait import Wait
 from core.exceptions.regression_related_exception import *
-from core.logics.db.db_driver import DBDriver, DBTable, DBColumn
+from core.logics.db.db_driver import DBDriver, DBTable, DBColumn, SORTED_AND_UNIQUE_COLUMN_NAME
+from core.logics.db.db_table_data import DBTableData
+from core.logics.db.db_mapping import DBMappingRule
 from core.logics.db.db_compare_rule import DBSchemaCompareRule, DBValueCompareRule
 from core.logics.db.excepted_condition import *
 
@@ -17,6 +20,10 @@ from core.logics.db.excepted_condition import *
 COMPARE_LOGGING_START = '-' * 10 + 'DB-OPERATOR-START' + '-' * 10
 COMPARE_LOGGING_END = '-' * 10 + 'DB-OPERATOR-END' + '-' * 10
 
+# 进程内共享的字段默认映射，映射单元格在首次使用时编译为DBMappingRule并保存在其中
+# {(Excel路径, 修改时间, 大小, 原库, 目标库): {'source': 原库, 'sink': 目标库, 'mapping': {原字段类型: 映射规则}}}
+_DB_MAPPING_CACHE = {}
+
 
 def compare_call(func):
     """
@@ -41,6 +48,94 @@ def compare_call(func):
     return inner_wrapper
 
 
+class UniqueKeep(Enum):
+    # 关联值重复时保留第一次出现的行
+    first = 0
+    # 关联值重复时保留最后一次出现的行
+    last = 1
+
+
+class DBDataUnique:
+    """
+    基于哈希表的数据去重，线性时间复杂度
+    可作为流式过滤器，放置在数据融合与数据比较之间使用，例如：
+    db_operator.compare_data_by_key(source_db_data, DBDataUnique('id').filter(sink_db_data))
+    """
+
+    def __init__(self, unique_by, keep=UniqueKeep.first):
+        """
+        :param unique_by: 去重字段
+        :param keep: UniqueKeep.first保留第一次出现的行，UniqueKeep.last保留最后一次出现的行
+        """
+        self.unique_by = unique_by.lower()
+        self.keep = keep
+
+    @staticmethod
+    def _hash_key(value):
+        # 不可哈希的值（如kafka json中的list, dict）基于其字符串表示去重
+        try:
+            hash(value)
+            return value
+        except TypeError:
+            return type(value), repr(value)
+
+    def filter(self, lines, value_of=None):
+        """
+        对融合后的数据去重
+        UniqueKeep.first时逐行流式返回，UniqueKeep.last时需读取所有数据后返回
+        :param lines: 融合后的数据，可为任意可迭代对象
+        :param value_of: 获取每行去重字段值的函数，默认为line[unique_by]['value']
+        """
+        if value_of is None:
+            value_of = lambda line: line[self.unique_by]['value']
+        seen = {}
+        for line in lines:
+            key = self._hash_key(value_of(line))
+            if self.keep == UniqueKeep.first:
+                if key in seen:
+                    continue
+                seen[key] = None
+                yield line
+            else:
+                # 重新插入，保证保留的行位于其最后一次出现的位置
+                seen.pop(key, None)
+                seen[key] = line
+        if self.keep == UniqueKeep.last:
+            for line in seen.values():
+                yield line
+
+
+class DBCompareResult:
+    """
+    基于关联字段的数据比较结果
+    """
+
+    def __init__(self):
+        # 关联成功且所有字段值相同的行数
+        self.matched = 0
+        # 关联成功但有字段值不同的行，[(关联值, 不同字段数)...]
+        self.mismatched = []
+        # 原表存在而目标表缺失的行，[关联值...]
+        self.missing_in_sink = []
+        # 目标表存在而原表没有的行（包括目标表中关联值重复的行），[关联值...]
+        self.extra_in_sink = []
+        # 字段值不同的总数
+        self.value_fail_count = 0
+
+    @property
+    def fail_count(self):
+        """
+        不相同的数据数量：字段值不同的总数 + 目标表缺失行数 + 目标表多余行数
+        """
+        return self.value_fail_count + len(self.missing_in_sink) + len(self.extra_in_sink)
+
+    def __repr__(self):
+        return '匹配行数: {0}，数据不一致行数: {1}，目标表缺失行数: {2}，目标表多余行数: {3}'.format(
+            self.matched, len(self.mismatched), len(self.missing_in_sink), len(self.extra_in_sink))
+
+    __str__ = __repr__
+
+
 class DBOperator:
 
     def __init__(self, source_db: DBDriver, sink_db: DBDriver,
@@ -59,6 +154,15 @@ class DBOperator:
         # 默认数据库值校验规则，可在对象创建后重新赋值
         self.value_compare_rule = DBValueCompareRule.default_compare
 
+        # 流式读取表数据时，每次从数据库获取的行数
+        self.fetch_batch_size = 1000
+
+        # 基于unique_by去重时，保留第一次或最后一次出现的行
+        self.unique_keep = UniqueKeep.first
+
+        # 分块校验比较时，每个分块的分块字段值跨度
+        self.checksum_chunk_size = 10000
+
     def __get_db_mapping(self):
         """
         读取并返回数据字段默认映射表
@@ -67,7 +171,11 @@ class DBOperator:
         print('读取DB字段默认映射表数据')
         source_db_name = self.source_db.ALIAS
         sink_db_name = self.sink_db.ALIAS
-        ret = get_xls(self.data_path, self.excel_name, source_db_name)
+        # 同一进程内Excel文件未变化时，复用已编译的映射规则
+        cache_key = get_xls_signature(self.data_path, self.excel_name) + (source_db_name, sink_db_name)
+        if cache_key in _DB_MAPPING_CACHE:
+            return _DB_MAPPING_CACHE[cache_key]
+        ret = get_xls_cached(self.data_path, self.excel_name, source_db_name)
         # 检查表结构
         if len(ret) < 2:
             raise DBDefaultMappingException('数据库默认映射关系表结构异常，应至少包含表头在内的两行，表：{0}'.
@@ -91,7 +199,8 @@ class DBOperator:
             row_name = str(row[0]).lower()
             sink_mapping_value = str(row[sink_mapping_column]).lower()
             ret_dict[row_name] = sink_mapping_value
-        return {'source': source_db_name, 'sink': sink_db_name, 'mapping': ret_dict}
+        _DB_MAPPING_CACHE[cache_key] = {'source': source_db_name, 'sink': sink_db_name, 'mapping': ret_dict}
+        return _DB_MAPPING_CACHE[cache_key]
 
     def get_column_mapping(self, source_column_info):
         """
@@ -103,42 +212,17 @@ class DBOperator:
         source_precision = source_column_info.precision
         source_scale = source_column_info.scale
 
-        if source_type not in self.mapping['mapping'].keys():
+        mapping = self.mapping['mapping']
+        if source_type not in mapping.keys():
             return None
 
         # 获取目标字段类型
-        # 如目标字段类型基于精度有不同对应类型，则适配条件, 以获得对应的 类型+精度+标度
-        ret = self.mapping['mapping'][source_type]
-        ret_lines = ret.splitlines()
-        ret_lines_len = len(ret_lines)
-        sink_type, sink_pre, sink_sac = "default", "default", "default"
-
-        if ret_lines_len == 1:
-            if ";" not in ret_lines[0]:
-                sink_type, sink_pre, sink_sac = ret_lines[0], None, None
-            else:
-                sink_type, sink_pre, sink_sac = ret_lines[0].split(";")
-        else:
-            for index, a_line in enumerate(ret_lines):
-                search_result = re.search(r'([^:;]*?):(.*)', a_line, re.I)
-                if not search_result and index < ret_lines_len - 1:
-                    raise Exception("mapping excel 单元格的值不合法: ", a_line)
-                else:
-                    a_condition = search_result.group(1)
-                    a_result = search_result.group(2)
-                    a_condition = a_condition.replace("精度", "source_precision")
-                    a_condition = a_condition.replace("标度", "source_scale")
-                    if eval(a_condition):
-                        if ";" not in ret_lines[0]:
-                            sink_type, sink_pre, sink_sac = ret_lines[0], None, None
-                        else:
-                            sink_type, sink_pre, sink_sac = a_result.split(";")
-                        break
-                if index == ret_lines_len - 1:
-                    if re.match(r'^[^:;]*?;[^:;]*?;[^:;]*?$', a_line, re.I):
-                        sink_type, sink_pre, sink_sac = a_line.split(";")
-                    else:
-                        raise Exception("mapping excel 单元格的值不合法: ", ret_lines)
+        # 映射单元格在首次使用时编译为映射规则，并缓存至进程内共享的映射中，如目标字段类型基于精度有不同对应类型，则匹配已编译的条件
+        rule = mapping[source_type]
+        if not isinstance(rule, DBMappingRule):
+            rule = DBMappingRule(rule)
+            mapping[source_type] = rule
+        sink_type, sink_pre, sink_sac = rule.match(source_precision, source_scale) or ("default", "default", "default")
 
         if sink_pre in ['x', 'X']:
             sink_pre = source_precision
@@ -161,7 +245,7 @@ class DBOperator:
         :param lines: 所有数据
         :param order_by: 所有数据基于某字段升序排列
         :param unique_by: 所有数据基于某字段进行去重
-        :return: 融合后的数据 [{dict}...]
+        :return: 融合后的列式数据 DBTableData
         """
         # 如设置order_by则检验该字段是否存在
         if order_by:
@@ -179,28 +263,35 @@ class DBOperator:
             if unique_by not in columns:
                 raise UniqueByNotInTableColumnException('表去重字段不存在，去重字段: {0}，表字段: {1}'.
                                                         format(unique_by, columns))
-        results = []
-        for line in lines:
-            line_dict = {}
-            for index, db_column in enumerate(table_info.columns):
-                column_value = line[index]
-                # TODO: 可将以下类型转换代码放在每个DB类中处理，DB类返回的对象即为经过处理后的str，后续所有排序、去重、比较均不需类型处理
-                if isinstance(column_value, cx_Oracle.LOB):
-                    try:
-                        column_value = column_value.read()
-                    except:
-                        column_value = None
-                if isinstance(column_value, memoryview):
-                    column_value = column_value.tobytes()
-                column_name = db_column.name.lower()
-                line_dict[column_name] = {'info': db_column, 'value': column_value}
-            # 如需去重，则基于判断该字段是否已存在
-            if unique_by and (line_dict[unique_by] in [x[unique_by] for x in results]):
-                continue
-            results.append(line_dict)
+        results = DBTableData(table_info.columns)
+
+        def merge_lines():
+            column_count = len(table_info.columns)
+            for line in lines:
+                line_values = []
+                for index in range(column_count):
+                    column_value = line[index]
+                    # TODO: 可将以下类型转换代码放在每个DB类中处理，DB类返回的对象即为经过处理后的str，后续所有排序、去重、比较均不需类型处理
+                    if isinstance(column_value, cx_Oracle.LOB):
+                        try:
+                            column_value = column_value.read()
+                        except:
+                            column_value = None
+                    if isinstance(column_value, memoryview):
+                        column_value = column_value.tobytes()
+                    line_values.append(column_value)
+                yield line_values
+
+        # 如需去重，则基于哈希表判断该字段值是否已存在
+        merged_lines = merge_lines()
+        if unique_by:
+            unique_index = results.positions[unique_by]
+            merged_lines = DBDataUnique(unique_by, self.unique_keep).filter(
+                merged_lines, value_of=lambda line: line[unique_index])
+        results.extend(merged_lines)
         # 如需排除，则基于字段升序排列
         if order_by:
-            results.sort(key=lambda x: x[order_by]['value'])
+            results.sort(order_by)
         return results
 
     def combine_schema_and_data_for_kafka_source(self, source_table_info, lines, order_by=None, unique_by=None):
@@ -211,7 +302,7 @@ class DBOperator:
         :param lines: 所有数据
         :param order_by: 所有数据基于某字段升序排列
         :param unique_by: 所有数据基于某字段进行去重
-        :return: 融合后的数据 [{dict}...]
+        :return: 融合后的列式数据 DBTableData
         """
         # 如设置order_by则检验该字段是否存在
         if order_by:
@@ -229,25 +320,28 @@ class DBOperator:
             if unique_by not in columns:
                 raise UniqueByNotInTableColumnException('表去重字段不存在，去重字段: {0}，表字段: {1}'.
                                                         format(unique_by, columns))
-        results = []
-        for line in lines:
-            line_dict = {}
-            line_data = line[1]
-            # TODO: 可将以下类型转换代码放在每个DB类中处理，DB类返回的对象即为经过处理后的str，后续所有排序、去重、比较均不需类型处理
-            if isinstance(line_data, cx_Oracle.LOB):
-                line_data = line_data.read()
-            line_ori_dict = json.loads(line_data)
-            for column in source_table_info.columns:
-                column_name = column.name.lower()
+        results = DBTableData(source_table_info.columns)
+
+        def merge_lines():
+            for line in lines:
+                line_data = line[1]
+                # TODO: 可将以下类型转换代码放在每个DB类中处理，DB类返回的对象即为经过处理后的str，后续所有排序、去重、比较均不需类型处理
+                if isinstance(line_data, cx_Oracle.LOB):
+                    line_data = line_data.read()
+                line_ori_dict = json.loads(line_data)
                 # TODO: source为kafka json，下游对齐数据与schema时，需要考虑Schema版本（版本可通过produce设置key.value区分）
-                line_dict[column_name] = {'info': column, 'value': line_ori_dict[column_name]}
-            # 如需去重，则基于判断该字段是否已存在
-            if unique_by and (line_dict[unique_by] in [x[unique_by] for x in results]):
-                continue
-            results.append(line_dict)
+                yield [line_ori_dict[column_name] for column_name in results.names]
+
+        # 如需去重，则基于哈希表判断该字段值是否已存在
+        merged_lines = merge_lines()
+        if unique_by:
+            unique_index = results.positions[unique_by]
+            merged_lines = DBDataUnique(unique_by, self.unique_keep).filter(
+                merged_lines, value_of=lambda line: line[unique_index])
+        results.extend(merged_lines)
         # 如需排除，则基于字段升序排列
         if order_by:
-            results.sort(key=lambda x: x[order_by]['value'])
+            results.sort(order_by)
         return results
 
     def get_table_schema_and_data(self, order_by=None, unique_by=None, wait_timeout=None, wait_interval=10,
@@ -268,13 +362,13 @@ class DBOperator:
 
         # 获取上游表数据及类型，并将两者融合
         source_types = self.source_db.get_table_info()
-        source_lines = self.source_db.get_table_data()
+        source_lines = self.source_db.iter_table_data(self.fetch_batch_size)
         source_db_data = self.combine_schema_and_data(source_types, source_lines, order_by)
 
         # 等待并获取下游表数据及类型，并将两者融合
         if wait_timeout <= 0:
             db_types = self.sink_db.get_table_info()
-            db_lines = self.sink_db.get_table_data()
+            db_lines = self.sink_db.iter_table_data(self.fetch_batch_size)
             sink_db_data = self.combine_schema_and_data(db_types, db_lines, order_by, unique_by)
         else:
             sink_db_data = Wait(wait_timeout, wait_interval=wait_interval).until(
@@ -305,7 +399,7 @@ class DBOperator:
             wait_interval = 10
         # 获取上游表数据及类型，并将两者融合
         source_types = self.source_db.get_table_info()
-        source_lines = self.source_db.get_table_data()
+        source_lines = self.source_db.iter_table_data(self.fetch_batch_size)
         source_db_data = self.combine_schema_and_data(source_types, source_lines, order_by)
         source_data_count = len(source_db_data)
 
@@ -316,7 +410,7 @@ class DBOperator:
 
             def __call__(self):
                 try:
-                    db_lines = self.instance.sink_db.get_table_data()
+                    db_lines = self.instance.sink_db.poll_table_data(self.instance.fetch_batch_size)
                     db_data = self.instance.combine_schema_and_data_for_kafka_source(source_types, db_lines,
                                                                                      order_by, unique_by)
                     if len(db_data) != self.total:
@@ -356,7 +450,7 @@ class DBOperator:
             wait_interval = 10
         # 获取上游表数据及类型，并将两者融合
         source_types = self.source_db.get_table_info()
-        source_lines = self.source_db.get_table_data()
+        source_lines = self.source_db.iter_table_data(self.fetch_batch_size)
         source_db_data = self.combine_schema_and_data(source_types, source_lines, order_by)
         source_data_count = len(source_db_data)
 
@@ -373,7 +467,7 @@ class DBOperator:
             def __call__(self):
                 try:
                     db_types = self.instance.sink_db.get_table_info()
-                    db_lines = self.instance.sink_db.get_table_data()
+                    db_lines = self.instance.sink_db.poll_table_data(self.instance.fetch_batch_size)
                     db_data = self.instance.combine_schema_and_data(db_types, db_lines, order_by, unique_by)
                     if len(db_data) != self.total:
                         print('数据量与源端数据库数量不符，原表：{0}，目标表：{1}'.format(self.total, len(db_data)))
@@ -427,6 +521,8 @@ class DBOperator:
         :param sink_db_data: 目标表所有数据
         :return: 返回不相同的数据数量
         """
+        if isinstance(source_db_data, DBTableData) and isinstance(sink_db_data, DBTableData):
+            return self._compare_column_data(source_db_data, sink_db_data)
         fail_count = 0
         for index, source_line in enumerate(source_db_data):
             sink_line = sink_db_data[index]
@@ -442,3 +538,192 @@ class DBOperator:
                                                       self.source_db.ALIAS, self.sink_db.ALIAS)
         return fail_count
 
+    def _compare_column_data(self, source_db_data, sink_db_data):
+        """
+        列式融合数据按列比较，每列的字段信息只获取一次，比较规则的参数与逐行比较一致
+        """
+        fail_count = 0
+        if len(source_db_data) == 0:
+            return fail_count
+        for position, column in enumerate(source_db_data.names):
+            source_column_info = source_db_data.columns[position]
+            sink_column_info = sink_db_data.info(column)
+            sink_values = sink_db_data.column(column)
+            for index, source_column_value in enumerate(source_db_data.values[position]):
+                # check value
+                fail_count += self.value_compare_rule(index, column, source_column_value, sink_values[index],
+                                                      source_column_info, sink_column_info,
+                                                      self.source_db.ALIAS, self.sink_db.ALIAS)
+        return fail_count
+
+    def _get_compare_keys(self, key_columns=None):
+        """
+        获取数据比较的关联字段
+        未指定时依次使用：原表主键，SORTED_AND_UNIQUE_COLUMN_NAME字段
+        :param key_columns: 指定的关联字段，str或list
+        :return: [关联字段名...]
+        """
+        if key_columns:
+            if isinstance(key_columns, str):
+                key_columns = [key_columns]
+            return [x.lower() for x in key_columns]
+        source_table_info = self.source_db.get_table_info()
+        if source_table_info.primary_keys:
+            return [x.name.lower() for x in source_table_info.primary_keys]
+        if SORTED_AND_UNIQUE_COLUMN_NAME in [x.name.lower() for x in source_table_info.columns]:
+            return [SORTED_AND_UNIQUE_COLUMN_NAME]
+        raise CompareKeyNotInTableColumnException('表没有主键或{0}字段，请指定比较关联字段'.
+                                                  format(SORTED_AND_UNIQUE_COLUMN_NAME))
+
+    @staticmethod
+    def _get_compare_key_value(line, key_columns):
+        """
+        获取一行融合数据的关联值，与默认值比较规则一致，基于str进行关联
+        """
+        try:
+            return tuple(str(line[column]['value']) for column in key_columns)
+        except KeyError:
+            raise CompareKeyNotInTableColumnException('表比较关联字段不存在，关联字段: {0}，表字段: {1}'.
+                                                      format(key_columns, list(line.keys())))
+
+    @compare_call
+    def compare_data_by_key(self, source_db_data, sink_db_data, key_columns=None):
+        """
+        基于关联字段，对原表数据以及目标表数据进行哈希关联后比较数据值
+        目标表数据基于关联字段建立哈希索引，原表数据逐行探测，不依赖两边数据的排序，不需指定order_by
+        :param source_db_data: 原表所有数据，可为任意可迭代对象
+        :param sink_db_data: 目标表所有数据，可为任意可迭代对象
+        :param key_columns: 关联字段，str或list，未指定时依次使用原表主键，SORTED_AND_UNIQUE_COLUMN_NAME字段
+        :return: DBCompareResult
+        """
+        key_columns = self._get_compare_keys(key_columns)
+        print('基于{0}字段关联比较表数据'.format(key_columns))
+        result = DBCompareResult()
+        self._compare_lines_by_key(source_db_data, sink_db_data, key_columns, result)
+        self._print_compare_result(result)
+        return result
+
+    def _compare_lines_by_key(self, source_db_data, sink_db_data, key_columns, result):
+        """
+        基于关联字段哈希关联比较两端数据，比较结果累加至result
+        """
+        # 目标表数据基于关联字段建立哈希索引，关联值重复的行视为目标表多余行
+        sink_index = {}
+        for sink_line in sink_db_data:
+            key = self._get_compare_key_value(sink_line, key_columns)
+            if key in sink_index:
+                result.extra_in_sink.append(key)
+                continue
+            sink_index[key] = sink_line
+
+        # 原表数据逐行探测目标表索引
+        for index, source_line in enumerate(source_db_data):
+            key = self._get_compare_key_value(source_line, key_columns)
+            sink_line = sink_index.pop(key, None)
+            if sink_line is None:
+                result.missing_in_sink.append(key)
+                continue
+            fail_count = 0
+            for column, source_dict in source_line.items():
+                source_column_info = source_dict['info']
+                source_column_value = source_dict['value']
+                sink_column_info = sink_line[column]['info']
+                sink_column_value = sink_line[column]['value']
+
+                # check value
+                fail_count += self.value_compare_rule(index, column, source_column_value, sink_column_value,
+                                                      source_column_info, sink_column_info,
+                                                      self.source_db.ALIAS, self.sink_db.ALIAS)
+            if fail_count:
+                result.mismatched.append((key, fail_count))
+                result.value_fail_count += fail_count
+            else:
+                result.matched += 1
+
+        # 目标表索引中剩余未被关联的行，为目标表多余行
+        result.extra_in_sink.extend(sink_index.keys())
+
+    @staticmethod
+    def _print_compare_result(result):
+        for key in result.missing_in_sink:
+            print('目标表缺失数据，关联值: {0}'.format(key))
+        for key in result.extra_in_sink:
+            print('目标表多余数据，关联值: {0}'.format(key))
+        print(result)
+
+    def _get_chunk_checksums(self, source_table_info, sink_table_info, key_column):
+        """
+        获取两端表的分块校验值，参与校验的字段为两端同名（忽略大小写）的字段
+        :return: 原表分块校验值, 目标表分块校验值, 原表分块字段名, 目标表分块字段名
+        """
+        # 不同格式族的数据库字段转为文本的格式不同（如小数末尾的0、日期格式），几乎所有分块都会校验不一致
+        source_family = self.source_db.CHECKSUM_FAMILY or self.source_db.ALIAS
+        sink_family = self.sink_db.CHECKSUM_FAMILY or self.sink_db.ALIAS
+        if source_family != sink_family:
+            raise ChecksumNotSupportedException('原表({0})与目标表({1})字段文本格式不同，校验值不可比较'.format(
+                self.source_db.ALIAS, self.sink_db.ALIAS))
+        sink_names = {x.name.lower(): x.name for x in sink_table_info.columns}
+        source_names = {x.name.lower(): x for x in source_table_info.columns}
+        if key_column not in source_names or key_column not in sink_names:
+            raise CompareKeyNotInTableColumnException('分块字段{0}不存在'.format(key_column))
+        if not re.search(r'int|number|numeric|decimal|serial', str(source_names[key_column].data_type), re.I):
+            raise ChecksumNotSupportedException('分块字段{0}需为整数类型'.format(key_column))
+
+        column_names = [x.name.lower() for x in source_table_info.columns if x.name.lower() in sink_names]
+        source_key = source_names[key_column].name
+        sink_key = sink_names[key_column]
+        source_chunks = self.source_db.get_chunk_checksums(
+            source_key, [source_names[x].name for x in column_names], self.checksum_chunk_size)
+        sink_chunks = self.sink_db.get_chunk_checksums(
+            sink_key, [sink_names[x] for x in column_names], self.checksum_chunk_size)
+        return source_chunks, sink_chunks, source_key, sink_key
+
+    @compare_call
+    def compare_data_by_checksum(self, key_column=None):
+        """
+        分块校验比较原表与目标表数据
+        基于分块字段值将两端表划分为多个分块，每个分块的行数与哈希校验值在各自数据库内计算
+        仅拉取校验值不一致的分块数据，并基于分块字段关联比较，数据同步正确时几乎不需传输表数据
+        数据库不支持分块校验，两端数据库的字段文本格式族（CHECKSUM_FAMILY）不同，或分块字段不满足条件时，拉取全表数据基于关联字段比较
+        注：同一格式族的数据库字段文本格式仍可能存在差异，此类分块会被判定为不一致，并由逐行比较给出最终结果
+        :param key_column: 分块字段，需为唯一的整数字段，未指定时依次使用原表单一主键，SORTED_AND_UNIQUE_COLUMN_NAME字段
+        :return: DBCompareResult
+        """
+        key_columns = self._get_compare_keys(key_column)
+        print('基于{0}字段分块校验比较表数据，分块跨度: {1}'.format(key_columns, self.checksum_chunk_size))
+        result = DBCompareResult()
+        source_table_info = self.source_db.get_table_info()
+        sink_table_info = self.sink_db.get_table_info()
+
+        try:
+            if len(key_columns) != 1:
+                raise ChecksumNotSupportedException('分块校验仅支持单一分块字段: {0}'.format(key_columns))
+            source_chunks, sink_chunks, source_key, sink_key = self._get_chunk_checksums(
+                source_table_info, sink_table_info, key_columns[0])
+        except Exception as e:
+            # 分块校验失败时，回退为全表关联比较，比较结果不受影响
+            print('无法分块校验，基于关联字段比较全表数据: {0}'.format(e))
+            source_db_data = self.combine_schema_and_data(
+                source_table_info, self.source_db.iter_table_data(self.fetch_batch_size))
+            sink_db_data = self.combine_schema_and_data(
+                sink_table_info, self.sink_db.iter_table_data(self.fetch_batch_size))
+            self._compare_lines_by_key(source_db_data, sink_db_data, key_columns, result)
+            self._print_compare_result(result)
+            return result
+
+        for chunk in sorted(set(source_chunks.keys()) | set(sink_chunks.keys())):
+            source_chunk = source_chunks.get(chunk)
+            sink_chunk = sink_chunks.get(chunk)
+            if source_chunk == sink_chunk:
+                result.matched += source_chunk[0]
+                continue
+            # 校验不一致的分块，拉取两端数据逐行比较
+            print('分块{0}校验不一致，原表(行数, 校验值): {1}，目标表(行数, 校验值): {2}'.format(
+                chunk, source_chunk, sink_chunk))
+            source_db_data = self.combine_schema_and_data(
+                source_table_info, self.source_db.get_chunk_data(source_key, chunk, self.checksum_chunk_size))
+            sink_db_data = self.combine_schema_and_data(
+                sink_table_info, self.sink_db.get_chunk_data(sink_key, chunk, self.checksum_chunk_size))
+            self._compare_lines_by_key(source_db_data, sink_db_data, key_columns, result)
+        self._print_compare_result(result)
+        return result
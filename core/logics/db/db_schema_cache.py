@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# encoding: utf-8
+import time
+import threading
+from core import config
+
+
+class DBSchemaCache:
+    """
+    进程内共享的表结构缓存，基于数据库区分，缓存每张表的字段信息 [(字段名, 字段类型)...]
+    用于需单独查询元数据的数据库（如Hive metastore），同一数据库中的表在实例化时登记，
+    缓存未命中时一次批量查询当前表及所有已登记但尚未查询过的表，多张表只需一次元数据查询，
+    缓存过期的其他表不随之重新查询，仅在各自被获取时查询
+    通过驱动执行的DDL需调用invalidate使对应表的缓存失效，缓存超过ttl秒后也会重新查询，用于感知其他进程修改的表结构
+    """
+
+    def __init__(self, ttl=10):
+        """
+        :param ttl: 缓存有效时间（秒）
+        """
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # 已缓存的字段信息 {database_key: {table_name: ([(字段名, 字段类型)...], 查询时间)}}
+        self._tables = {}
+        # 已登记的表 {database_key: {table_name...}}
+        self._registered = {}
+
+    def register(self, database_key, table_name):
+        """
+        登记表，缓存未命中时与同一数据库中其他尚未查询过的表一起批量查询
+        :param database_key: 数据库标识，可hash
+        :param table_name: 表名
+        """
+        with self._lock:
+            self._registered.setdefault(database_key, set()).add(table_name)
+
+    def get(self, database_key, table_name, loader, batch=True):
+        """
+        获取表的字段信息，缓存未命中时通过loader查询
+        :param database_key: 数据库标识，可hash
+        :param table_name: 表名
+        :param loader: 查询字段信息的方法，参数为表名列表，返回{表名: [(字段名, 字段类型)...]}
+        :param batch: 是否同时查询同一数据库中已登记但尚未查询过的表，为False时仅查询当前表
+        :return: [(字段名, 字段类型)...]，表不存在时返回空列表
+        """
+        now = time.time()
+        with self._lock:
+            tables = self._tables.setdefault(database_key, {})
+            cached = tables.get(table_name)
+            if cached is not None and now - cached[1] <= self.ttl:
+                return cached[0]
+            registered = self._registered.setdefault(database_key, set())
+            registered.add(table_name)
+            table_names = [table_name]
+            if batch:
+                table_names += sorted(name for name in registered if name not in tables and name != table_name)
+
+        result = loader(table_names)
+        with self._lock:
+            tables = self._tables.setdefault(database_key, {})
+            for name, columns in result.items():
+                # 表不存在时不缓存，避免表被其他进程创建后仍返回空结构
+                if columns:
+                    tables[name] = (list(columns), now)
+        return list(result.get(table_name) or [])
+
+    def invalidate(self, database_key, table_name=None, unregister=False):
+        """
+        使缓存失效
+        :param database_key: 数据库标识
+        :param table_name: 表名，为None时使该数据库所有表的缓存失效
+        :param unregister: 是否同时取消登记（如表已删除）
+        """
+        with self._lock:
+            tables = self._tables.get(database_key, {})
+            registered = self._registered.get(database_key, set())
+            if table_name is None:
+                tables.clear()
+                if unregister:
+                    registered.clear()
+                return
+            tables.pop(table_name, None)
+            if unregister:
+                registered.discard(table_name)
+
+
+# 进程内共享的表结构缓存，所有DBDriver实例共用
+DB_SCHEMA_CACHE = DBSchemaCache(config.DB_SCHEMA_CACHE_TTL)
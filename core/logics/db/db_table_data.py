@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+
+class DBRow:
+    """
+    列式融合数据中一行数据的访问对象
+    row[column_name]返回{'info': DBColumn, 'value': value}，与原融合数据的行格式一致
+    已有的等待条件lambda（如row['id']['value']=='1'）及数据比较规则无需修改即可使用
+    """
+
+    __slots__ = ('table', 'index')
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    def __getitem__(self, column_name):
+        position = self.table.positions[column_name]
+        return {'info': self.table.columns[position], 'value': self.table.values[position][self.index]}
+
+    def get(self, column_name, default=None):
+        if column_name not in self.table.positions:
+            return default
+        return self[column_name]
+
+    def keys(self):
+        return list(self.table.names)
+
+    def values(self):
+        return [self[name] for name in self.table.names]
+
+    def items(self):
+        return [(name, self[name]) for name in self.table.names]
+
+    def __iter__(self):
+        return iter(self.table.names)
+
+    def __contains__(self, column_name):
+        return column_name in self.table.positions
+
+    def __len__(self):
+        return len(self.table.names)
+
+    def __eq__(self, other):
+        if isinstance(other, DBRow):
+            other = dict(other.items())
+        return dict(self.items()) == other
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+class DBTableData:
+    """
+    列式存储的融合数据
+    字段信息只保存一份，每个字段的值保存在各自的列表中，不再为每个单元格创建字典
+    可按行下标访问及遍历，每行为DBRow对象，与原融合数据[{dict}...]的使用方式兼容
+    """
+
+    __slots__ = ('columns', 'names', 'positions', 'values')
+
+    def __init__(self, columns):
+        """
+        :param columns: 所有字段信息 [DBColumn...]，字段名统一转换为小写
+        """
+        self.columns = tuple(columns)
+        self.names = tuple(x.name.lower() for x in self.columns)
+        self.positions = {name: position for position, name in enumerate(self.names)}
+        self.values = tuple([] for _ in self.columns)
+
+    def append(self, line):
+        """
+        添加一行数据，数据需基于字段顺序
+        """
+        for column_values, value in zip(self.values, line):
+            column_values.append(value)
+
+    def extend(self, lines):
+        for line in lines:
+            self.append(line)
+
+    def info(self, column_name):
+        """
+        获取某字段的字段信息DBColumn
+        """
+        return self.columns[self.positions[column_name]]
+
+    def column(self, column_name):
+        """
+        获取某字段的所有值
+        """
+        return self.values[self.positions[column_name]]
+
+    def sort(self, order_by, reverse=False):
+        """
+        基于某字段的值对所有行排序，排序稳定
+        :param order_by: 排序字段
+        :param reverse: 是否降序
+        """
+        order_values = self.column(order_by)
+        order = sorted(range(len(self)), key=order_values.__getitem__, reverse=reverse)
+        for column_values in self.values:
+            column_values[:] = [column_values[index] for index in order]
+
+    def __len__(self):
+        return len(self.values[0]) if self.values else 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            table_data = DBTableData(self.columns)
+            for column_values, values in zip(table_data.values, self.values):
+                column_values.extend(values[index])
+            return table_data
+        count = len(self)
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError('融合数据行号超出范围: {0}'.format(index))
+        return DBRow(self, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield DBRow(self, index)
+
+    def __repr__(self):
+        return 'DBTableData(字段: {0}，行数: {1})'.format(list(self.names), len(self))
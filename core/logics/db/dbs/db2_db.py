@@ -190,6 +190,8 @@ create table {schema}."{table_name}"
             'update {schema}."{table_name}" set {table_columns} {condition}',
         'delete_data':
             'delete from {schema}."{table_name}" {condition}',
+        'ping':
+            "select 1 from sysibm.sysdummy1",
         'table_exist':
             "SELECT * FROM syscat.TABLES t WHERE tabname='{0}' and tabschema = '{1}'"
     }
@@ -202,16 +204,14 @@ create table {schema}."{table_name}"
         self.database = db_config["database"]
         self.schema = db_config["schema"]
         self.table_name = table_name
-        self.db = self.__connect()
 
         # 是否手动提交变化，不开启则为自动提交，开启后可进行事务模式测试
         self.manual_commit = False
 
-    def __del__(self):
-        try:
-            ibm_db.close(self.db)
-        except:
-            pass
+    @lazy_connection
+    def db(self):
+        return self._borrow_connection(
+            self.__connect, (self.host, self.port, self.user, self.password, self.database), close=ibm_db.close)
 
     def __connect(self):
         print('连接DB2数据库 host: {0}, port: {1}, user: {2}, passwd: {3}, db: {4}'.format(
@@ -220,6 +220,12 @@ create table {schema}."{table_name}"
             self.database, self.host, self.port, self.user, self.password), "", "")
         return db
 
+    def _ping_connection(self, conn):
+        ibm_db.exec_immediate(conn, self.sql('ping'))
+
+    def _reset_connection(self, conn):
+        ibm_db.rollback(conn)
+
     @db_call
     def execute(self, sql, fetch_all=True, sql_params=None, handle_exception=False):
         print('SQL: {0}'.format(sql))
@@ -249,6 +255,28 @@ create table {schema}."{table_name}"
             if not self.manual_commit:
                 ibm_db.commit(self.db)
 
+    def execute_stream(self, sql, batch_size=1000):
+        """
+        基于ibm_db逐行流式执行查询，逐行返回结果
+        ibm_db由客户端按块预取数据，batch_size不生效，仅用于保持接口一致
+        :param sql: 查询语句
+        :param batch_size: 每次从数据库获取的行数
+        """
+        print('SQL: {0}'.format(sql))
+        count = 0
+        try:
+            stmt = ibm_db.exec_immediate(self.db, sql)
+            row = ibm_db.fetch_tuple(stmt)
+            while row:
+                count += 1
+                yield row
+                row = ibm_db.fetch_tuple(stmt)
+        finally:
+            print('RET: 共{0}行'.format(count))
+            # 是否手动提交变化，不开启则为自动提交，开启后可进行事务模式测试
+            if not self.manual_commit:
+                ibm_db.commit(self.db)
+
     @db_step('获取DB2表结构')
     def get_table_info(self):
         print('表名: {0}'.format(self.table_name))
@@ -305,6 +333,11 @@ create table {schema}."{table_name}"
         results = self.execute(self.sql('get_all_data').format(self.schema, self.table_name))
         return results
 
+    @db_step('流式获取DB2表所有数据')
+    def iter_table_data(self, batch_size=1000):
+        print('表名: {0}'.format(self.table_name))
+        return self.execute_stream(self.sql('get_all_data').format(self.schema, self.table_name), batch_size)
+
     @db_step('删除DB2表')
     def delete_table(self, raise_error=True):
         print('表名: {0}'.format(self.table_name))
@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 # encoding: utf-8
+import io
 import collections
 from enum import Enum
 from core.logics.other.dp_ftp import FTP
@@ -44,6 +45,9 @@ class FtpDB(DBDriver):
     # FTP文件所需的Schema关联文件后缀
     SCHEMA_EXT = '.yml'
 
+    # 进程内缓存的自增字段最后生成的值，{(host, port, 文件路径): (最后生成的值, 写入后的文件大小)}
+    _LAST_IDS = {}
+
     def __init__(self, db_config: dict, file_name, file_type: FtpFileType, encoding='utf8'):
         self.host = db_config["ip"]
         self.port = db_config["port"]
@@ -66,16 +70,23 @@ class FtpDB(DBDriver):
         # 但如出现特殊情况文件未删除，建议将self.download_path配置到TestBase.report_path路径
         self.download_path = ''
 
-        self.db = self.__connect()
         # 默认使用的行、列分隔符，可在初始化后被重写
         self.line_end = config.DEFAULT_LINEEND
         self.separator = config.DEFAULT_SEPARATOR
 
-    def __del__(self):
-        try:
-            self.db.close()
-        except:
-            pass
+        # 是否以追加方式插入数据，开启时仅通过APPE上传新增的数据，自增字段基于进程内缓存或文件末尾数据获取
+        # 关闭时下载所有数据，与新增数据合并后重新上传整个文件
+        self.append_mode = True
+
+        # 追加插入时，从文件末尾读取数据的初始字节数，不足一行时加倍读取
+        self.tail_size = 65536
+
+        # 流式读取文件时，每次从数据连接读取的字节数
+        self.chunk_size = 65536
+
+    @lazy_connection
+    def db(self):
+        return self.__connect()
 
     def __connect(self):
         print('连接FTP host: {0}, port: {1}, user: {2}, passwd: {3}, root: {4}'.format(
@@ -105,36 +116,136 @@ class FtpDB(DBDriver):
             for line in data:
                 f.write(json.dumps(line, ensure_ascii=False) + '\n')
 
+    def __format_lines(self, table_data, table_info):
+        """
+        将数据转换为与__create_file, __create_json_file相同格式的文件内容
+        """
+        lines = []
+        for data in table_data:
+            print(str(data))
+            if self.file_type == FtpFileType.csv:
+                lines.append(self.separator.join(['"{0}"'.format(str(x) if x is not None else '') for x in data])
+                             + self.line_end)
+            else:
+                data_dict = collections.OrderedDict()
+                for index, column in enumerate(table_info.columns):
+                    data_dict[column.name] = data[index]
+                lines.append(json.dumps(data_dict, ensure_ascii=False) + '\n')
+        return ''.join(lines).encode(self.encoding)
+
+    def __get_file_size(self, file_name):
+        # SIZE需在二进制模式下返回准确的字节数
+        self.db.voidcmd('TYPE I')
+        return self.db.size(self.root + '/' + file_name)
+
     @db_call
-    def __fetch_all_data(self, file_name):
-        # 下载文件、读取文件信息、删除文件
-        file_path = os.path.join(self.download_path, file_name)
-        if os.path.exists(file_path):
-            os.remove(file_path)
-        with open(file_path, "wb") as f:
-            self.db.retrbinary('RETR {0}'.format(self.root + '/' + file_name), f.write)
-        with open(file_path, 'r', encoding=self.encoding) as f:
-            result = f.readlines()
-        os.remove(file_path)
+    def __fetch_tail_lines(self, file_name, file_size):
+        """
+        通过REST从文件末尾开始下载，返回末尾完整的数据行，读取量与文件大小无关
+        """
+        line_end = self.line_end if self.file_type == FtpFileType.csv else '\n'
+        tail_size = self.tail_size
+        while True:
+            offset = max(file_size - tail_size, 0)
+            chunks = []
+            self.db.retrbinary('RETR {0}'.format(self.root + '/' + file_name), chunks.append,
+                               rest=offset if offset else None)
+            lines = b''.join(chunks).decode(self.encoding, errors='replace').split(line_end)
+            # 非文件开头时，第一行可能不完整
+            if offset:
+                lines = lines[1:]
+            lines = [x for x in lines if x.strip()]
+            if lines or not offset:
+                return lines
+            tail_size *= 2
+
+    def __parse_line(self, line, decoder=None):
+        """
+        解析一行数据，与__fetch_all_data的解析方式一致
+        """
+        if self.file_type == FtpFileType.csv:
+            # 以分隔符分列，去除信息双引号
+            return [i[1:-1] for i in line.split(self.separator)]
+        decoder = decoder or JsonDecoder(lower_key=True, encoding=self.encoding)
+        return list(decoder.decode(line).values())
+
+    def __get_last_id(self, index):
+        """
+        获取自增字段当前的最后值及文件大小，文件没有数据时返回-1
+        文件大小与进程内缓存一致时直接使用缓存值，否则仅读取文件末尾数据
+        :param index: 自增字段下标
+        """
+        try:
+            file_size = self.__get_file_size(self.table_name)
+        except Exception as e:
+            # 服务器不支持SIZE时，下载所有数据获取最后值
+            print(e)
+            table_data = self.get_table_data()
+            return (int(table_data[-1][index]) if table_data else -1), None
+        cache_key = (self.host, self.port, self.root + '/' + self.table_name)
+        if cache_key in self._LAST_IDS and self._LAST_IDS[cache_key][1] == file_size:
+            print('文件名: {0}, 使用缓存的自增字段值: {1}'.format(self.table_name, self._LAST_IDS[cache_key][0]))
+            return self._LAST_IDS[cache_key][0], file_size
+        lines = self.__fetch_tail_lines(self.table_name, file_size) if file_size else []
+        if not lines:
+            return -1, file_size
+        return int(self.__parse_line(lines[-1])[index]), file_size
 
-        # 解析文件
-        results = []
+    @db_call
+    def __append_data_to_server(self, table_data, table_info):
+        """
+        通过APPE仅上传新增的数据，不需下载及重新上传已有数据
+        :return: 上传的字节数
+        """
+        content = self.__format_lines(table_data, table_info)
+        self.db.storbinary('APPE {0}'.format(self.root + '/' + self.table_name), io.BytesIO(content))
+        return len(content)
+
+    def __append_rows(self, table_info, make_rows):
+        """
+        追加插入数据
+        :param make_rows: 基于自增字段最后值生成数据的函数，逐行返回(数据行, 新的自增字段值)
+        """
+        auto_inc_index = next((x for x, y in enumerate(table_info.columns) if y.auto_inc), None)
+        if auto_inc_index is not None:
+            last_id, file_size = self.__get_last_id(auto_inc_index)
+        else:
+            last_id, file_size = None, None
+        new_table_data = []
+        for row, last_id in make_rows(last_id):
+            new_table_data.append(row)
+        appended_size = self.__append_data_to_server(new_table_data, table_info)
+        if auto_inc_index is not None and file_size is not None:
+            self._LAST_IDS[(self.host, self.port, self.root + '/' + self.table_name)] = \
+                (last_id, file_size + appended_size)
+
+    def __iter_rows(self, file_name):
+        """
+        流式下载并逐行解析文件，数据直接从数据连接读取，不生成临时文件，也不将整个文件读入内存
+        """
+        chunks = self.db.retrbinary_iter('RETR {0}'.format(self.root + '/' + file_name), self.chunk_size)
         if self.file_type == FtpFileType.csv:
-            # 以分行符分行
-            result = ''.join(result).split(self.line_end)
-            for line in result:
+            line_end = self.line_end
+            decoder = None
+        else:
+            line_end = '\n'
+            decoder = JsonDecoder(lower_key=True, encoding=self.encoding)
+        count = 0
+        try:
+            for line in iter_lines(chunks, line_end, self.encoding):
                 if not line.strip():
                     continue
-                # 以分隔符分列
-                row_list = line.split(self.separator)
-                # 去除信息双引号
-                results.append([i[1:-1] for i in row_list])
-            print('RET: {0}'.format(results))
-        else:
-            for msg in result:
-                result_dict = format_json(msg, encoding=self.encoding, lower_key=True)
-                results.append(list(result_dict.values()))
-        return results
+                count += 1
+                yield self.__parse_line(line, decoder)
+        finally:
+            chunks.close()
+            print('RET: 共{0}行'.format(count))
+            if decoder is not None:
+                print(decoder.summary())
+
+    @db_call
+    def __fetch_all_data(self, file_name):
+        return list(self.__iter_rows(file_name))
 
     @db_call
     def __get_table_info(self):
@@ -216,9 +327,14 @@ class FtpDB(DBDriver):
         print('文件名: {0}'.format(self.table_name))
         return self.__fetch_all_data(self.table_name)
 
+    def iter_table_data(self, batch_size=1000):
+        print('文件名: {0}'.format(self.table_name))
+        return self.__iter_rows(self.table_name)
+
     @db_step('删除FTP文件')
     def delete_table(self, raise_error=True):
         print('文件名: {0}'.format(self.table_name))
+        self._LAST_IDS.pop((self.host, self.port, self.root + '/' + self.table_name), None)
         self.__delete(self.table_name, raise_error)
         if self.table_info is None:
             self.__delete(self.table_schema_name, raise_error)
@@ -279,34 +395,53 @@ class FtpDB(DBDriver):
         # 获取DBTable对象
         table_info = self.get_table_info()
 
+        def make_rows(last_id):
+            for _ in range(count):
+                values, last_id = self.__generate_row(table_info, last_id)
+                yield values, last_id
+
+        # 追加模式仅上传新增数据
+        if self.append_mode:
+            self.__append_rows(table_info, make_rows)
+            return
+
         # 获取当前所有数据
         table_data = self.get_table_data()
 
         # 插入多行数据
-        for _ in range(count):
-            values = []
-            for index, column in enumerate(table_info.columns):
-                # 自增字段将基于最大数据id
-                if column.auto_inc:
-                    if len(table_data) > 0:
-                        last_id = table_data[-1][index]
-                    else:
-                        last_id = -1
-                    values.append(int(last_id) + 1)
-                # 如果字段名为SORTED_AND_UNIQUE_COLUMN_NAME，将会随机生成唯一值
-                elif column.name == SORTED_AND_UNIQUE_COLUMN_NAME:
-                    values.append(random_sorted_and_unique_num())
-                # 如果字段允许为空，则有概率插入None
-                elif not column.not_null and random_int(0, 9) == 0:
-                    values.append(None)
-                # 基于数据类型随机生成符合类型、精度、标度的数据
-                else:
-                    random_value = getattr(FtpData, column.column_type + '_data')(
-                        column.precision, column.scale, column.unsigned, column_type=column.column_type)
-                    values.append(random_value)
+        last_id = -1
+        auto_inc_index = next((x for x, y in enumerate(table_info.columns) if y.auto_inc), None)
+        if auto_inc_index is not None and len(table_data) > 0:
+            last_id = int(table_data[-1][auto_inc_index])
+        for values, last_id in make_rows(last_id):
             table_data.append(values)
         self.__upload_data_to_server(table_data, table_info)
 
+    def __generate_row(self, table_info, last_id):
+        """
+        生成一行随机数据
+        :param last_id: 自增字段的最后值
+        :return: 数据行, 新的自增字段值
+        """
+        values = []
+        for index, column in enumerate(table_info.columns):
+            # 自增字段将基于最大数据id
+            if column.auto_inc:
+                last_id = int(last_id) + 1
+                values.append(last_id)
+            # 如果字段名为SORTED_AND_UNIQUE_COLUMN_NAME，将会随机生成唯一值
+            elif column.name == SORTED_AND_UNIQUE_COLUMN_NAME:
+                values.append(random_sorted_and_unique_num())
+            # 如果字段允许为空，则有概率插入None
+            elif not column.not_null and random_int(0, 9) == 0:
+                values.append(None)
+            # 基于数据类型随机生成符合类型、精度、标度的数据
+            else:
+                random_value = getattr(FtpData, column.column_type + '_data')(
+                    column.precision, column.scale, column.unsigned, column_type=column.column_type)
+                values.append(random_value)
+        return values, last_id
+
     @db_step('手动插入FTP表数据')
     def manual_insert_data(self, column_names: list, data_values: list):
         print('表名: {0}, 手动插入数据'.format(self.table_name))
@@ -314,29 +449,39 @@ class FtpDB(DBDriver):
         # 获取DBTable对象
         table_info = self.get_table_info()
 
+        def make_rows(last_id):
+            values = []
+            for index, column in enumerate(table_info.columns):
+                # 自增字段将基于最大数据id
+                if column.auto_inc:
+                    last_id = int(last_id) + 1
+                    values.append(last_id)
+                # 如果字段名为SORTED_AND_UNIQUE_COLUMN_NAME，将会随机生成唯一值
+                elif column.name == SORTED_AND_UNIQUE_COLUMN_NAME:
+                    values.append(random_sorted_and_unique_num())
+                # 插入用户指定数据
+                elif column.name in [x.lower() for x in column_names]:
+                    index = [x.lower() for x in column_names].index(column.name)
+                    values.append(data_values[index])
+                # 未指定则插入None
+                else:
+                    values.append(None)
+            yield values, last_id
+
+        # 追加模式仅上传新增数据
+        if self.append_mode:
+            self.__append_rows(table_info, make_rows)
+            return
+
         # 获取当前所有数据
         table_data = self.get_table_data()
 
-        values = []
-        for index, column in enumerate(table_info.columns):
-            # 自增字段将基于最大数据id
-            if column.auto_inc:
-                if len(table_data) > 0:
-                    last_id = table_data[-1][index]
-                else:
-                    last_id = -1
-                values.append(int(last_id) + 1)
-            # 如果字段名为SORTED_AND_UNIQUE_COLUMN_NAME，将会随机生成唯一值
-            elif column.name == SORTED_AND_UNIQUE_COLUMN_NAME:
-                values.append(random_sorted_and_unique_num())
-            # 插入用户指定数据
-            elif column.name in [x.lower() for x in column_names]:
-                index = [x.lower() for x in column_names].index(column.name)
-                values.append(data_values[index])
-            # 未指定则插入None
-            else:
-                values.append(None)
-        table_data.append(values)
+        last_id = -1
+        auto_inc_index = next((x for x, y in enumerate(table_info.columns) if y.auto_inc), None)
+        if auto_inc_index is not None and len(table_data) > 0:
+            last_id = int(table_data[-1][auto_inc_index])
+        for values, _ in make_rows(last_id):
+            table_data.append(values)
         self.__upload_data_to_server(table_data, table_info)
 
     @db_step('更新FTP表数据')
@@ -2,13 +2,11 @@
 # encoding: utf-8
 from decimal import *
 import collections
-import avro.schema
-from avro.datafile import DataFileWriter, DataFileReader
-from avro.io import DatumWriter, DatumReader
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 from hdfs.client import InsecureClient
 from core.logics.db.db_driver import *
-from hdfs.ext.avro import AvroReader
+from core.logics.db.db_avro_codec import AvroCodec
 
 
 class HDFSData:
@@ -76,6 +74,9 @@ class HDFSDB(DBDriver):
     AVRO_SCHEMA_NAME = 'parquetRecord'
     AVRO_SCHEMA_TYPE = 'record'
 
+    # 进程内缓存的自增字段最后生成的值，{(host, 文件路径): (最后生成的值, 写入后的文件大小)}
+    _LAST_IDS = {}
+
     def __init__(self, db_config: dict, file_name, file_type: HDFSFileType, encoding='utf8'):
         self.host = db_config["hdfs_web"]
         self.root = db_config["root"]
@@ -98,11 +99,30 @@ class HDFSDB(DBDriver):
         # 但如出现特殊情况文件未删除，建议将self.download_path配置到TestBase.report_path路径
         self.download_path = ''
 
-        self.db = self.__connect()
         # 默认使用的行、列分隔符，可在初始化后被重写
         self.line_end = config.DEFAULT_LINEEND
         self.separator = config.DEFAULT_SEPARATOR
 
+        # 流式读取文件时，每次读取的字节数
+        self.chunk_size = 65536
+
+        # 写入avro文件时的压缩方式，有效数据：null, deflate, snappy（需安装python-snappy）
+        self.avro_codec = 'null'
+
+        # 是否以追加方式插入数据，开启时仅通过append写入新增的数据（avro追加数据块），自增字段基于进程内缓存或文件末尾数据获取
+        # 关闭时下载所有数据，与新增数据合并后重新上传整个文件
+        self.append_mode = True
+
+        # 追加插入csv时，从文件末尾读取数据的初始字节数，不足一行时加倍读取
+        self.tail_size = 65536
+
+        # 表为多个分片文件组成的目录时，并行读取分片文件的线程数，为1时依次读取
+        self.read_workers = 4
+
+    @lazy_connection
+    def db(self):
+        return self.__connect()
+
     def __connect(self):
         print('连接HDFS host: {0}, root: {1}, user: {2}'.format(self.host, self.root, self.user))
         db = InsecureClient(self.host, user=self.user)
@@ -114,41 +134,175 @@ class HDFSDB(DBDriver):
                 f.write(self.separator.join(['"{0}"'.format(str(x) if x is not None else '') for x in line])
                         + self.line_end)
 
+    def __get_part_files(self, file_name):
+        """
+        获取表对应的数据文件，表为目录时返回目录下所有分片文件
+        分片文件基于文件名排序，忽略.和_开头的隐藏、标记文件（如_SUCCESS）
+        """
+        path = self.root + '/' + file_name
+        if self.db.status(path)['type'] != 'DIRECTORY':
+            return [file_name]
+        return [file_name + '/' + x for x in sorted(self.db.list(path)) if not x.startswith(('.', '_'))]
+
+    def __iter_file_rows(self, file_name):
+        """
+        流式读取并逐行解析单个文件，数据基于chunk_size分块读取，不生成临时文件，也不将整个文件读入内存
+        """
+        if self.file_type == HDFSFileType.csv:
+            with self.db.read(self.root + '/' + file_name, chunk_size=self.chunk_size) as reader:
+                # 以分行符分行
+                for line in iter_lines(reader, self.line_end, self.encoding):
+                    if not line.strip():
+                        continue
+                    # 以分隔符分列，去除信息双引号
+                    yield [i[1:-1] for i in line.split(self.separator)]
+        else:
+            # 基于avro头部schema的字段顺序返回数据，保证数据、字段有序
+            with self.db.read(self.root + '/' + file_name) as f:
+                reader = AvroCodec.read_file(f)
+                names = [column['name'].lower() for column in reader.writer_schema['fields']]
+                for msg in reader:
+                    yield [msg[name] for name in names]
+
+    def __iter_rows(self, file_name):
+        """
+        流式读取表的所有数据，表为目录时依次读取所有分片文件
+        """
+        count = 0
+        try:
+            for part_file in self.__get_part_files(file_name):
+                for row in self.__iter_file_rows(part_file):
+                    count += 1
+                    yield row
+        finally:
+            print('RET: 共{0}行'.format(count))
+
     @db_call
     def __fetch_all_data(self, file_name):
-        # 下载文件、读取文件信息、删除文件
-        file_path = os.path.join(self.download_path, file_name)
-        if os.path.exists(file_path):
-            os.remove(file_path)
-        self.db.download(self.root + '/' + file_name, file_path)
+        part_files = self.__get_part_files(file_name)
+        if len(part_files) <= 1 or self.read_workers <= 1:
+            return list(self.__iter_rows(file_name))
+
+        # 表为目录时，并行读取所有分片文件，结果基于分片文件顺序合并
+        def read_part(part_file):
+            return list(self.__iter_file_rows(part_file))
 
-        # 解析文件
         results = []
+        with ThreadPoolExecutor(max_workers=min(self.read_workers, len(part_files))) as executor:
+            for rows in executor.map(read_part, part_files):
+                results.extend(rows)
+        print('分片文件数: {0}, RET: 共{1}行'.format(len(part_files), len(results)))
+        return results
+
+    def __format_lines(self, table_data):
+        """
+        将数据转换为与__create_file相同格式的csv文件内容
+        """
+        lines = []
+        for line in table_data:
+            print(str(line))
+            lines.append(self.separator.join(['"{0}"'.format(str(x) if x is not None else '') for x in line])
+                         + self.line_end)
+        return ''.join(lines).encode(self.encoding)
+
+    @db_call
+    def __fetch_tail_lines(self, file_name, file_size):
+        """
+        基于offset从文件末尾开始读取，返回末尾完整的数据行，读取量与文件大小无关
+        """
+        tail_size = self.tail_size
+        while True:
+            offset = max(file_size - tail_size, 0)
+            with self.db.read(self.root + '/' + file_name, offset=offset, length=file_size - offset) as reader:
+                lines = reader.read().decode(self.encoding, errors='replace').split(self.line_end)
+            # 非文件开头时，第一行可能不完整
+            if offset:
+                lines = lines[1:]
+            lines = [x for x in lines if x.strip()]
+            if lines or not offset:
+                return lines
+            tail_size *= 2
+
+    @db_call
+    def __fetch_avro_header(self, file_name):
+        """
+        读取avro文件头部的字节数据，不足完整头部时加倍读取
+        """
+        size = 4096
+        while True:
+            with self.db.read(self.root + '/' + file_name, length=size) as reader:
+                data = reader.read()
+            header_size = AvroCodec.header_size(data)
+            if header_size is not None:
+                return data[:header_size]
+            if len(data) < size:
+                raise AvroCodecException('文件: {0}, 不是有效的avro文件'.format(file_name))
+            size *= 2
+
+    def __get_last_id(self, file_name, index):
+        """
+        获取自增字段当前的最后值及文件大小，文件没有数据时返回-1
+        文件大小与进程内缓存一致时直接使用缓存值，否则csv仅读取文件末尾数据，avro需读取整个文件
+        :param index: 自增字段下标
+        """
+        file_size = self.db.status(self.root + '/' + file_name)['length']
+        cache_key = (self.host, self.root + '/' + file_name)
+        if cache_key in self._LAST_IDS and self._LAST_IDS[cache_key][1] == file_size:
+            print('文件名: {0}, 使用缓存的自增字段值: {1}'.format(file_name, self._LAST_IDS[cache_key][0]))
+            return self._LAST_IDS[cache_key][0], file_size
+        last_row = None
         if self.file_type == HDFSFileType.csv:
-            # 以分行符分行
-            with open(file_path, 'r', encoding=self.encoding) as f:
-                result = f.readlines()
-            result = ''.join(result).split(self.line_end)
-            for line in result:
-                if not line.strip():
-                    continue
-                # 以分隔符分列
-                row_list = line.split(self.separator)
-                # 去除信息双引号
-                results.append([i[1:-1] for i in row_list])
-            print('RET: {0}'.format(results))
+            lines = self.__fetch_tail_lines(file_name, file_size) if file_size else []
+            if lines:
+                last_row = [i[1:-1] for i in lines[-1].split(self.separator)]
         else:
-            # 读取avro文件并转为OrderedDict，保证数据、字段有序
-            with DataFileReader(open(file_path, "rb"), DatumReader()) as reader:
-                schema = json.loads(reader.schema)
-                for msg in reader:
-                    each = collections.OrderedDict()
-                    for column in schema['fields']:
-                        name = column['name'].lower()
-                        each[name] = msg[name]
-                    results.append(list(each.values()))
-        os.remove(file_path)
-        return results
+            for last_row in self.__iter_file_rows(file_name):
+                pass
+        if last_row is None:
+            return -1, file_size
+        return int(last_row[index]), file_size
+
+    @db_call
+    def __append_data_to_server(self, file_name, table_data, table_info):
+        """
+        通过append仅写入新增的数据，csv追加数据行，avro基于已有文件头部追加数据块
+        :return: 写入的字节数
+        """
+        if self.file_type == HDFSFileType.csv:
+            content = self.__format_lines(table_data)
+        else:
+            codec = AvroCodec(self._get_avro_schema(table_info))
+
+            def records():
+                for data in table_data:
+                    print(str(data))
+                    data_dict = collections.OrderedDict()
+                    for index, column in enumerate(table_info.columns):
+                        data_dict[column.name] = data[index]
+                    yield data_dict
+
+            content = codec.append_blocks(self.__fetch_avro_header(file_name), records())
+        if content:
+            self.db.write(self.root + '/' + file_name, data=content, append=True)
+        return len(content)
+
+    def __append_rows(self, table_info, make_rows):
+        """
+        追加插入数据，表为目录时追加到最后一个分片文件
+        :param make_rows: 基于自增字段最后值生成数据的函数，逐行返回(数据行, 新的自增字段值)
+        """
+        file_name = self.__get_part_files(self.table_name)[-1]
+        auto_inc_index = next((x for x, y in enumerate(table_info.columns) if y.auto_inc), None)
+        if auto_inc_index is not None:
+            last_id, file_size = self.__get_last_id(file_name, auto_inc_index)
+        else:
+            last_id, file_size = None, None
+        new_table_data = []
+        for row, last_id in make_rows(last_id):
+            new_table_data.append(row)
+        appended_size = self.__append_data_to_server(file_name, new_table_data, table_info)
+        if auto_inc_index is not None:
+            self._LAST_IDS[(self.host, self.root + '/' + file_name)] = (last_id, file_size + appended_size)
 
     @db_call
     def __upload_file(self, local_file_path, file_name):
@@ -175,17 +329,19 @@ class HDFSDB(DBDriver):
             os.remove(table_file_path)
         # avro将会把数据与字段信息整合成后上传到服务器
         else:
-            schema = self._get_avro_schema(table_info)
-            table_file_path = os.path.join(self.download_path, self.table_name)
-            with DataFileWriter(open(table_file_path, "wb"), DatumWriter(), schema) as writer:
+            codec = AvroCodec(self._get_avro_schema(table_info), codec=self.avro_codec)
+
+            def records():
                 for data in table_data:
                     print(str(data))
                     data_dict = collections.OrderedDict()
                     for index, column in enumerate(table_info.columns):
                         data_dict[column.name] = data[index]
-                    writer.append(data_dict)
-            self.__upload_file(table_file_path, self.table_name)
-            os.remove(table_file_path)
+                    yield data_dict
+
+            # 编码后直接写入HDFS，不生成本地临时文件
+            with self.db.write(self.root + '/' + self.table_name, overwrite=True) as writer:
+                codec.write_file(writer, records())
 
     @db_step('获取HDFS文件结构')
     def get_table_info(self):
@@ -203,8 +359,9 @@ class HDFSDB(DBDriver):
             return table_info
         # avro 则读取avro头部schema信息
         else:
-            with AvroReader(self.db, self.root + '/' + self.table_name) as reader:
-                schema = reader.schema
+            # 表为目录时读取第一个分片文件的schema
+            with self.db.read(self.root + '/' + self.__get_part_files(self.table_name)[0]) as reader:
+                schema = AvroCodec.read_schema(reader)
             columns = []
             for column in schema['fields']:
                 name = column['name'].lower()
@@ -232,9 +389,17 @@ class HDFSDB(DBDriver):
         results = self.__fetch_all_data(self.table_name)
         return results
 
+    def iter_table_data(self, batch_size=1000):
+        print('文件名: {0}'.format(self.table_name))
+        return self.__iter_rows(self.table_name)
+
     @db_step('删除HDFS文件')
     def delete_table(self, raise_error=True):
         print('文件名: {0}'.format(self.table_name))
+        # 清除该文件或该目录下分片文件缓存的自增字段值
+        table_path = self.root + '/' + self.table_name + '/'
+        for key in [x for x in self._LAST_IDS.keys() if x[0] == self.host and (x[1] + '/').startswith(table_path)]:
+            del self._LAST_IDS[key]
         self.__delete(self.table_name, raise_error)
         if self.file_type == HDFSFileType.csv and self.table_info is None:
             self.__delete(self.table_schema_name, raise_error)
@@ -253,8 +418,7 @@ class HDFSDB(DBDriver):
             if column.default is not None:
                 field['default'] = column.default
             schema_json['fields'].append(field)
-        schema = avro.schema.parse(json.dumps(schema_json))
-        return schema
+        return schema_json
 
     @db_step('创建HDFS表')
     def create_table(self, table_info: DBTable):
@@ -317,38 +481,57 @@ class HDFSDB(DBDriver):
         # 获取DBTable对象
         table_info = self.get_table_info()
 
+        def make_rows(last_id):
+            for _ in range(count):
+                values, last_id = self.__generate_row(table_info, last_id)
+                yield values, last_id
+
+        # 追加模式仅写入新增数据
+        if self.append_mode:
+            self.__append_rows(table_info, make_rows)
+            return
+
         # 获取当前所有数据
         table_data = self.get_table_data()
 
         # 插入多行数据
-        for _ in range(count):
-            values = []
-            for index, column in enumerate(table_info.columns):
-                # 自增字段将基于最大数据id
-                if self.file_type == HDFSFileType.csv:
-                    function_name = column.column_type + '_data'
-                    if column.auto_inc:
-                        if len(table_data) > 0:
-                            last_id = table_data[-1][index]
-                        else:
-                            last_id = -1
-                        values.append(int(last_id) + 1)
-                else:
-                    function_name = column.data_type + '_data'
-                # 如果字段名为SORTED_AND_UNIQUE_COLUMN_NAME，将会随机生成唯一值
-                if column.name == SORTED_AND_UNIQUE_COLUMN_NAME:
-                    values.append(random_sorted_and_unique_num())
-                # 如果字段允许为空，则有概率插入None
-                elif not column.not_null and random_int(0, 9) == 0:
-                    values.append(None)
-                # 基于数据类型随机生成符合类型、精度、标度的数据
-                else:
-                    random_value = getattr(HDFSData, function_name)(
-                        column.precision, column.scale, column.unsigned, column_type=column.column_type)
-                    values.append(random_value)
+        last_id = -1
+        auto_inc_index = next((x for x, y in enumerate(table_info.columns) if y.auto_inc), None)
+        if auto_inc_index is not None and len(table_data) > 0:
+            last_id = int(table_data[-1][auto_inc_index])
+        for values, last_id in make_rows(last_id):
             table_data.append(values)
         self.__upload_data_to_server(table_data, table_info)
 
+    def __generate_row(self, table_info, last_id):
+        """
+        生成一行随机数据
+        :param last_id: 自增字段的最后值
+        :return: 数据行, 新的自增字段值
+        """
+        values = []
+        for column in table_info.columns:
+            if self.file_type == HDFSFileType.csv:
+                function_name = column.column_type + '_data'
+            else:
+                function_name = column.data_type + '_data'
+            # 自增字段将基于最大数据id
+            if column.auto_inc:
+                last_id = int(last_id) + 1
+                values.append(last_id)
+            # 如果字段名为SORTED_AND_UNIQUE_COLUMN_NAME，将会随机生成唯一值
+            elif column.name == SORTED_AND_UNIQUE_COLUMN_NAME:
+                values.append(random_sorted_and_unique_num())
+            # 如果字段允许为空，则有概率插入None
+            elif not column.not_null and random_int(0, 9) == 0:
+                values.append(None)
+            # 基于数据类型随机生成符合类型、精度、标度的数据
+            else:
+                random_value = getattr(HDFSData, function_name)(
+                    column.precision, column.scale, column.unsigned, column_type=column.column_type)
+                values.append(random_value)
+        return values, last_id
+
     @db_step('手动插入HDFS表数据')
     def manual_insert_data(self, column_names: list, data_values: list):
         print('表名: {0}, 手动插入数据'.format(self.table_name))
@@ -356,29 +539,39 @@ class HDFSDB(DBDriver):
         # 获取DBTable对象
         table_info = self.get_table_info()
 
+        def make_rows(last_id):
+            values = []
+            for index, column in enumerate(table_info.columns):
+                # 自增字段将基于最大数据id
+                if column.auto_inc:
+                    last_id = int(last_id) + 1
+                    values.append(last_id)
+                # 如果字段名为SORTED_AND_UNIQUE_COLUMN_NAME，将会随机生成唯一值
+                elif column.name == SORTED_AND_UNIQUE_COLUMN_NAME:
+                    values.append(random_sorted_and_unique_num())
+                # 插入用户指定数据
+                elif column.name in [x.lower() for x in column_names]:
+                    index = [x.lower() for x in column_names].index(column.name)
+                    values.append(data_values[index])
+                # 未指定则插入None
+                else:
+                    values.append(None)
+            yield values, last_id
+
+        # 追加模式仅写入新增数据
+        if self.append_mode:
+            self.__append_rows(table_info, make_rows)
+            return
+
         # 获取当前所有数据
         table_data = self.get_table_data()
 
-        values = []
-        for index, column in enumerate(table_info.columns):
-            # 自增字段将基于最大数据id
-            if column.auto_inc:
-                if len(table_data) > 0:
-                    last_id = table_data[-1][index]
-                else:
-                    last_id = -1
-                values.append(int(last_id) + 1)
-            # 如果字段名为SORTED_AND_UNIQUE_COLUMN_NAME，将会随机生成唯一值
-            elif column.name == SORTED_AND_UNIQUE_COLUMN_NAME:
-                values.append(random_sorted_and_unique_num())
-            # 插入用户指定数据
-            elif column.name in [x.lower() for x in column_names]:
-                index = [x.lower() for x in column_names].index(column.name)
-                values.append(data_values[index])
-            # 未指定则插入None
-            else:
-                values.append(None)
-        table_data.append(values)
+        last_id = -1
+        auto_inc_index = next((x for x, y in enumerate(table_info.columns) if y.auto_inc), None)
+        if auto_inc_index is not None and len(table_data) > 0:
+            last_id = int(table_data[-1][auto_inc_index])
+        for values, _ in make_rows(last_id):
+            table_data.append(values)
         self.__upload_data_to_server(table_data, table_info)
 
     @db_step('更新HDFS表数据')
@@ -462,17 +655,8 @@ class HDFSDB(DBDriver):
     @db_step('判断HDFS表是否存在')
     def is_table_exist(self):
         print('判断表名: {0}, 是否存在'.format(self.table_name))
-        file_path = os.path.join(self.download_path, self.table_name)
-        if os.path.exists(file_path):
-            os.remove(file_path)
-        try:
-            self.db.download(self.root + '/' + self.table_name, file_path)
-            os.remove(file_path)
-        except Exception as e:
-            if str(e).find('File does not exist') != -1:
-                return False
-            raise e
-        return True
+        # 仅获取文件状态，不下载文件，表为分片文件目录时同样适用
+        return self.db.status(self.root + '/' + self.table_name, strict=False) is not None
 
     @db_step('判断HDFS列是否存在')
     def is_column_exist(self, column_info: DBColumn):
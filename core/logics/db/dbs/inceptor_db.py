@@ -1,10 +1,14 @@
 #!/usr/bin/env python
 # encoding: utf-8
+import codecs
 import collections
 import avro.schema
 from enum import Enum
 from pyhive import hive
+from hdfs import InsecureClient
 from core.logics.db.db_driver import *
+from core.logics.db.db_schema_cache import DB_SCHEMA_CACHE
+from core.logics.db.db_hive_bulk_loader import HiveBulkLoader
 
 
 class InceptorData:
@@ -63,15 +67,31 @@ class InceptorFileType(Enum):
 class InceptorDB(DBDriver):
     ALIAS = 'INCEPTOR'
 
+    # 分块校验时字段转为文本的格式族
+    CHECKSUM_FAMILY = 'HIVE'
+
     # Avro schema字段信息
     AVRO_SCHEMA_NAME = 'parquetRecord'
     AVRO_SCHEMA_TYPE = 'record'
 
+    # decimal类型的精度、标度
+    DECIMAL_TYPE = re.compile(r'decimal\((.*),(.*)\)')
+
     query = {
         'get_table_schema':
             "desc {table_name}",
         'get_all_data':
             "select * from {0}",
+        'checksum_column':
+            "coalesce(cast({column} as string), '#NULL#')",
+        'checksum_separator':
+            ", '|', ",
+        'get_chunk_checksums':
+            "select floor({key} / {chunk_size}), count(*), "
+            "sum(cast(conv(substr(md5(concat({row_text})), 1, 8), 16, 10) as bigint)) "
+            "from {table_name} group by floor({key} / {chunk_size})",
+        'get_chunk_data':
+            "select * from {table_name} where {key} >= {lower} and {key} < {upper}",
         'delete_table':
             "drop table {0}",
         'create_table': '''
@@ -139,6 +159,8 @@ with serdeproperties
             "select * from {table_name} {condition}",
         'switch_to_external':
             "alter table {table_name} set tblproperties('EXTERNAL'='{external}')",
+        'ping':
+            "select 1",
         'table_exist':
             """select * from TBLS where DB_ID =
 (select DB_ID from DBS where NAME = '{0}') and TBL_NAME = '{1}'"""
@@ -161,9 +183,6 @@ with serdeproperties
         self.line_char = config.DEFAULT_LINE
         self.encoding = 'utf8'
 
-        # 连接服务器
-        self.db = self.__connect()
-
         # 是否手动提交变化，不开启则为自动提交，开启后可进行事务模式测试
         self.manual_commit = False
 
@@ -174,6 +193,20 @@ with serdeproperties
         self.buckets = None
         self.clustered = None
 
+        # 插入数据时，是否将数据按表的存储格式写入文件，上传到HDFS暂存目录后通过LOAD DATA INPATH导入
+        # 需在配置中提供hdfs_web（WebHDFS地址），parquet/orc格式还需安装pyarrow，写入或上传数据文件失败时改为分批INSERT，LOAD DATA失败时抛出异常
+        # 设置分桶信息时（分桶表及orc事务表不支持LOAD DATA）直接分批INSERT
+        self.bulk_load = True
+        self.hdfs_web = db_config.get("hdfs_web")
+        self.hdfs_user = db_config.get("hdfs_user", self.user)
+        self.hdfs_staging_path = self.root + '/.staging'
+        # 分批INSERT时每批的行数
+        self.batch_size = 1000
+
+        # 是否使用进程内共享的表结构缓存，Inceptor未连接metastore，每张表通过desc单独查询后缓存
+        # 关闭时每次获取表结构均执行desc
+        self.schema_cache = True
+
     def __connect(self):
         print('连接Inceptor host: {0}, port: {1}, username: {2}, password: {3}, database: {4}'.format(
             self.host, self.port, self.user, self.password, self.database))
@@ -181,11 +214,19 @@ with serdeproperties
                              password=self.password, auth='LDAP', database=self.database)
         return db
 
-    def __del__(self):
-        try:
-            self.db.close()
-        except:
-            pass
+    def _reset_connection(self, conn):
+        # Inceptor连接不支持回滚，归还时无需重置
+        pass
+
+    @lazy_connection
+    def hdfs(self):
+        print('连接HDFS host: {0}, user: {1}'.format(self.hdfs_web, self.hdfs_user))
+        return InsecureClient(self.hdfs_web, user=self.hdfs_user)
+
+    @lazy_connection
+    def db(self):
+        return self._borrow_connection(
+            self.__connect, (self.host, self.port, self.user, self.password, self.database))
 
     def _get_avro_schema(self, table_info):
         # 通过table_info转换为avro schema
@@ -204,6 +245,27 @@ with serdeproperties
         schema = avro.schema.parse(json.dumps(schema_json))
         return schema
 
+    def __schema_key(self):
+        return self.ALIAS, self.host, self.port, self.database
+
+    def __load_table_schemas(self, table_names):
+        """
+        通过desc查询表的字段信息
+        :param table_names: 表名列表
+        :return: {表名: [(字段名, 字段类型)...]}
+        """
+        schemas = {}
+        for table_name in table_names:
+            types = self.execute(self.sql('get_table_schema').format(table_name=table_name))
+            schemas[table_name] = [(each[0], each[1]) for each in types]
+        return schemas
+
+    def __invalidate_table_info(self, table_name=None, unregister=False):
+        """
+        通过驱动执行DDL后，使表结构缓存失效
+        """
+        DB_SCHEMA_CACHE.invalidate(self.__schema_key(), table_name or self.table_name, unregister)
+
     @db_call
     def execute(self, sql, fetch_all=True, sql_params=None, handle_exception=False):
         if sql_params is None:
@@ -229,10 +291,39 @@ with serdeproperties
             if not self.manual_commit:
                 self.db.commit()
 
+    def execute_stream(self, sql, batch_size=1000):
+        """
+        基于arraysize分批流式执行查询，逐行返回结果
+        :param sql: 查询语句
+        :param batch_size: 每次从数据库获取的行数
+        """
+        print('SQL: {0}'.format(sql))
+        cursor = self.db.cursor(arraysize=batch_size)
+        count = 0
+        try:
+            cursor.execute(sql)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                count += len(rows)
+                for row in rows:
+                    yield row
+        finally:
+            cursor.close()
+            print('RET: 共{0}行'.format(count))
+            # 是否手动提交变化，不开启则为自动提交，开启后可进行事务模式测试
+            if not self.manual_commit:
+                self.db.commit()
+
     @db_step('获取Inceptor表结构')
     def get_table_info(self):
         print('表名: {0}'.format(self.table_name))
-        types = self.execute(self.sql('get_table_schema').format(table_name=self.table_name))
+        if self.schema_cache:
+            types = DB_SCHEMA_CACHE.get(self.__schema_key(), self.table_name, self.__load_table_schemas,
+                                        batch=False)
+        else:
+            types = self.execute(self.sql('get_table_schema').format(table_name=self.table_name))
         columns = []
         pks = []
         for each in types:
@@ -244,7 +335,7 @@ with serdeproperties
             auto_inc = False
             unsigned = None
             # 基于数据类型，精度、标度获取位置不同
-            search_result = re.search(r'decimal\((.*),(.*)\)', column_type)
+            search_result = self.DECIMAL_TYPE.search(column_type)
             if search_result:
                 pre = search_result.group(1)
                 sca = search_result.group(2)
@@ -266,12 +357,18 @@ with serdeproperties
         results = self.execute(self.sql('get_all_data').format(self.table_name))
         return results
 
+    @db_step('流式获取Inceptor表所有数据')
+    def iter_table_data(self, batch_size=1000):
+        print('表名: {0}'.format(self.table_name))
+        return self.execute_stream(self.sql('get_all_data').format(self.table_name), batch_size)
+
     @db_step('删除Inceptor表')
     def delete_table(self, raise_error=True):
         print('表名: {0}'.format(self.table_name))
         handle_exception = not raise_error
         self.execute(self.sql('delete_table').format(self.table_name), False,
                      handle_exception=handle_exception)
+        self.__invalidate_table_info(unregister=True)
 
     @db_step('创建Inceptor表')
     def create_table(self, table_info: DBTable, external_table=True):
@@ -332,6 +429,7 @@ with serdeproperties
                                                           location=self.root + '/' + self.table_name,
                                                           tblproperties=tblproperties)
         self.execute(table_basic, False)
+        self.__invalidate_table_info()
 
     @db_step('改变Inceptor表为外表')
     def switch_to_external(self, external=True):
@@ -343,7 +441,9 @@ with serdeproperties
     def rename_table(self, new_table_name: str):
         print('表名: {0}, 重命名为：{1}'.format(self.table_name, new_table_name))
         self.execute(self.sql('rename_table').format(self.table_name, new_table_name), False)
+        self.__invalidate_table_info(unregister=True)
         self.table_name = new_table_name
+        self.__invalidate_table_info()
 
     @db_step('增加Inceptor表字段')
     def add_column(self, column_info: DBColumn):
@@ -352,6 +452,7 @@ with serdeproperties
         assert column_info.column_type, '新增字段需提供字段类型'
         self.execute(self.sql('add_column').format(self.table_name, column_info.name, column_info.column_type),
                      False)
+        self.__invalidate_table_info()
 
     @db_step('更新Inceptor表字段')
     def update_column(self, column_info: DBColumn):
@@ -360,6 +461,7 @@ with serdeproperties
         assert column_info.column_type, '新增字段需提供字段类型'
         self.execute(self.sql('update_column').format(self.table_name, column_info.name,
                                                       column_info.column_type), False)
+        self.__invalidate_table_info()
 
     @db_step('删除Inceptor表字段')
     def delete_column(self, column_name: str):
@@ -373,6 +475,7 @@ with serdeproperties
         for each in rest_columns:
             rest_column_types.append('{0} {1}'.format(each.name, each.column_type))
         self.execute(self.sql('delete_column').format(self.table_name, ', '.join(rest_column_types)), False)
+        self.__invalidate_table_info()
 
     @db_step('重命名Inceptor表字段')
     def rename_column(self, old_column_name: str, new_column_name: str):
@@ -382,6 +485,7 @@ with serdeproperties
         assert len(old_column) == 1, '无法正确获取表名: {0}, 字段名：{1}的字段信息'.format(self.table_name, old_column_name)
         self.execute(self.sql('rename_column').
                      format(self.table_name, old_column_name, new_column_name, old_column[0].column_type), False)
+        self.__invalidate_table_info()
 
     @db_step('增加Inceptor表主键')
     def add_primary_key(self, keys: list):
@@ -391,44 +495,46 @@ with serdeproperties
     def delete_primary_key(self):
         raise NotImplementedError
 
+    def __generate_row(self, table_info):
+        """
+        基于表结构随机生成一行数据，数据基于字段顺序
+        """
+        line_values = []
+        for column in table_info.columns:
+            # 如果字段名为SORTED_AND_UNIQUE_COLUMN_NAME，将会随机生成唯一值
+            if column.name == SORTED_AND_UNIQUE_COLUMN_NAME:
+                line_values.append(random_sorted_and_unique_num())
+            # 基于数据类型随机生成符合类型、精度、标度的数据
+            else:
+                random_value, _ = getattr(InceptorData, column.data_type + '_data')(
+                    column.precision, column.scale, column.unsigned, column_type=column.column_type)
+                if type(random_value) is list:
+                    line_values.extend(random_value)
+                else:
+                    line_values.append(random_value)
+        return line_values
+
+    def __get_bulk_loader(self):
+        # csv表的分隔符、引号、转义符、行分隔符为建表语句中的转义形式，写入文件时需转换为实际字符
+        text_format = tuple(codecs.decode(x, 'unicode_escape')
+                            for x in (self.separator_char, self.quote_char, self.escape_char, self.line_char))
+        file_format = 'text' if self.file_type == InceptorFileType.csv else self.file_type.name
+        # 分桶表（orc格式时同时为事务表）不支持LOAD DATA，直接分批INSERT
+        bucketed = self.buckets is not None or self.clustered is not None
+        hdfs_client = self.hdfs if self.bulk_load and self.hdfs_web and not bucketed else None
+        return HiveBulkLoader(self, file_format, hdfs_client, self.hdfs_staging_path, self.batch_size,
+                              text_format, self.encoding)
+
     @db_step('插入Inceptor表数据')
     def insert_data(self, count: int):
         print('表名: {0}, 插入数据'.format(self.table_name))
         # 获取DBTable对象
         table_info = self.get_table_info()
 
-        # 插入多行数据，可根据self.manual_commit设置事务提交模式
-        values = []
-        placeholders = []
-        column_names = []
-        for column in table_info.columns:
-            column_names.append(column.name)
-        for _ in range(count):
-            line_placeholders = []
-            line_values = []
-            for column in table_info.columns:
-                # 如果字段名为SORTED_AND_UNIQUE_COLUMN_NAME，将会随机生成唯一值
-                if column.name == SORTED_AND_UNIQUE_COLUMN_NAME:
-                    line_values.append(random_sorted_and_unique_num())
-                    line_placeholders.append(InceptorData.DEFAULT_PLACEHOLDER)
-                # 基于数据类型随机生成符合类型、精度、标度的数据
-                else:
-                    random_value, placeholder = getattr(InceptorData, column.data_type + '_data')(
-                        column.precision, column.scale, column.unsigned, column_type=column.column_type)
-                    if type(random_value) is list:
-                        line_values.extend(random_value)
-                    else:
-                        line_values.append(random_value)
-                        line_placeholders.append(placeholder)
-            placeholders.append('({0})'.format(', '.join(line_placeholders)))
-            values.extend(line_values)
-            print('DATA[{0}]'.format(_))
-            for data in line_values:
-                print('\t' + str(data))
-        self.execute(
-            self.sql('insert_data').format(table_name=self.table_name, column_name=', '.join(column_names),
-                                           column_data=', '.join(placeholders)),
-            False, sql_params=values)
+        # 生成的数据通过HDFS暂存导入，暂存失败时分批INSERT，可根据self.manual_commit设置事务提交模式
+        rows = [self.__generate_row(table_info) for _ in range(count)]
+        print('生成数据: 共{0}行'.format(len(rows)))
+        self.__get_bulk_loader().load(table_info, rows)
 
     @db_step('手动插入Inceptor表数据')
     def manual_insert_data(self, column_names: list, placeholders: list, values: list):
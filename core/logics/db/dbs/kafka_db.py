@@ -1,16 +1,19 @@
 #!/usr/bin/env python
 # encoding: utf-8
 import collections
+from concurrent.futures import ThreadPoolExecutor
 from decimal import *
 from confluent_kafka import avro
 from confluent_kafka.admin import AdminClient, NewTopic as AvroTopic
 from confluent_kafka.avro import AvroProducer, AvroConsumer
-from confluent_kafka import TopicPartition
+from confluent_kafka import TopicPartition, Producer, Consumer
 from enum import Enum
 from confluent_kafka.schema_registry.schema_registry_client import SchemaRegistryClient, Schema
-from kafka import KafkaConsumer, KafkaAdminClient, KafkaProducer
+from kafka import KafkaConsumer, KafkaAdminClient, KafkaProducer, TopicPartition as JsonTopicPartition
 from kafka.admin.new_topic import NewTopic
+from kafka.errors import KafkaTimeoutError
 from core.logics.db.db_driver import *
+from core.logics.db.db_avro_codec import AvroCodec, AvroMessageDecoder
 
 
 class KafkaData:
@@ -80,11 +83,15 @@ class KafkaDB(DBDriver):
     # DP sink schema特殊标识，当遇到时主动去除
     DP_SINK_SCHEMA_MARK = 'op_'
 
+    # 进程内缓存的自增字段最后生成的值，{(host, topic): (最后生成的值, 生成后各分区结束offset之和)}
+    _LAST_IDS = {}
+
     # Avro schema字段信息
     AVRO_SCHEMA_NAME = 'value'
     AVRO_SCHEMA_TYPE = 'record'
 
-    def __init__(self, db_config: dict, topic, kafka_type: KafkaType, auto_offset_reset='smallest', consumer_timeout_ms=2000, encoding='utf8'):
+    def __init__(self, db_config: dict, topic, kafka_type: KafkaType, auto_offset_reset='smallest', consumer_timeout_ms=2000, encoding='utf8',
+                 linger_ms=5, batch_size=16384, compression_type=None, fast_avro=True):
         self.host = db_config["host"]
         self.schema_registry_url = db_config["schema_registry"]
         self.table_name = topic
@@ -93,6 +100,41 @@ class KafkaDB(DBDriver):
         self.encoding = encoding
         self.kafka_type = kafka_type
 
+        # Producer批量发送配置：等待凑批的时间，每批最大字节数，压缩方式（gzip, snappy, lz4, zstd, None）
+        self.linger_ms = linger_ms
+        self.batch_size = batch_size
+        self.compression_type = compression_type
+
+        # 是否通过fastavro编解码Kafka-avro消息，消息格式与Confluent Schema Registry一致
+        # 关闭时使用confluent_kafka的AvroProducer, AvroConsumer编解码
+        self.fast_avro = fast_avro
+        # fastavro解码消息时，基于schema id缓存的解码器
+        self._avro_decoder = None
+
+        # 是否异步批量发送数据，开启时发送所有数据后统一flush并汇总投递失败的数据
+        # 关闭时每条数据发送后等待broker确认
+        self.async_produce = True
+
+        # 异步批量发送时，统一flush等待所有数据投递完成的超时时间（秒）
+        self.produce_timeout = 60
+
+        # 基于offset读取指定区间数据时的超时时间（秒），超时后返回已读取的数据
+        self.fetch_timeout = 60
+
+        # 是否基于offset读取主题所有数据：读取前记录各分区结束offset，直接指定分区读取，所有分区到达该offset后立即结束
+        # 关闭时通过consumer_timeout_ms空闲超时判断读取结束
+        self.bounded_read = True
+
+        # 基于offset读取时，并行读取分区的线程数，为1时在同一consumer中读取所有分区
+        self.fetch_workers = 1
+
+        # 轮询增量读取时，各分区下一次读取的offset及已读取的数据，{partition: offset}, {partition: [[cell...]...]}
+        self._polled_offsets = {}
+        self._polled_rows = {}
+
+        # 是否在进程内缓存自增字段最后生成的值，主题结束offset与缓存时一致时不需再读取主题
+        self.cache_last_id = True
+
         # Kafka-json需要schema topic用于描述对应数据的结构、字段信息
         # 虽然json并没有强行数据要求限制，但为了拓展下游库数据转换、高级清洗等测试逻辑
         # 需要限制json中某一字段仅会生成属于一种类型的数据，所以需要额外存放、提供schema信息
@@ -113,19 +155,16 @@ class KafkaDB(DBDriver):
         # 如作为下游库或没有该schema信息文件，需显示将self.table_info赋值为DBTable对象
         self.table_info = None
 
-        self.producer = self.__connect_producer()
-        self.admin = self.__connect_admin()
+        # 最近一次解析json消息的解码器，可通过summary()及timings查看每条消息的解析耗时
+        self.last_json_decoder = None
 
-    def __del__(self):
-        try:
-            self.producer.close()
-        except:
-            pass
+    @lazy_connection
+    def producer(self):
+        return self.__connect_producer()
 
-        try:
-            self.admin.close()
-        except:
-            pass
+    @lazy_connection
+    def admin(self):
+        return self.__connect_admin()
 
     def __connect_consumer(self, topic):
         print('连接Kafka Consumer, bootstrap_servers: {0}, topic: {1}, auto_offset_reset: {2}, '
@@ -134,6 +173,11 @@ class KafkaDB(DBDriver):
         if self.kafka_type == KafkaType.json:
             db = KafkaConsumer(topic, bootstrap_servers=self.host, auto_offset_reset=self.auto_offset_reset,
                                consumer_timeout_ms=self.consumer_timeout_ms)
+        elif self.fast_avro:
+            db = Consumer({'bootstrap.servers': self.host, 'group.id': 'automation',
+                           'auto.offset.reset': self.auto_offset_reset, 'api.version.request': True})
+            db.subscribe([topic])
+            db.assign([TopicPartition(topic, 0, 0)])
         else:
             db = AvroConsumer({'bootstrap.servers': self.host, 'group.id': 'automation',
                                'auto.offset.reset': self.auto_offset_reset,
@@ -142,23 +186,233 @@ class KafkaDB(DBDriver):
             db.assign([TopicPartition(topic, 0, 0)])
         return db
 
+    def __connect_assigned_consumer(self):
+        """
+        连接不加入消费组的consumer，通过assign直接指定分区及offset读取，不提交offset
+        """
+        print('连接Kafka Consumer, bootstrap_servers: {0}, topic: {1}, 直接指定分区读取'.format(
+            self.host, self.table_name))
+        if self.kafka_type == KafkaType.json:
+            db = KafkaConsumer(bootstrap_servers=self.host, group_id=None, enable_auto_commit=False)
+        elif self.fast_avro:
+            db = Consumer({'bootstrap.servers': self.host, 'group.id': 'automation',
+                           'enable.auto.commit': False, 'api.version.request': True})
+        else:
+            db = AvroConsumer({'bootstrap.servers': self.host, 'group.id': 'automation',
+                               'enable.auto.commit': False,
+                               'api.version.request': True, 'schema.registry.url': self.schema_registry_url})
+        return db
+
+    def _get_watermark_offsets(self, consumer, topic=None):
+        """
+        获取主题各分区当前的起始、结束offset
+        :param topic: 主题名，默认为当前主题
+        :return: {partition: (起始offset, 结束offset)}
+        """
+        topic = topic or self.table_name
+        if self.kafka_type == KafkaType.json:
+            partitions = consumer.partitions_for_topic(topic) or set()
+            tps = [JsonTopicPartition(topic, x) for x in sorted(partitions)]
+            low = consumer.beginning_offsets(tps)
+            high = consumer.end_offsets(tps)
+            return {tp.partition: (low[tp], high[tp]) for tp in tps}
+        metadata = consumer.list_topics(topic, timeout=10)
+        partitions = metadata.topics[topic].partitions.keys()
+        return {x: consumer.get_watermark_offsets(TopicPartition(topic, x), timeout=10)
+                for x in sorted(partitions)}
+
+    def _read_offset_ranges(self, consumer, offset_ranges, topic=None, next_offsets=None):
+        """
+        读取各分区[起始offset, 结束offset)区间内的消息
+        所有分区均读取到结束offset后立即返回，不依赖consumer_timeout_ms的空闲等待
+        :param consumer: 通过__connect_assigned_consumer连接的consumer
+        :param offset_ranges: {partition: (起始offset, 结束offset)}
+        :param topic: 主题名，默认为当前主题
+        :param next_offsets: 不为None时，写入各分区下一次需读取的offset
+        :return: {partition: [消息值...]}
+        """
+        topic = topic or self.table_name
+        results = {x: [] for x in offset_ranges.keys()}
+        reached = {x: y[0] for x, y in offset_ranges.items()}
+        remaining = {x: y for x, y in offset_ranges.items() if y[1] > y[0]}
+        if not remaining:
+            if next_offsets is not None:
+                next_offsets.update(reached)
+            return results
+        deadline = datetime.datetime.now() + datetime.timedelta(seconds=self.fetch_timeout)
+
+        if self.kafka_type == KafkaType.json:
+            tps = {x: JsonTopicPartition(topic, x) for x in remaining.keys()}
+            consumer.assign(list(tps.values()))
+            for partition, (start, _) in remaining.items():
+                consumer.seek(tps[partition], start)
+            while remaining and datetime.datetime.now() < deadline:
+                records = consumer.poll(timeout_ms=1000)
+                for tp, messages in records.items():
+                    if tp.partition not in remaining:
+                        continue
+                    end = remaining[tp.partition][1]
+                    messages = [x for x in messages if x.offset < end]
+                    results[tp.partition].extend([x.value for x in messages])
+                    if messages:
+                        reached[tp.partition] = messages[-1].offset + 1
+                # 基于position判断，可跳过事务标记等不会返回的offset
+                for partition in list(remaining.keys()):
+                    if consumer.position(tps[partition]) >= remaining[partition][1]:
+                        consumer.pause(tps[partition])
+                        reached[partition] = remaining[partition][1]
+                        del remaining[partition]
+        else:
+            consumer.assign([TopicPartition(topic, x, y[0]) for x, y in remaining.items()])
+            while remaining and datetime.datetime.now() < deadline:
+                msg = consumer.poll(1)
+                if msg is None:
+                    positions = consumer.position([TopicPartition(topic, x) for x in remaining.keys()])
+                    for tp in positions:
+                        if tp.offset >= remaining[tp.partition][1]:
+                            reached[tp.partition] = remaining[tp.partition][1]
+                            del remaining[tp.partition]
+                    continue
+                if msg.error():
+                    raise msg.error()
+                partition = msg.partition()
+                if partition not in remaining:
+                    continue
+                end = remaining[partition][1]
+                if msg.offset() < end:
+                    results[partition].append(msg.value())
+                    reached[partition] = msg.offset() + 1
+                if msg.offset() >= end - 1:
+                    reached[partition] = end
+                    del remaining[partition]
+        if remaining:
+            print('已等待{0}秒，以下分区未读取到结束offset: {1}'.format(self.fetch_timeout, remaining))
+        if next_offsets is not None:
+            next_offsets.update(reached)
+        return results
+
+    def _read_topic_bounded(self, topic=None):
+        """
+        基于读取前各分区的结束offset读取主题所有消息，fetch_workers大于1时并行读取各分区
+        :param topic: 主题名，默认为当前主题
+        :return: 基于分区顺序的所有消息值 [消息值...]
+        """
+        consumer = self.__connect_assigned_consumer()
+        try:
+            offset_ranges = self._get_watermark_offsets(consumer, topic)
+            print('各分区offset区间: {0}'.format(offset_ranges))
+            if self.fetch_workers > 1 and len(offset_ranges) > 1:
+                def read_partition(partition):
+                    # 每个线程使用独立的consumer读取一个分区
+                    partition_consumer = self.__connect_assigned_consumer()
+                    try:
+                        return self._read_offset_ranges(partition_consumer,
+                                                        {partition: offset_ranges[partition]}, topic)
+                    finally:
+                        partition_consumer.close()
+
+                values = {}
+                with ThreadPoolExecutor(max_workers=min(self.fetch_workers, len(offset_ranges))) as executor:
+                    for each in executor.map(read_partition, offset_ranges.keys()):
+                        values.update(each)
+            else:
+                values = self._read_offset_ranges(consumer, offset_ranges, topic)
+        finally:
+            consumer.close()
+        return [x for partition in sorted(values.keys()) for x in values[partition]]
+
+    def _decode_messages(self, values):
+        """
+        将消息转换为基于字段顺序的数据行
+        json消息通过JsonDecoder解析，解析统计信息保存在self.last_json_decoder中
+        开启fast_avro时，avro消息通过fastavro基于消息头部的schema id解码
+        """
+        if self.kafka_type != KafkaType.json:
+            if self.fast_avro:
+                if self._avro_decoder is None:
+                    self._avro_decoder = AvroMessageDecoder(self._get_registry_schema)
+                values = [self._avro_decoder.decode(x) for x in values]
+            return [list(x.values()) for x in values]
+        decoder = JsonDecoder(lower_key=False, encoding=self.encoding)
+        results = [list(decoder.decode(x).values()) for x in values]
+        print(decoder.summary())
+        self.last_json_decoder = decoder
+        return results
+
+    @db_call
+    def _fetch_last_rows(self, count=1):
+        """
+        读取各分区最后count条数据，基于各分区结束offset定位，与主题数据量无关
+        :param count: 每个分区读取的数据条数
+        :return: [[cell...]...], 读取时各分区结束offset之和
+        """
+        consumer = self.__connect_assigned_consumer()
+        try:
+            watermarks = self._get_watermark_offsets(consumer)
+            offset_ranges = {x: (max(low, high - count), high) for x, (low, high) in watermarks.items()}
+            values = self._read_offset_ranges(consumer, offset_ranges)
+        finally:
+            consumer.close()
+        results = self._decode_messages([x for partition in sorted(values.keys()) for x in values[partition]])
+        if self.kafka_type == KafkaType.avro and results and self._is_sink_avro():
+            results = [x[1:] for x in results]
+        print('RET: {0}'.format(results))
+        return results, sum([x[1] for x in watermarks.values()])
+
+    def _get_end_offset_sum(self):
+        consumer = self.__connect_assigned_consumer()
+        try:
+            return sum([x[1] for x in self._get_watermark_offsets(consumer).values()])
+        finally:
+            consumer.close()
+
+    def _get_last_id(self, index):
+        """
+        获取自增字段当前最大值，仅读取各分区最后一条数据，主题为空时返回-1
+        开启cache_last_id时，如主题结束offset与上次生成数据后一致，则直接使用进程内缓存的值
+        :param index: 自增字段下标
+        :return: 当前最大值, 当前各分区结束offset之和
+        """
+        cache_key = (self.host, self.table_name)
+        if self.cache_last_id and cache_key in self._LAST_IDS:
+            last_id, end_offset_sum = self._LAST_IDS[cache_key]
+            current_end_offset_sum = self._get_end_offset_sum()
+            if current_end_offset_sum == end_offset_sum:
+                print('主题: {0}, 使用缓存的自增字段值: {1}'.format(self.table_name, last_id))
+                return last_id, current_end_offset_sum
+        rows, end_offset_sum = self._fetch_last_rows(1)
+        ids = [int(x[index]) for x in rows if x[index] is not None]
+        return (max(ids) if ids else -1), end_offset_sum
+
+    def _cache_last_id(self, last_id, end_offset_sum):
+        if self.cache_last_id:
+            self._LAST_IDS[(self.host, self.table_name)] = (last_id, end_offset_sum)
+
     def __connect_producer(self):
         print('连接Kafka Producer, bootstrap_servers: {0}, schema registry: {1}'.format(
             self.host, self.schema_registry_url))
         if self.kafka_type == KafkaType.json:
             db = KafkaProducer(bootstrap_servers=self.host,
                                key_serializer=lambda k: json.dumps(k).encode(),
-                               value_serializer=lambda v: json.dumps(v).encode())
+                               value_serializer=lambda v: json.dumps(v).encode(),
+                               linger_ms=self.linger_ms, batch_size=self.batch_size,
+                               compression_type=self.compression_type)
         else:
             def delivery_report(err, msg):
                 if err is not None:
                     raise ('Message delivery failed: {}'.format(err))
+            if self.fast_avro:
+                return Producer({'bootstrap.servers': self.host, 'on_delivery': delivery_report,
+                                 'linger.ms': self.linger_ms, 'batch.size': self.batch_size,
+                                 'compression.type': self.compression_type or 'none'})
             db = AvroProducer({'bootstrap.servers': self.host, 'on_delivery': delivery_report,
                                # schema.registry.auto.register.schemas 修改为 False
                                # 代表每次提交kafka-avro数据时不自动注册新schema
                                # 既不允许因用户写入的数据不满足历史schema要求而重新注册
                                'schema.registry.auto.register.schemas': False,
-                               'schema.registry.url': self.schema_registry_url})
+                               'schema.registry.url': self.schema_registry_url,
+                               'linger.ms': self.linger_ms, 'batch.size': self.batch_size,
+                               'compression.type': self.compression_type or 'none'})
         return db
 
     def __connect_admin(self):
@@ -174,8 +428,25 @@ class KafkaDB(DBDriver):
         db = SchemaRegistryClient({'url': self.schema_registry_url})
         return db
 
+    def _get_registry_schema(self, schema_id):
+        """
+        基于schema id从schema registry获取schema字符串
+        """
+        return self.__connect_schema_registry().get_schema(schema_id).schema_str
+
+    def _get_latest_avro_codec(self):
+        """
+        基于schema registry中最新的schema生成编码器，用于fastavro编码发送的数据
+        """
+        version = self.__connect_schema_registry().get_latest_version(self.avro_schema_name)
+        return AvroCodec(version.schema.schema_str, version.schema_id)
+
     @db_call
     def __fetch_all_data(self):
+        if self.bounded_read:
+            results = self._decode_messages(self._read_topic_bounded())
+            print('RET: {0}'.format(results))
+            return results
         ret = []
         consumer = self.__connect_consumer(self.table_name)
         results = []
@@ -183,9 +454,7 @@ class KafkaDB(DBDriver):
         if self.kafka_type == KafkaType.json:
             for msg in consumer:
                 ret.append(msg.value)
-            for msg in ret:
-                result_dict = format_json(msg.decode(self.encoding), lower_key=False, encoding=self.encoding)
-                results.append(list(result_dict.values()))
+            results = self._decode_messages(ret)
         # avro则消费所有数据，转为有序字典
         else:
             while True:
@@ -197,8 +466,7 @@ class KafkaDB(DBDriver):
                     raise msg.error()
                 else:
                     break
-            for msg in ret:
-                results.append(list(msg.values()))
+            results = self._decode_messages(ret)
             consumer.commit()
         print('RET: {0}'.format(results))
         consumer.close()
@@ -208,11 +476,14 @@ class KafkaDB(DBDriver):
     def __fetch_schema_data(self):
         # json则从额外的schema topic获取schema信息
         if self.kafka_type == KafkaType.json:
-            results = []
-            schema = self.__connect_consumer(self.table_schema_name)
-            for msg in schema:
-                results.append(msg.value)
-            schema.close()
+            if self.bounded_read:
+                results = self._read_topic_bounded(self.table_schema_name)
+            else:
+                results = []
+                schema = self.__connect_consumer(self.table_schema_name)
+                for msg in schema:
+                    results.append(msg.value)
+                schema.close()
             assert len(results) > 0, '无法获取当前主题：{0}，有效的Schema结构，Schema主题：{1}'.format(
                 self.table_name, self.table_schema_name)
             print('RET: {0}'.format(results))
@@ -293,6 +564,46 @@ class KafkaDB(DBDriver):
         else:
             return results
 
+    @db_call
+    def __fetch_incremental_data(self):
+        """
+        增量读取主题数据：记录每个分区已读取到的offset，每次仅读取并解析新增的消息
+        分区起始offset大于已读取的offset（数据过期）或结束offset小于已读取的offset（主题重建）时，重新读取所有数据
+        :return: 累计读取的所有数据 [[cell...]...]
+        """
+        consumer = self.__connect_assigned_consumer()
+        try:
+            watermarks = self._get_watermark_offsets(consumer)
+            if any(not low <= self._polled_offsets.get(x, low) <= high for x, (low, high) in watermarks.items()):
+                print('主题: {0}, 已读取的offset失效，重新读取所有数据'.format(self.table_name))
+                self.reset_polled_data()
+            offset_ranges = {x: (self._polled_offsets.get(x, low), high) for x, (low, high) in watermarks.items()}
+            print('各分区增量offset区间: {0}'.format(offset_ranges))
+            values = self._read_offset_ranges(consumer, offset_ranges, next_offsets=self._polled_offsets)
+        finally:
+            consumer.close()
+        for partition, partition_values in values.items():
+            self._polled_rows.setdefault(partition, []).extend(self._decode_messages(partition_values))
+        results = [x for partition in sorted(self._polled_rows.keys()) for x in self._polled_rows[partition]]
+        print('新增行数: {0}，累计行数: {1}'.format(sum([len(x) for x in values.values()]), len(results)))
+        return results
+
+    def reset_polled_data(self):
+        """
+        清空增量读取记录的offset及数据，下一次轮询将重新读取所有数据
+        """
+        self._polled_offsets = {}
+        self._polled_rows = {}
+
+    @db_step('增量获取Kafka所有数据')
+    def poll_table_data(self, batch_size=1000):
+        print('主题: {0}'.format(self.table_name))
+        results = self.__fetch_incremental_data()
+        if self.kafka_type == KafkaType.avro and self._is_sink_avro():
+            return [x[1:] for x in results]
+        else:
+            return results
+
     @db_step('删除Kafka schema registry subject')
     def delete_schema_registry_subject(self, raise_error=True):
         print('主题: {0}, 删除schema registry subject: {1}'.format(self.table_name, self.avro_schema_name))
@@ -307,6 +618,8 @@ class KafkaDB(DBDriver):
     @db_step('删除Kafka Topic')
     def delete_table(self, raise_error=True):
         print('主题: {0}'.format(self.table_name))
+        self._LAST_IDS.pop((self.host, self.table_name), None)
+        self.reset_polled_data()
         # 尝试重复删除topic直到其抛错，否则某些情况下topic无法成功删除
         if self.kafka_type == KafkaType.json:
             while True:
@@ -456,11 +769,18 @@ class KafkaDB(DBDriver):
                 data_dict[column.name] = data[index]
             table_dict_data.append(data_dict)
 
-        if self.kafka_type == KafkaType.json:
+        if self.async_produce:
+            self._produce_all(table_dict_data)
+        elif self.kafka_type == KafkaType.json:
             for data in table_dict_data:
                 # TODO： 考虑增加Key作为版本控制, source为kafka json，下游对齐数据与schema时，需要考虑Schema版本（版本可通过produce设置key.value区分）
                 future = self.producer.send(self.table_name, value=data)
                 future.get(timeout=5)
+        elif self.fast_avro:
+            codec = self._get_latest_avro_codec()
+            for data in table_dict_data:
+                self.producer.produce(topic=self.table_name, value=codec.encode_message(data))
+                self.producer.flush(5)
         else:
             schema = self.__connect_schema_registry()
             version = schema.get_latest_version(self.avro_schema_name)
@@ -470,14 +790,73 @@ class KafkaDB(DBDriver):
                 self.producer.produce(topic=self.table_name, value=data, value_schema=value_schema)
                 self.producer.flush(5)
 
+    @db_call
+    def _produce_all(self, table_dict_data):
+        """
+        异步批量发送数据：发送所有数据后统一flush一次，通过投递回调汇总失败的数据
+        :param table_dict_data: 需发送的数据 [OrderedDict...]
+        """
+        print('Topic: {0}, 批量发送行数: {1}'.format(self.table_name, len(table_dict_data)))
+        errors = []
+        if self.kafka_type == KafkaType.json:
+            futures = []
+            for data in table_dict_data:
+                # TODO： 考虑增加Key作为版本控制, source为kafka json，下游对齐数据与schema时，需要考虑Schema版本（版本可通过produce设置key.value区分）
+                future = self.producer.send(self.table_name, value=data)
+                future.add_errback(errors.append)
+                futures.append(future)
+            try:
+                self.producer.flush(timeout=self.produce_timeout)
+            except KafkaTimeoutError:
+                # flush超时时抛出异常，未完成的数据统一在下方汇总
+                pass
+            undelivered = len([x for x in futures if not x.is_done])
+        else:
+            if self.fast_avro:
+                codec = self._get_latest_avro_codec()
+
+                def produce_kwargs(data):
+                    return {'value': codec.encode_message(data)}
+            else:
+                schema = self.__connect_schema_registry()
+                version = schema.get_latest_version(self.avro_schema_name)
+                value_schema = avro.loads(version.schema.schema_str)
+
+                def produce_kwargs(data):
+                    return {'value': data, 'value_schema': value_schema}
+
+            def delivery_report(err, msg):
+                if err is not None:
+                    errors.append(err)
+
+            for data in table_dict_data:
+                value_kwargs = produce_kwargs(data)
+                while True:
+                    try:
+                        self.producer.produce(topic=self.table_name, callback=delivery_report, **value_kwargs)
+                        break
+                    except BufferError:
+                        # 本地发送队列已满，等待部分数据投递后重试
+                        self.producer.poll(1)
+                self.producer.poll(0)
+            undelivered = self.producer.flush(self.produce_timeout)
+
+        if errors or undelivered:
+            raise KafkaDeliveryException('Topic: {0}, 发送行数: {1}, 投递失败行数: {2}, 超时未投递行数: {3}, 失败原因: {4}'.format(
+                self.table_name, len(table_dict_data), len(errors), undelivered, [str(x) for x in errors[:10]]))
+
     @db_step('插入Kafka表数据')
     def insert_data(self, count: int):
         print('主题: {0}, 插入数据'.format(self.table_name))
         # 获取DBTable对象
         table_info = self.get_table_info()
 
-        # 获取当前所有数据
-        table_data = self.get_table_data()
+        # 自增字段仅读取主题末尾数据获取当前最大值，不需消费整个主题
+        auto_inc_index = None
+        if self.kafka_type == KafkaType.json:
+            auto_inc_index = next((x for x, y in enumerate(table_info.columns) if y.auto_inc), None)
+        if auto_inc_index is not None:
+            last_id, end_offset_sum = self._get_last_id(auto_inc_index)
 
         # 插入多行数据
         new_table_data = []
@@ -486,17 +865,14 @@ class KafkaDB(DBDriver):
             for index, column in enumerate(table_info.columns):
                 if self.kafka_type == KafkaType.json:
                     function_name = column.column_type + '_data'
-                    # 自增字段将基于最大数据id
-                    if column.auto_inc:
-                        if len(table_data) > 0:
-                            last_id = table_data[-1][index]
-                        else:
-                            last_id = -1
-                        values.append(int(last_id) + 1)
                 else:
                     function_name = column.data_type + '_data'
+                # 自增字段将基于最大数据id
+                if index == auto_inc_index:
+                    last_id += 1
+                    values.append(last_id)
                 # 如果字段名为SORTED_AND_UNIQUE_COLUMN_NAME，将会随机生成唯一值
-                if column.name == SORTED_AND_UNIQUE_COLUMN_NAME:
+                elif column.name == SORTED_AND_UNIQUE_COLUMN_NAME:
                     values.append(random_sorted_and_unique_num())
                 # 如果字段允许为空，则有概率插入None
                 elif not column.not_null and random_int(0, 9) == 0:
@@ -507,8 +883,9 @@ class KafkaDB(DBDriver):
                         column.precision, column.scale, column.unsigned, column_type=column.column_type)
                     values.append(random_value)
             new_table_data.append(values)
-            table_data.append(values)
         self._upload_data_to_server(new_table_data, table_info)
+        if auto_inc_index is not None:
+            self._cache_last_id(last_id, end_offset_sum + count)
 
     @db_step('手动插入Kafka表数据')
     def manual_insert_data(self, column_names: list, data_values: list):
@@ -517,20 +894,19 @@ class KafkaDB(DBDriver):
         # 获取DBTable对象
         table_info = self.get_table_info()
 
-        # 获取当前所有数据
-        table_data = self.get_table_data()
+        # 自增字段仅读取主题末尾数据获取当前最大值，不需消费整个主题
+        auto_inc_index = next((x for x, y in enumerate(table_info.columns) if y.auto_inc), None)
+        if auto_inc_index is not None:
+            last_id, end_offset_sum = self._get_last_id(auto_inc_index)
 
         # 插入多行数据
         values = []
         new_table_data = []
         for index, column in enumerate(table_info.columns):
             # 自增字段将基于最大数据id
-            if column.auto_inc:
-                if len(table_data) > 0:
-                    last_id = table_data[-1][index]
-                else:
-                    last_id = -1
-                values.append(int(last_id) + 1)
+            if index == auto_inc_index:
+                last_id += 1
+                values.append(last_id)
             # 如果字段名为SORTED_AND_UNIQUE_COLUMN_NAME，将会随机生成唯一值
             elif column.name == SORTED_AND_UNIQUE_COLUMN_NAME:
                 values.append(random_sorted_and_unique_num())
@@ -541,9 +917,10 @@ class KafkaDB(DBDriver):
             # 未指定则插入None
             else:
                 values.append(None)
-        table_data.append(values)
         new_table_data.append(values)
         self._upload_data_to_server(new_table_data, table_info)
+        if auto_inc_index is not None:
+            self._cache_last_id(last_id, end_offset_sum + 1)
 
     @db_step('更新Kafka表数据')
     def update_data(self, count_or_condition):
@@ -258,6 +258,9 @@ class MySqlData:
 class MySqlDB(DBDriver):
     ALIAS = 'MYSQL'
 
+    # 分块校验时字段转为文本的格式族
+    CHECKSUM_FAMILY = 'MYSQL'
+
     # 数据库内置关键字，用于检索并设置默认值
     RESERVED_KEYWORD = ['CURRENT_TIMESTAMP']
 
@@ -274,6 +277,16 @@ where TABLE_NAME = '{0}' order by ORDINAL_POSITION;''',
             "select COLUMN_TYPE from information_schema.columns where TABLE_NAME = '{0}' and COLUMN_NAME = '{1}'",
         'get_all_data':
             "select * from {0}",
+        'checksum_column':
+            "coalesce(cast({column} as char), '#NULL#')",
+        'checksum_separator':
+            ", '|', ",
+        'get_chunk_checksums':
+            "select floor({key} * 1.0 / {chunk_size}), count(*), "
+            "sum(conv(substring(md5(concat({row_text})), 1, 8), 16, 10)) "
+            "from {table_name} group by floor({key} * 1.0 / {chunk_size})",
+        'get_chunk_data':
+            "select * from {table_name} where {key} >= {lower} and {key} < {upper}",
         'delete_table':
             "drop table {0}",
         'create_table': '''
@@ -321,16 +334,17 @@ create table {table_name}
         self.database = db_config["database"]
         self.charset = 'utf8'
         self.table_name = table_name
-        self.db = self.__connect()
 
         # 是否手动提交变化，不开启则为自动提交，开启后可进行事务模式测试
         self.manual_commit = False
 
-    def __del__(self):
-        try:
-            self.db.close()
-        except:
-            pass
+        # 批量插入数据时每批的行数，每批数据通过executemany合并为多行VALUES并提交一次
+        self.batch_size = 1000
+
+    @lazy_connection
+    def db(self):
+        return self._borrow_connection(
+            self.__connect, (self.host, self.port, self.user, self.password, self.database, self.charset))
 
     def __connect(self):
         print('连接MySql数据库 host: {0}, port: {1}, user: {2}, passwd: {3}, db: {4}, charset: {5}'.format(
@@ -340,6 +354,9 @@ create table {table_name}
         db.ping()
         return db
 
+    def _ping_connection(self, conn):
+        conn.ping(reconnect=False)
+
     def _format_default_value(self, default):
         if default is None:
             default = ''
@@ -373,6 +390,72 @@ create table {table_name}
             if not self.manual_commit:
                 self.db.commit()
 
+    @db_call
+    def execute_many(self, sql, sql_params_list, handle_exception=False):
+        cursor = self.db.cursor()
+        print('SQL: {0}'.format(sql))
+        print('\t批量行数: {0}'.format(len(sql_params_list)))
+        try:
+            # pymysql会将insert ... values (%s, ...)改写为多行VALUES语句，一次往返写入整批数据
+            cursor.executemany(sql, sql_params_list)
+        except Exception as e:
+            print(e)
+            # 是否处理异常
+            if not handle_exception:
+                raise e
+        finally:
+            cursor.close()
+            # 是否手动提交变化，不开启则为自动提交，开启后可进行事务模式测试
+            if not self.manual_commit:
+                self.db.commit()
+
+    def _execute_insert_batches(self, rows):
+        """
+        按照self.batch_size分批插入数据，每批只提交一次
+        :param rows: 可迭代的插入行 (column_names, placeholders, values)
+        """
+        batch_size = max(int(self.batch_size or 1), 1)
+        batch_sql = None
+        batch_values = []
+        for column_names, placeholders, values in rows:
+            sql = self.sql('insert_data').format(table_name=self.table_name,
+                                                 column_name=', '.join(column_names),
+                                                 column_data=', '.join(placeholders))
+            # 语句不同（如预替换符不同）或达到批量上限时，先写入已累积的数据
+            if batch_values and (sql != batch_sql or len(batch_values) >= batch_size):
+                self.execute_many(batch_sql, batch_values)
+                batch_values = []
+            batch_sql = sql
+            batch_values.append(values)
+        if batch_values:
+            self.execute_many(batch_sql, batch_values)
+
+    def execute_stream(self, sql, batch_size=1000):
+        """
+        基于服务端游标（SSCursor）流式执行查询，逐行返回结果
+        :param sql: 查询语句
+        :param batch_size: 每次从数据库获取的行数
+        """
+        print('SQL: {0}'.format(sql))
+        # 使用服务端游标，数据按批次从服务端读取，不会一次性加载至内存
+        cursor = self.db.cursor(pymysql.cursors.SSCursor)
+        count = 0
+        try:
+            cursor.execute(sql)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                count += len(rows)
+                for row in rows:
+                    yield row
+        finally:
+            cursor.close()
+            print('RET: 共{0}行'.format(count))
+            # 是否手动提交变化，不开启则为自动提交，开启后可进行事务模式测试
+            if not self.manual_commit:
+                self.db.commit()
+
     @db_step('获取MySQL表结构')
     def get_table_info(self):
         print('表名: {0}'.format(self.table_name))
@@ -414,6 +497,11 @@ create table {table_name}
         results = self.execute(self.sql('get_all_data').format(self.table_name))
         return results
 
+    @db_step('流式获取MySQL表所有数据')
+    def iter_table_data(self, batch_size=1000):
+        print('表名: {0}'.format(self.table_name))
+        return self.execute_stream(self.sql('get_all_data').format(self.table_name), batch_size)
+
     @db_step('创建MySQL表')
     def create_table(self, table_info: DBTable):
         print('表名: {0}'.format(self.table_name))
@@ -503,47 +591,55 @@ create table {table_name}
         print('表名: {0}, 删除主键'.format(self.table_name))
         self.execute(self.sql('delete_primary_key').format(self.table_name), False)
 
+    def _generate_insert_row(self, table_info: DBTable):
+        """
+        基于表结构随机生成一行插入数据
+        :param table_info: DBTable对象
+        :return: 字段名, 预替换符, 值
+        """
+        values = []
+        placeholders = []
+        column_names = []
+        for column in table_info.columns:
+            # 自增字段将不赋值
+            if column.auto_inc:
+                continue
+            column_names.append(column.name)
+            # 如果字段名为SORTED_AND_UNIQUE_COLUMN_NAME，将会随机生成唯一值
+            if column.name == SORTED_AND_UNIQUE_COLUMN_NAME:
+                values.append(random_sorted_and_unique_num())
+                placeholders.append(MySqlData.DEFAULT_PLACEHOLDER)
+            # 如果字段允许为空，则有概率插入None
+            elif not column.not_null and random_int(0, 9) == 0:
+                values.append(None)
+                placeholders.append(MySqlData.DEFAULT_PLACEHOLDER)
+            # 基于数据类型随机生成符合类型、精度、标度的数据
+            else:
+                random_value, placeholder = getattr(MySqlData, column.data_type + '_data')(
+                    column.precision, column.scale, column.unsigned, column_type=column.column_type)
+                if type(random_value) is list:
+                    values.extend(random_value)
+                else:
+                    values.append(random_value)
+                placeholders.append(placeholder)
+        return column_names, placeholders, values
+
     @db_step('插入MySQL表数据')
     def insert_data(self, count: int):
         print('表名: {0}, 插入数据'.format(self.table_name))
         # 获取DBTable对象
         table_info = self.get_table_info()
 
-        # 插入多行数据，可根据self.manual_commit设置事务提交模式
-        for _ in range(count):
-            values = []
-            placeholders = []
-            column_names = []
-            for column in table_info.columns:
-                # 自增字段将不赋值
-                if column.auto_inc:
-                    continue
-                column_names.append(column.name)
-                # 如果字段名为SORTED_AND_UNIQUE_COLUMN_NAME，将会随机生成唯一值
-                if column.name == SORTED_AND_UNIQUE_COLUMN_NAME:
-                    values.append(random_sorted_and_unique_num())
-                    placeholders.append(MySqlData.DEFAULT_PLACEHOLDER)
-                # 如果字段允许为空，则有概率插入None
-                elif not column.not_null and random_int(0, 9) == 0:
-                    values.append(None)
-                    placeholders.append(MySqlData.DEFAULT_PLACEHOLDER)
-                # 基于数据类型随机生成符合类型、精度、标度的数据
-                else:
-                    random_value, placeholder = getattr(MySqlData, column.data_type + '_data')(
-                        column.precision, column.scale, column.unsigned, column_type=column.column_type)
-                    if type(random_value) is list:
-                        values.extend(random_value)
-                    else:
-                        values.append(random_value)
-                    placeholders.append(placeholder)
-            self.execute(
-                self.sql('insert_data').format(table_name=self.table_name,
-                                               column_name=', '.join(column_names),
-                                               column_data=', '.join(placeholders)),
-                False, sql_params=values)
+        # 按批次插入多行数据，可根据self.manual_commit设置事务提交模式
+        self._execute_insert_batches(self._generate_insert_row(table_info) for _ in range(count))
 
     @db_step('手动插入MySQL表数据')
     def manual_insert_data(self, column_names: list, placeholders: list, values: list):
+        """
+        :param column_names: 字段名
+        :param placeholders: 预替换符
+        :param values: 单行数据[v...]
+        """
         print('表名: {0}, 手动插入数据'.format(self.table_name))
         assert len(column_names) == len(placeholders), '列数量与预替换符数量不匹配'
         self.execute(self.sql('insert_data').format(table_name=self.table_name,
@@ -551,6 +647,17 @@ create table {table_name}
                                                     column_data=', '.join(placeholders)),
                      False, sql_params=values)
 
+    @db_step('手动批量插入MySQL表数据')
+    def manual_insert_rows(self, column_names: list, placeholders: list, rows: list):
+        """
+        :param column_names: 字段名
+        :param placeholders: 预替换符
+        :param rows: 多行数据[[v...]...]，将按照self.batch_size批量插入
+        """
+        print('表名: {0}, 手动插入数据, 行数: {1}'.format(self.table_name, len(rows)))
+        assert len(column_names) == len(placeholders), '列数量与预替换符数量不匹配'
+        self._execute_insert_batches((column_names, placeholders, row) for row in rows)
+
     def _generate_matching_condition(self, table_info: DBTable, count_or_condition):
         conditions = []
         auto_inc_and_pk = list(filter(lambda x: x.auto_inc, table_info.primary_keys))
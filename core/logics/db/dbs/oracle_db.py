@@ -128,6 +128,17 @@ class OracleDB(DBDriver):
     # 数据库内置关键字，用于检索并设置默认值
     RESERVED_KEYWORD = ['SYSDATE', 'sys_guid()', 'CURRENT_TIMESTAMP']
 
+    # 批量DML时需预先声明绑定类型的字段，LOB及LONG字段无法通过数据推断，需通过setinputsizes指定
+    INPUT_SIZES = {
+        'BLOB': cx_Oracle.DB_TYPE_BLOB,
+        'CLOB': cx_Oracle.DB_TYPE_CLOB,
+        'NCLOB': cx_Oracle.DB_TYPE_NCLOB,
+        'LONG': cx_Oracle.DB_TYPE_LONG,
+    }
+
+    # 绑定None无法得到空值的字段类型，批量DML时仍使用NULL字面量
+    NULL_LITERAL_TYPES = ['BFILE']
+
     query = {
         'get_table_schema':
             '''
@@ -144,6 +155,16 @@ and t2.constraint_type = 'P' and t2.table_name = '{0}'""",
             "select dbms_metadata.get_ddl('TABLE','{0}') from dual",
         'get_all_data':
             'select * from "{0}"',
+        'checksum_column':
+            "nvl(to_char({column}), '#NULL#')",
+        'checksum_separator':
+            " || '|' || ",
+        'get_chunk_checksums':
+            "select floor({key} / {chunk_size}), count(*), "
+            "sum(to_number(substr(rawtohex(standard_hash({row_text}, 'MD5')), 1, 8), 'XXXXXXXX')) "
+            'from "{table_name}" group by floor({key} / {chunk_size})',
+        'get_chunk_data':
+            'select * from "{table_name}" where {key} >= {lower} and {key} < {upper}',
         'delete_table':
             'drop table "{0}"',
         'create_table': '''
@@ -182,6 +203,8 @@ where rn <= {count}''',
             'update "{table_name}" set {table_columns} {condition}',
         'delete_data':
             'delete from "{table_name}" {condition}',
+        'matching_key':
+            'where {column_name} = :match_key',
         'table_exist':
             "select * from ALL_TABLES where TABLE_NAME = '{0}'"
     }
@@ -193,16 +216,18 @@ where rn <= {count}''',
         self.password = db_config["password"]
         self.database = db_config["database"]
         self.table_name = table_name
-        self.db = self.__connect()
 
         # 是否手动提交变化，不开启则为自动提交，开启后可进行事务模式测试
         self.manual_commit = False
 
-    def __del__(self):
-        try:
-            self.db.close()
-        except:
-            pass
+        # 是否使用数组DML（executemany）批量插入、更新、删除数据，以及每批的行数
+        self.array_dml = True
+        self.batch_size = 1000
+
+    @lazy_connection
+    def db(self):
+        return self._borrow_connection(
+            self.__connect, (self.host, self.port, self.user, self.password, self.database))
 
     def __connect(self):
         print('连接Oracle数据库 host: {0}, port: {1}, user: {2}, passwd: {3}, db: {4}'.format(
@@ -212,6 +237,9 @@ where rn <= {count}''',
         db.ping()
         return db
 
+    def _ping_connection(self, conn):
+        conn.ping()
+
     def _format_default_value(self, default):
         if default is None:
             default = ''
@@ -245,6 +273,158 @@ where rn <= {count}''',
             if not self.manual_commit:
                 self.db.commit()
 
+    @db_call
+    def execute_many(self, sql, sql_params_list, input_sizes=None, handle_exception=False):
+        cursor = self.db.cursor()
+        print('SQL: {0}'.format(sql))
+        print('\t批量行数: {0}'.format(len(sql_params_list)))
+        try:
+            # LOB等字段需预先声明绑定类型，其余字段为None由首行数据推断
+            if input_sizes and any(input_sizes):
+                cursor.setinputsizes(*input_sizes)
+            cursor.executemany(sql, sql_params_list)
+        except Exception as e:
+            print(e)
+            # 是否处理异常
+            if not handle_exception:
+                raise e
+        finally:
+            cursor.close()
+            # 是否手动提交变化，不开启则为自动提交，开启后可进行事务模式测试
+            if not self.manual_commit:
+                self.db.commit()
+
+    def _execute_many_grouped(self, statements):
+        """
+        将语句相同的行合并为数组DML执行，每批达到self.batch_size时执行一次
+        :param statements: 可迭代的 (sql, input_sizes, values)
+        """
+        batch_size = max(self.batch_size or 1, 1)
+        batches = {}
+        for sql, input_sizes, values in statements:
+            batch = batches.setdefault(sql, (input_sizes, []))
+            batch[1].append(values)
+            if len(batch[1]) >= batch_size:
+                self.execute_many(sql, batch[1], batch[0])
+                del batches[sql]
+        for sql, (input_sizes, rows) in batches.items():
+            self.execute_many(sql, rows, input_sizes)
+
+    def _generate_column_value(self, column, bind_null=False):
+        """
+        基于字段类型随机生成该字段的数据
+        :param column: DBColumn对象
+        :param bind_null: 为True时，空值通过绑定None插入，保证批量DML中每行语句一致
+        :return: 预替换符, 绑定值列表, 绑定类型列表
+        """
+        input_size = self.INPUT_SIZES.get(str(column.data_type).upper())
+        # 如果字段允许为空，则有概率插入None
+        if not column.not_null and random_int(0, 9) == 0:
+            if not bind_null or str(column.data_type).upper() in self.NULL_LITERAL_TYPES:
+                return 'NULL', [], []
+            _, placeholder = getattr(OracleData, column.data_type.lower() + '_data')(
+                column.precision, column.scale, column.unsigned, column_type=column.column_type)
+            if placeholder.find(':{0}') == -1:
+                return 'NULL', [], []
+            return placeholder.format(column.name), [None], [input_size]
+
+        # 基于数据类型随机生成符合类型、精度、标度的数据
+        random_value, placeholder = getattr(OracleData, column.data_type.lower() + '_data')(
+            column.precision, column.scale, column.unsigned, column_type=column.column_type)
+        # 数据为EMPTY_MARK时，将会把数据插入placeholder
+        if random_value == EMPTY_MARK:
+            return placeholder, [], []
+        if type(random_value) is list:
+            return placeholder.format(column.name), random_value, [input_size] * len(random_value)
+        return placeholder.format(column.name), [random_value], [input_size]
+
+    def _generate_insert_row(self, table_info: DBTable, bind_null=False):
+        """
+        基于表结构随机生成一行插入数据
+        :param table_info: DBTable对象
+        :param bind_null: 为True时，空值通过绑定None插入
+        :return: 字段名, 预替换符, 值, 绑定类型
+        """
+        values = []
+        placeholders = []
+        column_names = []
+        input_sizes = []
+        for column in table_info.columns:
+            # 自增字段将不赋值
+            if column.auto_inc:
+                continue
+            column_names.append(column.name)
+            # 字段默认值为sys_guid 或 SORTED_AND_UNIQUE_COLUMN_NAME，将会随机生成唯一值
+            if column.default == 'sys_guid()' or \
+               column.name == SORTED_AND_UNIQUE_COLUMN_NAME:
+                values.append(random_sorted_and_unique_num())
+                placeholders.append(OracleData.DEFAULT_PLACEHOLDER.format(column.name))
+                input_sizes.append(None)
+                continue
+            placeholder, column_values, column_input_sizes = self._generate_column_value(column, bind_null)
+            placeholders.append(placeholder)
+            values.extend(column_values)
+            input_sizes.extend(column_input_sizes)
+        return column_names, placeholders, values, input_sizes
+
+    def _generate_update_row(self, table_info: DBTable, bind_null=False):
+        """
+        基于表结构随机生成一行更新数据
+        :param table_info: DBTable对象
+        :param bind_null: 为True时，空值通过绑定None更新
+        :return: 赋值语句, 值, 绑定类型
+        """
+        values = []
+        placeholders = []
+        input_sizes = []
+        for column in table_info.columns:
+            # 字段为SORTED_AND_UNIQUE_COLUMN_NAME，自增字段，或主键字段，将不会修改改数据
+            if column.name == SORTED_AND_UNIQUE_COLUMN_NAME or \
+                    column.auto_inc or \
+                    column.name in [pk.name for pk in table_info.primary_keys]:
+                continue
+            placeholder, column_values, column_input_sizes = self._generate_column_value(column, bind_null)
+            placeholders.append("{0}={1}".format(column.name, placeholder))
+            values.extend(column_values)
+            input_sizes.extend(column_input_sizes)
+        return placeholders, values, input_sizes
+
+    @staticmethod
+    def _stream_output_type_handler(cursor, name, default_type, size, precision, scale):
+        # 流式读取时，LOB在获取下一批数据后将失效，因此直接以字符串/字节读取
+        if default_type in (cx_Oracle.DB_TYPE_CLOB, cx_Oracle.DB_TYPE_NCLOB):
+            return cursor.var(cx_Oracle.DB_TYPE_LONG, arraysize=cursor.arraysize)
+        if default_type == cx_Oracle.DB_TYPE_BLOB:
+            return cursor.var(cx_Oracle.DB_TYPE_LONG_RAW, arraysize=cursor.arraysize)
+
+    def execute_stream(self, sql, batch_size=1000):
+        """
+        基于arraysize/prefetchrows分批流式执行查询，逐行返回结果
+        :param sql: 查询语句
+        :param batch_size: 每次从数据库获取的行数
+        """
+        print('SQL: {0}'.format(sql))
+        cursor = self.db.cursor()
+        cursor.arraysize = batch_size
+        cursor.prefetchrows = batch_size + 1
+        cursor.outputtypehandler = self._stream_output_type_handler
+        count = 0
+        try:
+            cursor.execute(sql)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                count += len(rows)
+                for row in rows:
+                    yield row
+        finally:
+            cursor.close()
+            print('RET: 共{0}行'.format(count))
+            # 是否手动提交变化，不开启则为自动提交，开启后可进行事务模式测试
+            if not self.manual_commit:
+                self.db.commit()
+
     @db_step('获取Oracle表结构')
     def get_table_info(self):
         print('表名: {0}'.format(self.table_name))
@@ -328,6 +508,11 @@ where rn <= {count}''',
         results = self.execute(self.sql('get_all_data').format(self.table_name))
         return results
 
+    @db_step('流式获取Oracle表所有数据')
+    def iter_table_data(self, batch_size=1000):
+        print('表名: {0}'.format(self.table_name))
+        return self.execute_stream(self.sql('get_all_data').format(self.table_name), batch_size)
+
     @db_step('删除Oracle表')
     def delete_table(self, raise_error=True):
         print('表名: {0}'.format(self.table_name))
@@ -426,37 +611,21 @@ where rn <= {count}''',
         # 获取DBTable对象
         table_info = self.get_table_info()
 
+        # 数组DML模式下，语句相同的行通过executemany批量插入
+        if self.array_dml:
+            def statements():
+                for _ in range(count):
+                    column_names, placeholders, values, input_sizes = self._generate_insert_row(table_info, True)
+                    sql = self.sql('insert_data').format(table_name=self.table_name,
+                                                         column_name=', '.join(column_names),
+                                                         column_data=', '.join(placeholders))
+                    yield sql, input_sizes, values
+            self._execute_many_grouped(statements())
+            return
+
         # 插入多行数据，可根据self.manual_commit设置事务提交模式
         for _ in range(count):
-            values = []
-            placeholders = []
-            column_names = []
-            for column in table_info.columns:
-                # 自增字段将不赋值
-                if column.auto_inc:
-                    continue
-                column_names.append(column.name)
-                # 字段默认值为sys_guid 或 SORTED_AND_UNIQUE_COLUMN_NAME，将会随机生成唯一值
-                if column.default == 'sys_guid()' or \
-                   column.name == SORTED_AND_UNIQUE_COLUMN_NAME:
-                    values.append(random_sorted_and_unique_num())
-                    placeholders.append(OracleData.DEFAULT_PLACEHOLDER.format(column.name))
-                # 如果字段允许为空，则有概率插入None
-                elif not column.not_null and random_int(0, 9) == 0:
-                    placeholders.append('NULL')
-                # 基于数据类型随机生成符合类型、精度、标度的数据
-                else:
-                    random_value, placeholder = getattr(OracleData, column.data_type.lower() + '_data')(
-                        column.precision, column.scale, column.unsigned, column_type=column.column_type)
-                    # 数据为EMPTY_MARK时，将会把数据插入placeholder
-                    if random_value == EMPTY_MARK:
-                        placeholders.append(placeholder)
-                        continue
-                    if type(random_value) is list:
-                        values.extend(random_value)
-                    else:
-                        values.append(random_value)
-                    placeholders.append(placeholder.format(column.name))
+            column_names, placeholders, values, _ = self._generate_insert_row(table_info)
             self.execute(
                 self.sql('insert_data').format(table_name=self.table_name,
                                                column_name=', '.join(column_names),
@@ -472,28 +641,36 @@ where rn <= {count}''',
                                                     column_data=', '.join(placeholders)),
                      False, sql_params=values)
 
-    def _generate_matching_condition(self, table_info: DBTable, count_or_condition):
-        conditions = []
+    def _generate_matching_keys(self, table_info: DBTable, count: int):
+        """
+        获取最新count条数据的查找字段及其值，用于数组DML基于绑定数组批量更新、删除数据
+        :return: 查找字段名, [查找字段值...]
+        """
         auto_inc_and_pk = list(filter(lambda x: x.auto_inc, table_info.primary_keys))
         pks = [each for each in table_info.primary_keys]
+        # 有自增主键，选择自增主键作为查找依据
+        if len(auto_inc_and_pk) > 0:
+            column_name = auto_inc_and_pk[0].name
+        # 有主键，选择第一个主键作为查找依据
+        elif len(pks) > 0:
+            column_name = pks[0].name
+        # 无主键，选择第一个字段作为查找依据
+        else:
+            column_name = table_info.columns[0].name
+        columns_value = self.execute(self.sql('get_condition').
+                                     format(table_name=self.table_name,
+                                            column_name=column_name,
+                                            count=count))
+        assert len(columns_value) == count, \
+            '当前表不存在：{0}行数据，可进行操作'.format(count)
+        return column_name, [column_value[0] for column_value in columns_value]
+
+    def _generate_matching_condition(self, table_info: DBTable, count_or_condition):
+        conditions = []
         if type(count_or_condition) == int:
-            # 有自增主键，选择自增主键作为查找依据
-            if len(auto_inc_and_pk) > 0:
-                column_name = auto_inc_and_pk[0].name
-            # 有主键，选择第一个主键作为查找依据
-            elif len(pks) > 0:
-                column_name = pks[0].name
-            # 无主键，选择第一个字段作为查找依据
-            else:
-                column_name = table_info.columns[0].name
-            columns_value = self.execute(self.sql('get_condition').
-                                         format(table_name=self.table_name,
-                                                column_name=column_name,
-                                                count=count_or_condition))
-            assert len(columns_value) == count_or_condition, \
-                '当前表不存在：{0}行数据，可进行操作'.format(count_or_condition)
-            for column_value in columns_value:
-                conditions.append("where {0} = '{1}'".format(column_name, column_value[0]))
+            column_name, keys = self._generate_matching_keys(table_info, count_or_condition)
+            for key in keys:
+                conditions.append("where {0} = '{1}'".format(column_name, key))
         # 其他需用户指定查找条件
         else:
             columns_value = self.execute(self.sql('get_condition_customize').
@@ -509,36 +686,26 @@ where rn <= {count}''',
         # 获取DBTable对象
         table_info = self.get_table_info()
 
+        # 数组DML模式下，基于查找字段的绑定数组批量更新数据
+        if self.array_dml and type(count_or_condition) == int:
+            column_name, keys = self._generate_matching_keys(table_info, count_or_condition)
+            condition = self.sql('matching_key').format(column_name=column_name)
+            statements = []
+            for key in keys:
+                placeholders, values, input_sizes = self._generate_update_row(table_info, True)
+                sql = self.sql('update_data').format(table_name=self.table_name,
+                                                     table_columns=', '.join(placeholders),
+                                                     condition=condition)
+                statements.append((sql, input_sizes + [None], values + [key]))
+            self._execute_many_grouped(statements)
+            return
+
         # 获得满足查找条件的数据查找对象
         conditions = self._generate_matching_condition(table_info, count_or_condition)
 
         # 更新多行数据，可根据self.manual_commit设置事务提交模式
         for condition in conditions:
-            values = []
-            placeholders = []
-            for column in table_info.columns:
-                # 字段为SORTED_AND_UNIQUE_COLUMN_NAME，自增字段，或主键字段，将不会修改改数据
-                if column.name == SORTED_AND_UNIQUE_COLUMN_NAME or \
-                        column.auto_inc or \
-                        column.name in [pk.name for pk in table_info.primary_keys]:
-                    continue
-                # 如果字段允许为空，则有概率插入None
-                if not column.not_null and random_int(0, 9) == 0:
-                    placeholders.append("{0}=NULL".format(column.name))
-                    continue
-                # 基于数据类型随机生成符合类型、精度、标度的数据
-                random_value, placeholder = getattr(OracleData, column.data_type.lower() + '_data')(
-                    column.precision, column.scale, column.unsigned, column_type=column.column_type)
-
-                # 数据为EMPTY_MARK时，将会把数据插入placeholder
-                if random_value == EMPTY_MARK:
-                    placeholders.append("{0}={1}".format(column.name, placeholder))
-                    continue
-                if type(random_value) is list:
-                    values.extend(random_value)
-                else:
-                    values.append(random_value)
-                placeholders.append("{0}={1}".format(column.name, placeholder.format(column.name)))
+            placeholders, values, _ = self._generate_update_row(table_info)
             self.execute(
                 self.sql('update_data').format(table_name=self.table_name,
                                                table_columns=', '.join(placeholders),
@@ -569,6 +736,14 @@ where rn <= {count}''',
         # 获取DBTable对象
         table_info = self.get_table_info()
 
+        # 数组DML模式下，基于查找字段的绑定数组批量删除数据
+        if self.array_dml and type(count_or_condition) == int:
+            column_name, keys = self._generate_matching_keys(table_info, count_or_condition)
+            sql = self.sql('delete_data').format(table_name=self.table_name,
+                                                 condition=self.sql('matching_key').format(column_name=column_name))
+            self._execute_many_grouped((sql, None, [key]) for key in keys)
+            return
+
         # 获得满足查找条件的数据查找对象
         conditions = self._generate_matching_condition(table_info, count_or_condition)
 
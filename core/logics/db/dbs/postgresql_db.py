@@ -2,6 +2,7 @@
 # encoding: utf-8
 import psycopg2
 from core.logics.db.db_driver import *
+from core.logics.db.db_bulk_loader import PgBulkLoader, CopyFormat
 
 
 class PostgreSqlData:
@@ -348,6 +349,9 @@ class PostgreSqlData:
 class PostgreSqlDB(DBDriver):
     ALIAS = 'POSTGRESQL'
 
+    # 分块校验时字段转为文本的格式族
+    CHECKSUM_FAMILY = 'POSTGRESQL'
+
     # 数据库内置关键字，用于检索并设置默认值
     RESERVED_KEYWORD = ['CURRENT_TIMESTAMP', 'CURRENT_DATE']
     RESERVED_KEYWORD_CONTAINS = ['NULL::']
@@ -393,6 +397,16 @@ from
 group by relname;""",
         'get_all_data':
             "select * from \"{0}\"",
+        'checksum_column':
+            "coalesce({column}::text, '#NULL#')",
+        'checksum_separator':
+            " || '|' || ",
+        'get_chunk_checksums':
+            "select floor({key} * 1.0 / {chunk_size}), count(*), "
+            "sum(('x' || substr(md5({row_text}), 1, 8))::bit(32)::bigint) "
+            "from \"{table_name}\" group by floor({key} * 1.0 / {chunk_size})",
+        'get_chunk_data':
+            "select * from \"{table_name}\" where {key} >= {lower} and {key} < {upper}",
         'delete_table':
             "drop table \"{0}\"",
         'create_table': '''
@@ -436,6 +450,8 @@ create table "{table_name}"
             "update {table_name} set {table_columns} {condition}",
         'delete_data':
             "delete from {table_name} {condition}",
+        'ping':
+            "select 1",
         'table_exist':
             "select * from information_schema.TABLES where TABLE_NAME = '{0}'"
     }
@@ -447,16 +463,18 @@ create table "{table_name}"
         self.password = db_config["password"]
         self.database = db_config["database"]
         self.table_name = table_name
-        self.db = self.__connect()
 
         # 是否手动提交变化，不开启则为自动提交，开启后可进行事务模式测试
         self.manual_commit = False
 
-    def __del__(self):
-        try:
-            self.db.close()
-        except:
-            pass
+        # 批量插入数据的导入方式，默认通过COPY ... FROM STDIN流式导入，为None时使用多行INSERT分批导入
+        self.bulk_load_format = CopyFormat.text
+        self.batch_size = 1000
+
+    @lazy_connection
+    def db(self):
+        return self._borrow_connection(
+            self.__connect, (self.host, self.port, self.user, self.password, self.database))
 
     def __connect(self):
         print('连接PostgreSQL数据库 host: {0}, port: {1}, user: {2}, passwd: {3}, db: {4}'.format(
@@ -490,6 +508,31 @@ create table "{table_name}"
             if not self.manual_commit:
                 self.db.commit()
 
+    def execute_stream(self, sql, batch_size=1000):
+        """
+        基于命名游标流式执行查询，逐行返回结果
+        :param sql: 查询语句
+        :param batch_size: 每次从数据库获取的行数
+        """
+        print('SQL: {0}'.format(sql))
+        cursor = self._open_stream_cursor(batch_size)
+        count = 0
+        try:
+            cursor.execute(sql)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                count += len(rows)
+                for row in rows:
+                    yield row
+        finally:
+            cursor.close()
+            print('RET: 共{0}行'.format(count))
+            # 是否手动提交变化，不开启则为自动提交，开启后可进行事务模式测试
+            if not self.manual_commit:
+                self.db.commit()
+
     @db_step('获取PostgreSQL表结构')
     def get_table_info(self):
         print('表名: {0}'.format(self.table_name))
@@ -548,6 +591,11 @@ create table "{table_name}"
         results = self.execute(self.sql('get_all_data').format(self.table_name))
         return results
 
+    @db_step('流式获取PostgreSQL表所有数据')
+    def iter_table_data(self, batch_size=1000):
+        print('表名: {0}'.format(self.table_name))
+        return self.execute_stream(self.sql('get_all_data').format(self.table_name), batch_size)
+
     @db_step('删除PostgreSql表')
     def delete_table(self, raise_error=True):
         print('表名: {0}'.format(self.table_name))
@@ -663,44 +711,48 @@ create table "{table_name}"
         print('表名: {0}, 删除主键'.format(self.table_name))
         self.execute(self.sql('delete_primary_key').format(self.table_name), False)
 
+    def _generate_insert_row(self, table_info: DBTable):
+        """
+        基于表结构随机生成一行插入数据
+        :param table_info: DBTable对象
+        :return: 字段名, 预替换符, 值
+        """
+        values = []
+        placeholders = []
+        column_names = []
+        for column in table_info.columns:
+            # 自增字段将不赋值
+            if column.auto_inc:
+                continue
+            column_names.append(column.name)
+            # 如果字段名为SORTED_AND_UNIQUE_COLUMN_NAME，将会随机生成唯一值
+            if column.name == SORTED_AND_UNIQUE_COLUMN_NAME:
+                values.append(random_sorted_and_unique_num())
+                placeholders.append(PostgreSqlData.DEFAULT_PLACEHOLDER)
+            # 如果字段允许为空，则有概率插入None
+            elif not column.not_null and random_int(0, 9) == 0:
+                values.append(None)
+                placeholders.append(PostgreSqlData.DEFAULT_PLACEHOLDER)
+            # 基于数据类型随机生成符合类型、精度、标度的数据
+            else:
+                random_value, placeholder = getattr(PostgreSqlData, column.data_type + '_data')(
+                    column.precision, column.scale, column.unsigned, column_type=column.column_type)
+                if type(random_value) is list:
+                    values.extend(random_value)
+                else:
+                    values.append(random_value)
+                placeholders.append(placeholder)
+        return column_names, placeholders, values
+
     @db_step('插入PostgreSql表数据')
     def insert_data(self, count: int):
         print('表名: {0}, 插入数据'.format(self.table_name))
         # 获取DBTable对象
         table_info = self.get_table_info()
 
-        # 插入多行数据，可根据self.manual_commit设置事务提交模式
-        for _ in range(count):
-            values = []
-            placeholders = []
-            column_names = []
-            for column in table_info.columns:
-                # 自增字段将不赋值
-                if column.auto_inc:
-                    continue
-                column_names.append(column.name)
-                # 如果字段名为SORTED_AND_UNIQUE_COLUMN_NAME，将会随机生成唯一值
-                if column.name == SORTED_AND_UNIQUE_COLUMN_NAME:
-                    values.append(random_sorted_and_unique_num())
-                    placeholders.append(PostgreSqlData.DEFAULT_PLACEHOLDER)
-                # 如果字段允许为空，则有概率插入None
-                elif not column.not_null and random_int(0, 9) == 0:
-                    values.append(None)
-                    placeholders.append(PostgreSqlData.DEFAULT_PLACEHOLDER)
-                # 基于数据类型随机生成符合类型、精度、标度的数据
-                else:
-                    random_value, placeholder = getattr(PostgreSqlData, column.data_type + '_data')(
-                        column.precision, column.scale, column.unsigned, column_type=column.column_type)
-                    if type(random_value) is list:
-                        values.extend(random_value)
-                    else:
-                        values.append(random_value)
-                    placeholders.append(placeholder)
-            self.execute(
-                self.sql('insert_data').format(table_name=self.table_name,
-                                               column_name=', '.join(column_names),
-                                               column_data=', '.join(placeholders)),
-                False, sql_params=tuple(values))
+        # 批量导入多行数据，可根据self.manual_commit设置事务提交模式
+        loader = PgBulkLoader(self, self.bulk_load_format, self.batch_size)
+        loader.load(table_info, (self._generate_insert_row(table_info) for _ in range(count)))
 
     @db_step('手动插入PostgreSql表数据')
     def manual_insert_data(self, column_names: list, placeholders: list, values: list):
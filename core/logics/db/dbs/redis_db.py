@@ -1,9 +1,10 @@
 #!/usr/bin/env python
 # encoding: utf-8
-import redis
 import re
+import redis
+from rediscluster import RedisCluster
 from core.logics.db.db_driver import *
-from core.utils.common import format_json
+from core.utils.common import format_json, JsonDecoder
 
 
 class RedisDB(DBDriver):
@@ -12,52 +13,100 @@ class RedisDB(DBDriver):
     def __init__(self, db_config: dict, key):
         self.host = db_config["ip"]
         self.port = db_config["port"]
-        self.database = db_config["database"]
+        self.database = db_config.get("database", 0)
+        self.password = db_config.get("password")
+        # 配置中包含startup_nodes时，以集群模式连接
+        self.startup_nodes = db_config.get("startup_nodes")
+        self.cluster = self.startup_nodes is not None
         self.table_name = key
 
+        # SCAN每次迭代时建议服务端遍历的key数量
+        self.scan_count = 1000
+        # 每批MGET/UNLINK的key数量，集群模式下为每批流水线中GET/UNLINK的数量
+        self.batch_size = 1000
+
         # 如作为下游库或没有该schema信息文件，需显示将self.table_info赋值为DBTable对象
         self.table_info = None
 
-        self.db = self.__connect()
-
-    def __del__(self):
-        try:
-            self.db.close()
-        except:
-            pass
+    @lazy_connection
+    def db(self):
+        return self.__connect()
 
     def __connect(self):
-        print('连接Redis host: {0}, port: {1}, database: {2}'.format(self.host, self.port, self.database))
-        db = redis.StrictRedis(host=self.host, port=self.port, db=self.database)
+        if self.cluster:
+            print('连接Redis Cluster startup_nodes: {0}, password: {1}'.format(self.startup_nodes, self.password))
+            return RedisCluster(startup_nodes=self.startup_nodes, password=self.password)
+        print('连接Redis host: {0}, port: {1}, database: {2}, password: {3}'.format(
+            self.host, self.port, self.database, self.password))
+        db = redis.StrictRedis(host=self.host, port=self.port, db=self.database, password=self.password)
         return db
 
+    def __scan_keys(self):
+        """
+        基于SCAN游标迭代以当前键值为前缀的所有key，由服务端匹配前缀，不会阻塞服务端
+        集群模式下依次遍历所有主节点
+        """
+        # 转义键值中的glob特殊字符，仅按前缀匹配
+        match = re.sub(r'([*?\[\]\\])', r'\\\1', self.table_name) + '*'
+        return self.db.scan_iter(match=match, count=self.scan_count)
+
+    def __scan_key_batches(self):
+        """
+        将SCAN得到的key按batch_size分批返回
+        """
+        batch = []
+        for key in self.__scan_keys():
+            batch.append(key)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def __get_values(self, keys):
+        """
+        批量获取key的值，单机模式使用一次MGET，集群模式下key可能分布在不同slot，通过流水线按节点批量GET
+        """
+        if not self.cluster:
+            return self.db.mget(keys)
+        pipe = self.db.pipeline(transaction=False)
+        for key in keys:
+            pipe.get(key)
+        return pipe.execute()
+
+    def __unlink_keys(self, keys):
+        """
+        批量删除key，UNLINK由服务端异步释放内存，集群模式下通过流水线按节点批量UNLINK
+        """
+        if not self.cluster:
+            return self.db.unlink(*keys)
+        pipe = self.db.pipeline(transaction=False)
+        for key in keys:
+            pipe.unlink(key)
+        return sum(pipe.execute())
+
+    def __iter_rows(self):
+        # 因为数据中可能存在各种特殊字符，导致json.loads失败
+        # 严格解析失败时，JsonDecoder对有可能出现的字符进行处理，尽力保证原数据的情况下转为dict
+        decoder = JsonDecoder(lower_key=True, encoding='utf-8')
+        count = 0
+        try:
+            for keys in self.__scan_key_batches():
+                for value in self.__get_values(keys):
+                    # SCAN与GET之间key可能已过期或被删除
+                    if value is None:
+                        continue
+                    result_dict = decoder.decode(value)
+                    count += 1
+                    yield [result_dict[column.name.lower()] for column in self.table_info.columns]
+        finally:
+            print(decoder.summary())
+            print('RET: 共{0}行'.format(count))
+
     @db_call
     def __fetch_all(self):
         print('获取Redis所有数据，键值: {0}'.format(self.table_name))
-        result = []
-        all_keys = [key for key in self.db.keys() if key.decode('utf-8').startswith(self.table_name)]
-        # 因为数据中可能存在各种特殊字符，导致json.loads失败
-        # 下面代码对有可能出现的字符进行处理，尽力保证原数据的情况下转为dict
-        for key in all_keys:
-            # 处理每一行数据，使用\n分割进行单独处理
-            msg = self.db.get(key).decode('utf-8')
-            lines = msg.split('\n')
-            new_lines = []
-            for line in lines:
-                # 替换\t
-                line = line.replace('\t', '\\t')
-                # 匹配是否为k:v格式，如匹配则将v值中的双引号去除
-                search_result = re.search(r'^  "([^"]*)": "(.*)",', line)
-                if search_result:
-                    col_name = search_result.group(1)
-                    col_value = search_result.group(2)
-                    line = '  "' + col_name + '": "' + col_value.replace('"', '\'') + '",'
-                new_lines.append(line)
-            msg = ''.join(new_lines)
-            result_dict = json.loads(msg)
-            result_dict = {k.lower(): v for k, v in result_dict.items()}
-            line = [result_dict[column.name.lower()] for column in self.table_info.columns]
-            result.append(line)
+        result = list(self.__iter_rows())
         print('RET: {0}'.format(result))
         return result
 
@@ -68,10 +117,10 @@ class RedisDB(DBDriver):
         if self.table_info is not None:
             return self.table_info
 
-        all_keys = [key for key in self.db.keys() if key.decode('utf-8').startswith(self.table_name)]
-        if not all_keys:
+        first_key = next(iter(self.__scan_keys()), None)
+        if first_key is None:
             raise Exception('至少需要一条记录, 才可以获得相应的schema')
-        msg = self.db.get(all_keys[0]).decode('utf-8')  # 以第一条记录为样本, 提取相应的column name, 以及列的数量信息
+        msg = self.db.get(first_key).decode('utf-8')  # 以第一条记录为样本, 提取相应的column name, 以及列的数量信息
         msg_json = format_json(msg)
         columns = []
         for each in msg_json.keys():
@@ -95,13 +144,18 @@ class RedisDB(DBDriver):
         results = self.__fetch_all()
         return results
 
+    def iter_table_data(self, batch_size=1000):
+        print('键值: {0}'.format(self.table_name))
+        return self.__iter_rows()
+
     @db_step('删除Redis所有键值')
     def delete_table(self, raise_error=True):
         print('键值: {0}'.format(self.table_name))
         try:
-            all_keys = [key for key in self.db.keys() if key.decode('utf-8').startswith(self.table_name)]
-            for key in all_keys:
-                self.db.delete(key)
+            count = 0
+            for keys in self.__scan_key_batches():
+                count += self.__unlink_keys(keys)
+            print('删除key数量: {0}'.format(count))
         except Exception as e:
             print(e)
             if raise_error:
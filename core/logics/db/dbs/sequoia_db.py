@@ -1,16 +1,127 @@
 #!/usr/bin/env python
 # encoding: utf-8
 import os
+import threading
 import subprocess
 from core.logics.db.db_driver import *
 from core.utils.common import format_json
 
 
+class SDBBridge:
+    """
+    常驻的SDB.jar进程（java -jar SDB.jar serve），避免每次调用都启动JVM、重新建立连接
+    请求: 制表符分隔的 cmd ip port user passwd collection_space collection，一行一个请求
+    响应: 每条记录以"R "开头逐行返回，请求结束时返回"E SDB_SUCCESS"或"E SDB_ERROR 错误信息"
+    进程退出后，下一次请求时自动重启；同一时间只处理一个请求，
+    同一线程在上一次请求的结果未遍历完时再次请求将抛出SequoiaDBOperationException，而不是等待
+    """
+
+    READY = 'SDB_READY'
+    RECORD = 'R '
+    END = 'E '
+    SUCCESS = 'SDB_SUCCESS'
+
+    def __init__(self, jar_path):
+        self.jar_path = jar_path
+        self.process = None
+        self.lock = threading.Lock()
+        # 正在处理请求的线程，用于检测同一线程的嵌套请求
+        self.owner = None
+        # SDB.jar不支持常驻模式时不再重复尝试启动
+        self.supported = True
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        """
+        启动进程并等待握手，不支持常驻模式的SDB.jar将直接退出，此时抛出SequoiaDBOperationException
+        """
+        self.close()
+        print('启动SequoiaDB常驻调用器: {0}'.format(self.jar_path))
+        self.process = subprocess.Popen(['java', '-jar', self.jar_path, 'serve'], stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                        text=True, encoding='utf-8', bufsize=1)
+        ready = self.process.stdout.readline().strip()
+        if ready != self.READY:
+            self.close()
+            self.supported = False
+            raise SequoiaDBOperationException('SequoiaDB常驻调用器启动失败，SDB.jar不支持serve模式')
+
+    def close(self):
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=5)
+        except Exception:
+            self.process.kill()
+        self.process = None
+
+    def __send(self, fields):
+        if not self.is_alive():
+            self.start()
+        try:
+            self.process.stdin.write('\t'.join([str(x) for x in fields]) + '\n')
+            self.process.stdin.flush()
+        except OSError:
+            # 进程已退出，重启后重新发送
+            self.start()
+            self.process.stdin.write('\t'.join([str(x) for x in fields]) + '\n')
+            self.process.stdin.flush()
+
+    def __read_line(self):
+        line = self.process.stdout.readline()
+        if not line:
+            self.close()
+            raise SequoiaDBOperationException('SequoiaDB常驻调用器进程已退出')
+        return line.rstrip('\n')
+
+    def request(self, fields):
+        """
+        发送请求，逐行返回结果记录
+        提前结束遍历时，会读取并丢弃剩余记录，保证下一次请求的响应不错位
+        :param fields: [cmd, ip, port, user, passwd, collection_space, collection]
+        """
+        if self.owner == threading.get_ident():
+            # 当前线程仍持有上一次请求的结果流，等待锁将导致死锁
+            raise SequoiaDBOperationException('SequoiaDB常驻调用器上一次请求的结果未遍历完，不能在同一线程中再次请求')
+        with self.lock:
+            self.owner = threading.get_ident()
+            try:
+                self.__send(fields)
+                finished = False
+                try:
+                    while True:
+                        line = self.__read_line()
+                        if line.startswith(self.RECORD):
+                            yield line[len(self.RECORD):]
+                        elif line.startswith(self.END):
+                            finished = True
+                            if line[len(self.END):] != self.SUCCESS:
+                                raise SequoiaDBOperationException('SequoiaDB调用器出现错误: {0}'.format(
+                                    line[len(self.END):]))
+                            return
+                finally:
+                    if not finished and self.is_alive():
+                        try:
+                            while not self.__read_line().startswith(self.END):
+                                pass
+                        except SequoiaDBOperationException:
+                            pass
+            finally:
+                self.owner = None
+
+
 class SequoiaDB(DBDriver):
     ALIAS = 'SEQUOIADB'
 
     ENDING = 'SDB_SUCCESS'
 
+    # 常驻调用器，基于(host, port, user)复用，{(host, port, user): SDBBridge}
+    _BRIDGES = {}
+    _BRIDGES_LOCK = threading.Lock()
+
     query = {
         'get_table_schema':
             "get_table_schema",
@@ -31,17 +142,59 @@ class SequoiaDB(DBDriver):
         # 如作为下游库或没有该schema信息文件，需显示将self.table_info赋值为DBTable对象
         self.table_info = None
 
+        # 是否使用常驻的SDB.jar进程执行调用，SDB.jar不支持常驻模式时自动改为每次调用启动java进程
+        self.use_bridge = True
+
         self.__connect()
 
     def __connect(self):
         print('连接SequoiaDB host: {0}, port: {1}, user: {2}, password: {3}, collection_space: {4}'.format(
             self.host, self.port, self.user, self.password, self.database))
 
+    def __get_bridge(self):
+        with self._BRIDGES_LOCK:
+            key = (self.host, self.port, self.user)
+            if key not in self._BRIDGES:
+                self._BRIDGES[key] = SDBBridge(os.path.abspath(os.path.join('lib', 'SDB.jar')))
+            return self._BRIDGES[key]
+
+    def execute_stream(self, sql, collection):
+        """
+        通过常驻调用器执行，逐行返回结果，不需等待所有结果返回
+        常驻调用器不可用时，改为每次调用启动java进程
+        """
+        if self.use_bridge:
+            bridge = self.__get_bridge()
+            self.use_bridge = bridge.supported
+        if self.use_bridge:
+            try:
+                if not bridge.is_alive():
+                    bridge.start()
+            except SequoiaDBOperationException as e:
+                print(e)
+                self.use_bridge = False
+        if not self.use_bridge:
+            for line in self.execute(sql, collection):
+                yield line
+            return
+        print('SQL: {0}'.format(sql))
+        count = 0
+        try:
+            for line in bridge.request([sql, self.host, self.port, self.user, self.password,
+                                        self.database, collection]):
+                count += 1
+                yield line
+        finally:
+            print('RET: 共{0}行'.format(count))
+
     @db_call
     def execute(self, sql, collection):
         """
         因巨杉python-driver系统兼容性问题，替换使用java-driver进行调用
+        开启use_bridge时通过常驻调用器执行，否则每次调用启动java进程
         """
+        if self.use_bridge:
+            return list(self.execute_stream(sql, collection))
         print('SQL: {0}'.format(sql))
         cmd = 'java -jar {jar_path} {cmd} {ip} {port} {user} {passwd} {collection_space} {collection}'.format(
             jar_path=os.path.abspath(os.path.join('lib', 'SDB.jar')),
@@ -91,12 +244,8 @@ class SequoiaDB(DBDriver):
         table_info = DBTable(self.ALIAS, self.table_name, columns, [])
         return table_info
 
-    @db_step('获取SequoiaDB所有数据')
-    def get_table_data(self):
-        print('Collection: {0}'.format(self.table_name))
-        results = self.execute(self.sql('get_all_data'), self.table_name)
-        result = []
-        for msg in results:
+    def __iter_rows(self):
+        for msg in self.execute_stream(self.sql('get_all_data'), self.table_name):
             if not msg.strip():
                 continue
             result_dict = json.loads(msg)
@@ -107,8 +256,16 @@ class SequoiaDB(DBDriver):
                 if isinstance(item, dict):
                     item = item[list(item.keys())[0]]
                 line.append(item)
-            result.append(line)
-        return result
+            yield line
+
+    @db_step('获取SequoiaDB所有数据')
+    def get_table_data(self):
+        print('Collection: {0}'.format(self.table_name))
+        return list(self.__iter_rows())
+
+    def iter_table_data(self, batch_size=1000):
+        print('Collection: {0}'.format(self.table_name))
+        return self.__iter_rows()
 
     @db_step('获取SequoiaDB所有数据')
     def delete_table(self, raise_error=True):
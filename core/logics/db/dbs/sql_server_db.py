@@ -270,6 +270,16 @@ SELECT @SQL = STUFF((
 PRINT @SQL; SELECT @SQL;""",
         'get_all_data':
             "select * from {0}",
+        'checksum_column':
+            "coalesce(convert(varchar(max), {column}), '#NULL#')",
+        'checksum_separator':
+            " + '|' + ",
+        'get_chunk_checksums':
+            "select floor({key} * 1.0 / {chunk_size}), count(*), "
+            "sum(convert(bigint, convert(binary(4), hashbytes('MD5', {row_text})))) "
+            "from {table_name} group by floor({key} * 1.0 / {chunk_size})",
+        'get_chunk_data':
+            "select * from {table_name} where {key} >= {lower} and {key} < {upper}",
         'delete_table':
             "drop table \"{0}\"",
         'create_table': '''
@@ -314,6 +324,8 @@ where id=(select cdefault from syscolumns where id=object_id('{0}') and name='{1
             "update {table_name} set {table_columns} {condition}",
         'delete_data':
             "delete {table_name} {condition}",
+        'ping':
+            "select 1",
         'table_exist':
             "select * from information_schema.TABLES where TABLE_NAME = '{0}'"
     }
@@ -326,7 +338,6 @@ where id=(select cdefault from syscolumns where id=object_id('{0}') and name='{1
         self.database = db_config["database"]
         self.charset = 'utf8'
         self.table_name = table_name
-        self.db = self.__connect()
 
         # 是否手动提交变化，不开启则为自动提交，开启后可进行事务模式测试
         self.manual_commit = False
@@ -338,11 +349,10 @@ where id=(select cdefault from syscolumns where id=object_id('{0}') and name='{1
                              user=self.user, password=self.password, database=self.database, charset=self.charset)
         return db
 
-    def __del__(self):
-        try:
-            self.db.close()
-        except:
-            pass
+    @lazy_connection
+    def db(self):
+        return self._borrow_connection(
+            self.__connect, (self.host, self.port, self.user, self.password, self.database, self.charset))
 
     @db_call
     def execute(self, sql, fetch_all=True, sql_params=None, handle_exception=False):
@@ -369,6 +379,32 @@ where id=(select cdefault from syscolumns where id=object_id('{0}') and name='{1
             if not self.manual_commit:
                 self.db.commit()
 
+    def execute_stream(self, sql, batch_size=1000):
+        """
+        分批流式执行查询，逐行返回结果
+        :param sql: 查询语句
+        :param batch_size: 每次从数据库获取的行数
+        """
+        print('SQL: {0}'.format(sql))
+        # pymssql逐批从结果集中读取数据，未读取的数据不会加载至内存
+        cursor = self.db.cursor()
+        count = 0
+        try:
+            cursor.execute(sql)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                count += len(rows)
+                for row in rows:
+                    yield row
+        finally:
+            cursor.close()
+            print('RET: 共{0}行'.format(count))
+            # 是否手动提交变化，不开启则为自动提交，开启后可进行事务模式测试
+            if not self.manual_commit:
+                self.db.commit()
+
     @db_step('获取Sql Server表结构')
     def get_table_info(self):
         print('表名: {0}'.format(self.table_name))
@@ -421,6 +457,11 @@ where id=(select cdefault from syscolumns where id=object_id('{0}') and name='{1
         results = self.execute(self.sql('get_all_data').format(self.table_name))
         return results
 
+    @db_step('流式获取Sql Server表所有数据')
+    def iter_table_data(self, batch_size=1000):
+        print('表名: {0}'.format(self.table_name))
+        return self.execute_stream(self.sql('get_all_data').format(self.table_name), batch_size)
+
     @db_step('删除Sql Server表')
     def delete_table(self, raise_error=True):
         print('表名: {0}'.format(self.table_name))
@@ -265,6 +265,10 @@ class TidbData:
 
 class TidbDB(DBDriver):
     ALIAS = 'TIDB'
+
+    # 分块校验时字段转为文本的格式族
+    CHECKSUM_FAMILY = 'MYSQL'
+
     RESERVED_KEYWORD = ['CURRENT_TIMESTAMP']
 
     query = {
@@ -280,6 +284,16 @@ where TABLE_NAME = '{0}' order by ORDINAL_POSITION;''',
             "select COLUMN_TYPE from information_schema.columns where TABLE_NAME = '{0}' and COLUMN_NAME = '{1}'",
         'get_all_data':
             "select * from {0}",
+        'checksum_column':
+            "coalesce(cast({column} as char), '#NULL#')",
+        'checksum_separator':
+            ", '|', ",
+        'get_chunk_checksums':
+            "select floor({key} * 1.0 / {chunk_size}), count(*), "
+            "sum(conv(substring(md5(concat({row_text})), 1, 8), 16, 10)) "
+            "from {table_name} group by floor({key} * 1.0 / {chunk_size})",
+        'get_chunk_data':
+            "select * from {table_name} where {key} >= {lower} and {key} < {upper}",
         'delete_table':
             "drop table {0}",
         'create_table': '''
@@ -327,16 +341,14 @@ create table {table_name}
         self.database = db_config["database"]
         self.charset = 'utf8'
         self.table_name = table_name
-        self.db = self.__connect()
 
         # 数据库内置关键字，用于检索并设置默认值
         self.manual_commit = False
 
-    def __del__(self):
-        try:
-            self.db.close()
-        except:
-            pass
+    @lazy_connection
+    def db(self):
+        return self._borrow_connection(
+            self.__connect, (self.host, self.port, self.user, self.password, self.database, self.charset))
 
     def __connect(self):
         print('连接TiDB数据库 host: {0}, port: {1}, user: {2}, passwd: {3}, db: {4}, charset: {5}'.format(
@@ -346,6 +358,9 @@ create table {table_name}
         db.ping()
         return db
 
+    def _ping_connection(self, conn):
+        conn.ping(reconnect=False)
+
     @db_call
     def execute(self, sql, fetch_all=True, sql_params=None, handle_exception=False):
         if sql_params is None:
@@ -371,6 +386,32 @@ create table {table_name}
             if not self.manual_commit:
                 self.db.commit()
 
+    def execute_stream(self, sql, batch_size=1000):
+        """
+        基于服务端游标（SSCursor）流式执行查询，逐行返回结果
+        :param sql: 查询语句
+        :param batch_size: 每次从数据库获取的行数
+        """
+        print('SQL: {0}'.format(sql))
+        # 使用服务端游标，数据按批次从服务端读取，不会一次性加载至内存
+        cursor = self.db.cursor(pymysql.cursors.SSCursor)
+        count = 0
+        try:
+            cursor.execute(sql)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                count += len(rows)
+                for row in rows:
+                    yield row
+        finally:
+            cursor.close()
+            print('RET: 共{0}行'.format(count))
+            # 是否手动提交变化，不开启则为自动提交，开启后可进行事务模式测试
+            if not self.manual_commit:
+                self.db.commit()
+
     @db_step('获取TiDB表结构')
     def get_table_info(self):
         print('表名: {0}'.format(self.table_name))
@@ -417,6 +458,11 @@ create table {table_name}
         results = self.execute(self.sql('get_all_data').format(self.table_name))
         return results
 
+    @db_step('流式获取TiDB表所有数据')
+    def iter_table_data(self, batch_size=1000):
+        print('表名: {0}'.format(self.table_name))
+        return self.execute_stream(self.sql('get_all_data').format(self.table_name), batch_size)
+
     @db_step('删除TiDB表')
     def delete_table(self, raise_error=True):
         print('表名: {0}'.format(self.table_name))
@@ -10,7 +10,7 @@ from core.exceptions.regression_related_exception import *
 
 框架在运行中会将，以下对象传递到等待条件实现类：
 instance，代表当前DBOperator实例，可访问、使用其内部所有函数、属性
-source_db_data = source_db_data，已经融合后的上游表中所有数据及schema
+source_db_data = source_db_data，已经融合后的上游表中所有数据及schema（列式存储的DBTableData，每行row[列名]仍返回{"info": DBColumn, "value": 值}）
 order_by，指定的排序列
 unique_by，指定的去重列
 **wait_args，其他额外信息通过字典变量传递
@@ -48,7 +48,7 @@ class DBDataMatch:
     def __call__(self):
         try:
             db_types = self.instance.sink_db.get_table_info()
-            db_lines = self.instance.sink_db.get_table_data()
+            db_lines = self.instance.sink_db.poll_table_data(self.instance.fetch_batch_size)
             db_data = self.instance.combine_schema_and_data(db_types, db_lines, self.order_by, self.unique_by)
             if len(list(filter(self.lambda_function,  db_data))) == self.match_count:
                 print('目标数据有满足条件的列')
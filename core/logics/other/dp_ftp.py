@@ -453,6 +453,44 @@ class FTP:
                 conn.unwrap()
         return self.voidresp()
 
+    def retrbinary_iter(self, cmd, blocksize=8192, rest=None):
+        """Retrieve data in binary mode, yielding each block as it arrives.
+
+        Unlike retrbinary(), the caller pulls the data, so nothing has to
+        be buffered in a local file or in memory.  If the generator is
+        closed before the transfer completes, the data connection is
+        closed and the server's transfer response is discarded.
+
+        Args:
+          cmd: A RETR command.
+          blocksize: The maximum number of bytes to read from the
+                     socket at one time.  [default: 8192]
+          rest: Passed to transfercmd().  [default: None]
+        """
+        self.voidcmd('TYPE I')
+        conn = self.transfercmd(cmd, rest)
+        completed = False
+        try:
+            while 1:
+                data = conn.recv(blocksize)
+                if not data:
+                    break
+                yield data
+            # shutdown ssl layer
+            if _SSLSocket is not None and isinstance(conn, _SSLSocket):
+                conn.unwrap()
+            completed = True
+        finally:
+            conn.close()
+            if completed:
+                self.voidresp()
+            else:
+                # an aborted transfer is answered with 426 (or 226)
+                try:
+                    self.getresp()
+                except Error:
+                    pass
+
     def retrlines(self, cmd, callback = None):
         """Retrieve data in line mode.  A new port is created for you.
 
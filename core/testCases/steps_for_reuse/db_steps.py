@@ -17,7 +17,7 @@ def create_source_table(ddl_files: list, source_table_names: list, source_db_typ
 def compare_db_data_and_schema(node_api: NodeApi, link_api: LinkApi, link_id: str, sink_node_id: str,
                                source_tables: list, source_db_type: str, source_type: NodeType,
                                sink_tables: list, sink_db_type: str, sink_type: NodeType,
-                               order_by=None, unique_by=None):
+                               order_by=None, unique_by=None, compare_by_key=False, key_columns=None):
     # 生成源端库、目的端库操作实例对象
     schema_fail_count = 0
     data_fail_count = 0
@@ -48,5 +48,9 @@ def compare_db_data_and_schema(node_api: NodeApi, link_api: LinkApi, link_id: st
         else:
             source_db_data, sink_db_data = db.get_table_schema_and_data(order_by=order_by, unique_by=unique_by)
         schema_fail_count += db.compare_schema(source_db_data, sink_db_data)
-        data_fail_count += db.compare_data(source_db_data, sink_db_data)
+        # 基于关联字段比较时，不依赖两边数据的排序
+        if compare_by_key:
+            data_fail_count += db.compare_data_by_key(source_db_data, sink_db_data, key_columns).fail_count
+        else:
+            data_fail_count += db.compare_data(source_db_data, sink_db_data)
     return schema_fail_count, data_fail_count
@@ -3,9 +3,22 @@
 import os
 import re
 import json
+import time
+import codecs
+import hashlib
 import openpyxl
 from collections import OrderedDict
 
+# 可选的高性能json解析库，未安装时使用标准库json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
 
 def get_xls(root, excel_name, sheet_name):
     """
@@ -22,6 +35,100 @@ def get_xls(root, excel_name, sheet_name):
     return cls
 
 
+# 同一进程内已解析的Excel文件内容，{文件绝对路径: (文件标识, {sheet名: [[cell...]]})}
+_XLS_CACHE = {}
+
+
+def _get_file_signature(path):
+    """
+    文件标识：修改时间及大小
+    """
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _get_file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _get_xls_cache_path(excel_path):
+    """
+    Excel解析结果的持久化缓存文件，与Excel文件位于同一目录
+    """
+    root, excel_name = os.path.split(excel_path)
+    return os.path.join(root, '.{0}.cache.json'.format(excel_name))
+
+
+def _load_xls_cache(excel_path, signature):
+    """
+    读取持久化缓存，文件标识不同时基于sha1判断文件内容是否变化，缓存失效时返回None
+    """
+    cache_path = _get_xls_cache_path(excel_path)
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        if cache['signature'] == signature:
+            return cache['sheets']
+        if cache['sha1'] == _get_file_hash(excel_path):
+            # 文件内容未变化（如重新检出），仅更新文件标识
+            _dump_xls_cache(excel_path, signature, cache['sha1'], cache['sheets'])
+            return cache['sheets']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+
+def _dump_xls_cache(excel_path, signature, sha1, sheets):
+    """
+    持久化Excel解析结果，缓存目录不可写或单元格值无法序列化时不缓存
+    """
+    cache_path = _get_xls_cache_path(excel_path)
+    temp_path = '{0}.{1}.tmp'.format(cache_path, os.getpid())
+    try:
+        content = json.dumps({'signature': signature, 'sha1': sha1, 'sheets': sheets}, ensure_ascii=False)
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(temp_path, cache_path)
+    except (OSError, TypeError, ValueError) as e:
+        print('Excel解析结果缓存失败: {0}，{1}'.format(cache_path, e))
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def get_xls_signature(root, excel_name):
+    """
+    Excel文件标识，与get_xls_cached判断缓存是否失效的依据一致，可用于缓存基于Excel内容生成的数据
+    :return: (文件绝对路径, 修改时间, 大小)
+    """
+    excel_path = os.path.abspath(os.path.join(root, excel_name))
+    return (excel_path,) + tuple(_get_file_signature(excel_path))
+
+
+def get_xls_cached(root, excel_name, sheet_name):
+    """
+    读取Excel文件，sheet页内容，返回结果与get_xls一致
+    同一进程内每个文件只解析一次，解析结果同时持久化至Excel同目录的.{excel_name}.cache.json
+    基于文件修改时间、大小及sha1判断缓存是否失效，文件未变化时后续运行无需再加载Excel
+    """
+    excel_path = os.path.abspath(os.path.join(root, excel_name))
+    signature = _get_file_signature(excel_path)
+    cached = _XLS_CACHE.get(excel_path)
+    if cached is None or cached[0] != signature:
+        sheets = _load_xls_cache(excel_path, signature)
+        if sheets is None:
+            print('解析Excel文件: {0}'.format(excel_path))
+            wb = openpyxl.load_workbook(excel_path)
+            sheets = {name: [[cell.value for cell in row] for row in wb[name].rows] for name in wb.sheetnames}
+            _dump_xls_cache(excel_path, signature, _get_file_hash(excel_path), sheets)
+        _XLS_CACHE[excel_path] = (signature, sheets)
+    sheets = _XLS_CACHE[excel_path][1]
+    if sheet_name not in sheets:
+        raise KeyError('Worksheet {0} does not exist.'.format(sheet_name))
+    # 返回副本，避免调用方修改缓存内容
+    return [list(row) for row in sheets[sheet_name]]
+
+
 def format_json(ori_json, lower_key=False, encoding='utf-8'):
     # 处理每一行数据，使用\n分割进行单独处理
     lines = ori_json.split('\n')
@@ -37,7 +144,94 @@ def format_json(ori_json, lower_key=False, encoding='utf-8'):
             line = '  "' + col_name + '": "' + col_value.replace('"', '\'') + '",'
         new_lines.append(line)
     msg = ''.join(new_lines)
-    result_dict = json.loads(msg, encoding=encoding, object_pairs_hook=OrderedDict)
+    result_dict = json.loads(msg, object_pairs_hook=OrderedDict)
     if lower_key:
         result_dict = {k.lower(): v for k, v in result_dict.items()}
     return result_dict
+
+
+class JsonDecoder:
+    """
+    json消息解码器
+    每条消息先使用严格解析（orjson，ujson或标准库json，依次选择已安装的库），仅解析失败时回退至format_json的容错处理
+    累计解析耗时、最大耗时及回退次数，可通过summary()查看，不保存每条消息的耗时
+    """
+
+    def __init__(self, lower_key=False, encoding='utf-8'):
+        """
+        :param lower_key: 是否将所有键转为小写
+        :param encoding: 消息为bytes时的编码
+        """
+        self.lower_key = lower_key
+        self.encoding = encoding
+        if orjson is not None:
+            self.loads = orjson.loads
+        elif ujson is not None:
+            self.loads = ujson.loads
+        else:
+            self.loads = json.loads
+        # 已解析的消息数
+        self.count = 0
+        # 解析总耗时及单条消息的最大耗时（毫秒）
+        self.total_time = 0.0
+        self.max_time = 0.0
+        # 回退至容错处理的消息数
+        self.fallback_count = 0
+
+    def decode(self, msg):
+        """
+        解析一条json消息
+        :param msg: str或bytes
+        :return: 保持原字段顺序的字典
+        """
+        start_time = time.perf_counter()
+        if isinstance(msg, (bytes, bytearray)):
+            msg = msg.decode(self.encoding)
+        try:
+            result_dict = self.loads(msg)
+            if not isinstance(result_dict, dict):
+                raise ValueError('json消息不是对象: {0}'.format(msg))
+            if self.lower_key:
+                result_dict = {k.lower(): v for k, v in result_dict.items()}
+        except ValueError:
+            # 数据中可能存在换行、制表符等特殊字符导致严格解析失败，使用容错处理
+            self.fallback_count += 1
+            result_dict = format_json(msg, lower_key=self.lower_key, encoding=self.encoding)
+        elapsed = (time.perf_counter() - start_time) * 1000
+        self.count += 1
+        self.total_time += elapsed
+        if elapsed > self.max_time:
+            self.max_time = elapsed
+        return result_dict
+
+    def summary(self):
+        """
+        解析统计信息
+        """
+        return '解析消息数: {0}，容错解析数: {1}，总耗时: {2:.3f}ms，平均耗时: {3:.3f}ms，最大耗时: {4:.3f}ms'.format(
+            self.count, self.fallback_count, self.total_time, self.total_time / self.count if self.count else 0,
+            self.max_time)
+
+
+def iter_lines(chunks, line_end='\n', encoding='utf-8'):
+    """
+    将分块读取的字节数据按行分隔符逐行返回，仅缓存未完整的一行，不需将整个文件读入内存
+    使用增量解码器，跨块的多字节字符、行分隔符均可正确拼接
+    :param chunks: 可迭代的字节块
+    :param line_end: 行分隔符
+    :param encoding: 编码
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    buffer = ''
+    for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        if line_end not in buffer:
+            continue
+        lines = buffer.split(line_end)
+        buffer = lines.pop()
+        for line in lines:
+            # 与文本模式读取一致，行分隔符为\n时去除\r\n中的\r
+            yield line[:-1] if line_end == '\n' and line.endswith('\r') else line
+    buffer += decoder.decode(b'', final=True)
+    if buffer:
+        yield buffer[:-1] if line_end == '\n' and buffer.endswith('\r') else buffer
@@ -1,11 +1,30 @@
 package demo;
+import java.io.BufferedOutputStream;
+import java.io.BufferedReader;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.InputStreamReader;
+import java.io.PrintStream;
+import java.util.HashMap;
+import java.util.Map;
 import org.bson.BSONObject;
 import com.sequoiadb.base.DBCollection;
 import com.sequoiadb.base.DBCursor;
 import com.sequoiadb.base.Sequoiadb;
 
 public class SDB {
+    // 常驻模式的握手标识及响应前缀
+    private static final String READY = "SDB_READY";
+    private static final String RECORD = "R ";
+    private static final String END = "E ";
+    private static final String SUCCESS = "SDB_SUCCESS";
+    private static final String ERROR = "SDB_ERROR";
+
     public static void main(String[] args) throws Exception {
+    	if (args.length == 1 && args[0].toLowerCase().equals("serve")) {
+    		serve();
+    		return;
+    	}
     	String cmd = args[0];
     	String ip = args[1];
     	String port = args[2];
@@ -16,6 +35,60 @@ public class SDB {
     	
         String connString = ip+":"+port;
         Sequoiadb sdb = new Sequoiadb(connString, user, passwd);
+        run(sdb, cmd, collection_space, collection, System.out, "");
+        sdb.disconnect();
+	}
+
+    /**
+     * 常驻模式：从stdin逐行读取请求，连接基于ip, port, user复用
+     * 请求：制表符分隔的 cmd ip port user passwd collection_space collection
+     * 响应：每条记录以"R "开头，请求结束时输出"E SDB_SUCCESS"或"E SDB_ERROR 错误信息"
+     * stdin关闭后断开所有连接并退出
+     */
+    private static void serve() throws Exception {
+        Map<String, Sequoiadb> connections = new HashMap<String, Sequoiadb>();
+        BufferedReader reader = new BufferedReader(new InputStreamReader(System.in, "UTF-8"));
+        PrintStream out = new PrintStream(
+                new BufferedOutputStream(new FileOutputStream(FileDescriptor.out)), false, "UTF-8");
+        out.println(READY);
+        out.flush();
+        String line;
+        while ((line = reader.readLine()) != null) {
+            String[] request = line.split("\t", -1);
+            if (request.length != 7) {
+                out.println(END + ERROR + " Invalid request");
+                out.flush();
+                continue;
+            }
+            String key = request[1] + ":" + request[2] + ":" + request[3];
+            try {
+                Sequoiadb sdb = (Sequoiadb) connections.get(key);
+                if (sdb == null) {
+                    sdb = new Sequoiadb(request[1] + ":" + request[2], request[3], request[4]);
+                    connections.put(key, sdb);
+                }
+                run(sdb, request[0], request[5], request[6], out, RECORD);
+                out.println(END + SUCCESS);
+            } catch (Exception e) {
+                // 出错后丢弃该连接，下次请求时重新连接
+                Sequoiadb sdb = (Sequoiadb) connections.remove(key);
+                if (sdb != null) {
+                    try {
+                        sdb.disconnect();
+                    } catch (Exception ignored) {
+                    }
+                }
+                out.println(END + ERROR + " " + String.valueOf(e.getMessage()).replace('\n', ' '));
+            }
+            out.flush();
+        }
+        for (Object value : connections.values()) {
+            ((Sequoiadb) value).disconnect();
+        }
+    }
+
+    private static void run(Sequoiadb sdb, String cmd, String collection_space, String collection,
+                            PrintStream out, String prefix) throws Exception {
         DBCollection cl = sdb.getCollectionSpace(collection_space).getCollection(collection);
         
         if (cmd.toLowerCase().equals("get_all_data")) {
@@ -23,7 +96,7 @@ public class SDB {
             try {
                 while (cursor.hasNext()) {
                    BSONObject record = cursor.getNext();
-                   System.out.println((String) record.toString());
+                   out.println(prefix + (String) record.toString());
                 } 
             } finally {
              cursor.close();
@@ -35,6 +108,5 @@ public class SDB {
         else {
         	throw new Exception("Not Supported CMD");
         }
-        sdb.disconnect();
-	}
+    }
 }